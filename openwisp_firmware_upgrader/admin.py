@@ -1,6 +1,7 @@
 import json
 import logging
 from datetime import timedelta
+from uuid import UUID
 
 import reversion
 import swapper
@@ -9,9 +10,10 @@ from django.conf import settings
 from django.contrib import admin, messages
 from django.contrib.admin.actions import delete_selected
 from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_permission_codename
 from django.core.exceptions import ValidationError
-from django.core.paginator import InvalidPage, Paginator
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
 from django.forms.formsets import DELETION_FIELD_NAME
 from django.shortcuts import redirect
 from django.template.response import TemplateResponse
@@ -438,6 +440,14 @@ class UpgradeOperationAdmin(BaseUpgradeAdmin):
             "upgrader:api_upgradeoperation_cancel",
             args=["00000000-0000-0000-0000-000000000000"],
         )
+        extra_context["upgrade_operation_events_url"] = reverse(
+            "upgrader:api_upgradeoperation_events",
+            args=["00000000-0000-0000-0000-000000000000"],
+        )
+        extra_context["upgrade_operation_log_url"] = reverse(
+            "upgrader:api_upgradeoperation_log",
+            args=["00000000-0000-0000-0000-000000000000"],
+        )
         extra_context["django_locale"] = get_language()
         obj = self.get_object(request, object_id)
         # for custom breadcrumbs
@@ -501,6 +511,7 @@ class BatchUpgradeOperationAdmin(BaseUpgradeAdmin):
         "build",
         "group",
         "location",
+        "parent",
         "status",
         "completed",
         "success_rate",
@@ -513,6 +524,7 @@ class BatchUpgradeOperationAdmin(BaseUpgradeAdmin):
     ]
     autocomplete_fields = ["build", "group", "location"]
     readonly_fields = [
+        "parent",
         "completed",
         "success_rate",
         "failed_rate",
@@ -524,6 +536,60 @@ class BatchUpgradeOperationAdmin(BaseUpgradeAdmin):
         "admin/firmware_upgrader/batch_upgrade_operation_change_form.html"
     )
     device_upgrades_per_page = 20
+    # statuses of the mass upgrade operations whose counters are always
+    # populated and whose upgrade operations are not archived
+    counted_statuses = ["in-progress", "paused"]
+    actions = ["delete_selected", "resume_selected", "retry_failed_selected"]
+
+    @admin.action(
+        description=_("Resume selected mass upgrade operations"),
+        permissions=["change"],
+    )
+    def resume_selected(self, request, queryset):
+        resumed = 0
+        for batch in queryset:
+            try:
+                batch.resume()
+            except ValueError as error:
+                self.message_user(request, f"{batch}: {error}", messages.WARNING)
+            else:
+                resumed += 1
+        if resumed:
+            self.message_user(
+                request,
+                _("%(count)d mass upgrade operation(s) resumed") % {"count": resumed},
+                messages.SUCCESS,
+            )
+
+    @admin.action(
+        description=_("Retry failed upgrades of selected mass upgrade operations"),
+        permissions=["retry"],
+    )
+    def retry_failed_selected(self, request, queryset):
+        retried = 0
+        for batch in queryset.select_related("build"):
+            try:
+                batch.retry_failed()
+            except ValueError as error:
+                self.message_user(request, f"{batch}: {error}", messages.WARNING)
+            else:
+                retried += 1
+        if retried:
+            self.message_user(
+                request,
+                _(
+                    "%(count)d mass upgrade operation(s) created to retry failed upgrades"
+                )
+                % {"count": retried},
+                messages.SUCCESS,
+            )
+
+    def has_retry_permission(self, request):
+        # retrying creates new mass upgrade operations, which this
+        # read only admin never allows to add, hence the model
+        # permission is checked instead of ``has_add_permission``
+        codename = get_permission_codename("add", self.opts)
+        return request.user.has_perm(f"{self.opts.app_label}.{codename}")
 
     def get_upgrade_operations(self, request, obj):
         qs = obj.upgradeoperation_set.select_related("device", "image")
@@ -555,6 +621,9 @@ class BatchUpgradeOperationAdmin(BaseUpgradeAdmin):
             q = params.copy()
             # always remove existing key for this filter
             q.pop(param_name, None)
+            # filtered lists start from the first page
+            for page_param in ["after", "before"]:
+                q.pop(page_param, None)
             if value:
                 q[param_name] = value
             qs = q.urlencode()
@@ -597,16 +666,99 @@ class BatchUpgradeOperationAdmin(BaseUpgradeAdmin):
             filter_specs.append(OrganizationFilter())
         return filter_specs
 
-    def _paginate_operations(self, upgrades_qs, page_param, per_page=None):
-        """Paginate ``upgrades_qs`` returning (page_obj, paginator, object_list)."""
+    def _paginate_operations(self, upgrades_qs, after=None, before=None, per_page=None):
+        """
+        Returns a page of ``upgrades_qs`` ordered by creation time and ID,
+        starting after or ending before an upgrade operation (keyset
+        pagination), which does not need to count and skip the rows of
+        the previous pages like offset pagination; returns (object_list,
+        has_previous, has_next)
+        """
         per_page = per_page or self.device_upgrades_per_page
-        paginator = Paginator(upgrades_qs.order_by("id"), per_page)
-        page_number = page_param or 1
+        before = self._get_position(upgrades_qs, before)
+        if before:
+            created, pk = before
+            upgrade_operations = list(
+                upgrades_qs.filter(
+                    Q(created__lt=created) | Q(created=created, id__lt=pk)
+                ).order_by("-created", "-id")[: per_page + 1]
+            )
+            if upgrade_operations:
+                return (
+                    upgrade_operations[:per_page][::-1],
+                    len(upgrade_operations) > per_page,
+                    True,
+                )
+        queryset = upgrades_qs.order_by("created", "id")
+        after = self._get_position(upgrades_qs, after)
+        if after:
+            created, pk = after
+            queryset = queryset.filter(
+                Q(created__gt=created) | Q(created=created, id__gt=pk)
+            )
+        upgrade_operations = list(queryset[: per_page + 1])
+        return (
+            upgrade_operations[:per_page],
+            bool(after),
+            len(upgrade_operations) > per_page,
+        )
+
+    def _get_position(self, upgrades_qs, pk):
+        """
+        Returns the creation time and the ID of the upgrade
+        operation used as cursor, if it's still listed
+        """
+        if not pk:
+            return None
+        return upgrades_qs.filter(pk=pk).values_list("created", "id").first()
+
+    def _get_page_query(self, request, param, upgrade_operation):
+        params = request.GET.copy()
+        for page_param in ["after", "before"]:
+            params.pop(page_param, None)
+        params[param] = str(upgrade_operation.pk)
+        return params.urlencode()
+
+    def _get_cursor(self, request, param):
         try:
-            page_obj = paginator.page(page_number)
-        except InvalidPage:
-            page_obj = paginator.page(1)
-        return page_obj, paginator, page_obj.object_list
+            return UUID(request.GET.get(param, ""))
+        except ValueError:
+            return None
+
+    def _count_operations(self, request, obj, upgrades_qs, current_status):
+        """
+        Returns the number of upgrade operations listed: when all the
+        running or the launched upgrade operations of a running mass
+        upgrade operation are listed, the number is read from its
+        counters, otherwise the upgrade operations are counted, which
+        is an index only scan when filtering by status
+        """
+        if (
+            request.GET.get("q")
+            or request.GET.get("organization")
+            or current_status not in ["", "in-progress"]
+            or obj.status not in self.counted_statuses
+            or (
+                not request.user.is_superuser
+                and obj.build.category.organization_id is None
+            )
+        ):
+            return upgrades_qs.count()
+        if current_status:
+            return obj.launched_operations - obj.completed_operations
+        return obj.launched_operations
+
+    def get_object(self, request, object_id, from_field=None):
+        """
+        Avoids duplicating queries in change_view custom logic,
+        the operation stats are shared with the readonly fields
+        """
+        cache_attr = f"_cached_object_{object_id}_{from_field}"
+        if not hasattr(request, cache_attr):
+            setattr(
+                request, cache_attr, super().get_object(request, object_id, from_field)
+            )
+        return getattr(request, cache_attr)
 
     def change_view(self, request, object_id, form_url="", extra_context=None):
         extra_context = extra_context or {}
@@ -615,6 +767,8 @@ class BatchUpgradeOperationAdmin(BaseUpgradeAdmin):
             upgrades_qs = self.get_upgrade_operations(request, obj)
             search_query = request.GET.get("q", "")
             if search_query:
+                # uses the trigram index of the device names on PostgreSQL,
+                # see the "0031_upgradeoperation_search_indexes" migration
                 upgrades_qs = upgrades_qs.filter(device__name__icontains=search_query)
             # Get current filter values
             current_status = request.GET.get("status", "")
@@ -628,20 +782,37 @@ class BatchUpgradeOperationAdmin(BaseUpgradeAdmin):
             filter_specs = self._build_filter_specs(
                 request, obj, current_status, current_org
             )
-            page_obj, paginator, upgrade_operations = self._paginate_operations(
-                upgrades_qs, request.GET.get("page", 1)
+            upgrade_operations, has_previous, has_next = self._paginate_operations(
+                upgrades_qs,
+                after=self._get_cursor(request, "after"),
+                before=self._get_cursor(request, "before"),
             )
             upgrade_operation_app_label = UpgradeOperation._meta.app_label
             extra_context.update(
                 {
                     "upgrade_operations": upgrade_operations,
-                    "page_obj": page_obj,
-                    "paginator": paginator,
+                    "upgrade_operations_count": self._count_operations(
+                        request, obj, upgrades_qs, current_status
+                    ),
+                    "previous_page_query": (
+                        self._get_page_query(request, "before", upgrade_operations[0])
+                        if has_previous
+                        else None
+                    ),
+                    "next_page_query": (
+                        self._get_page_query(request, "after", upgrade_operations[-1])
+                        if has_next
+                        else None
+                    ),
                     "filter_specs": filter_specs,
                     "has_active_filters": any(
                         request.GET.get(param) for param in ["status", "organization"]
                     ),
                     "upgrade_operation_app_label": upgrade_operation_app_label,
+                    "upgrade_operation_path": reverse(
+                        f"admin:{upgrade_operation_app_label}_upgradeoperation_change",
+                        args=["00000000-0000-0000-0000-000000000000"],
+                    ),
                 }
             )
         return super().change_view(request, object_id, extra_context=extra_context)
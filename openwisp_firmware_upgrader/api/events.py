@@ -0,0 +1,349 @@
+import asyncio
+import json
+import logging
+import time
+import weakref
+from collections import defaultdict
+
+import swapper
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
+
+from openwisp_users.api.authentication import BearerAuthentication
+
+from .. import settings as app_settings
+from ..swapper import load_model
+from ..websockets import AuthenticatedWebSocketConsumer
+
+logger = logging.getLogger(__name__)
+
+
+class UpgradeEventPoller:
+    """
+    Reads the new events of the event log with a single query for
+    all the streams served by an event loop and wakes the streams
+    which have received new events, the streams read their events
+    only after being woken up.
+    """
+
+    fields = ["operation_id", "device_id", "batch_id"]
+    # maximum number of events read from the event log at once
+    batch_size = 1000
+    _instances = weakref.WeakKeyDictionary()
+
+    def __init__(self):
+        self.waiters = defaultdict(set)
+        self.last_event_id = None
+        self.task = None
+
+    @classmethod
+    def get_instance(cls):
+        loop = asyncio.get_running_loop()
+        poller = cls._instances.get(loop)
+        if poller is None:
+            poller = cls._instances[loop] = cls()
+        return poller
+
+    async def subscribe(self, field, pk):
+        """
+        Returns the ``asyncio.Event`` which is set when new events of
+        the object are stored; the event must be cleared before reading
+        the event log, so that the events stored during the read are
+        not missed
+        """
+        waiter = asyncio.Event()
+        self.waiters[(field, str(pk))].add(waiter)
+        if self.last_event_id is None:
+            latest = (
+                await self._get_queryset()
+                .order_by("-id")
+                .values_list("id", flat=True)
+                .afirst()
+            )
+            if self.last_event_id is None:
+                self.last_event_id = latest or 0
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._run())
+        return waiter
+
+    def unsubscribe(self, field, pk, waiter):
+        key = (field, str(pk))
+        self.waiters[key].discard(waiter)
+        if not self.waiters[key]:
+            del self.waiters[key]
+
+    def _get_queryset(self):
+        return load_model("UpgradeEvent").objects.all()
+
+    async def _get_new_events(self):
+        queryset = (
+            self._get_queryset()
+            .filter(id__gt=self.last_event_id)
+            .order_by("id")
+            .values_list("id", *self.fields)
+        )
+        return [event async for event in queryset[: self.batch_size]]
+
+    async def _run(self):
+        while self.waiters:
+            await asyncio.sleep(app_settings.EVENT_STREAM_POLL_INTERVAL)
+            try:
+                await self._poll()
+            except Exception:
+                logger.exception("Failed to read the upgrade event log")
+        # the position is read again when the
+        # next stream subscribes to the poller
+        self.last_event_id = None
+
+    async def _poll(self):
+        while True:
+            events = await self._get_new_events()
+            if not events:
+                return
+            self.last_event_id = events[-1][0]
+            self._wake(events)
+            if len(events) < self.batch_size:
+                return
+
+    def _wake(self, events):
+        for event in events:
+            for field, value in zip(self.fields, event[1:]):
+                if value is None:
+                    continue
+                for waiter in self.waiters.get((field, str(value)), ()):
+                    waiter.set()
+
+
+class UpgradeEventStreamView(View):
+    """
+    Sends the events of the event log of an object as server-sent
+    events, or as long-polling responses when the client does not
+    accept ``text/event-stream``.
+
+    Clients resume from the last event they received with the
+    ``Last-Event-ID`` header or the ``last_event_id`` query parameter;
+    the events are sent as they have been stored in the log.
+
+    The streams wait for new events with ``UpgradeEventPoller``,
+    which reads the event log once for all the streams.
+    """
+
+    http_method_names = ["get"]
+    organization_field = "organization_id"
+    # field of the event log which identifies the object
+    event_field = None
+    # whether the new lines of the log of the upgrade operation
+    # are sent along with the events which change the log
+    stream_logs = False
+    # maximum number of events read from the event log at once
+    max_events = 500
+    # seconds after which a comment is sent to idle streams,
+    # which prevents proxies from closing the connection
+    keepalive_interval = 15
+    long_poll_timeout = 25
+
+    def get_model(self):
+        raise NotImplementedError()
+
+    async def get(self, request, pk):
+        user = await self._authenticate(request)
+        if user is None:
+            return JsonResponse(
+                {"detail": _("Authentication credentials were not provided.")},
+                status=401,
+            )
+        authorized, _organization_id = (
+            await AuthenticatedWebSocketConsumer.get_authorization(
+                user, self.get_model(), pk, self.organization_field
+            )
+        )
+        if not authorized:
+            return JsonResponse(
+                {"detail": _("You do not have permission to perform this action.")},
+                status=403,
+            )
+        last_event_id = request.headers.get("Last-Event-ID") or request.GET.get(
+            "last_event_id"
+        )
+        if last_event_id is None:
+            # the stream starts from the current end of the log
+            last_event_id = await self._get_latest_event_id(pk)
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return JsonResponse({"detail": _("Invalid event ID")}, status=400)
+        try:
+            log_since = int(request.GET.get("log_since", 0))
+            assert log_since >= 0
+        except (AssertionError, ValueError):
+            return JsonResponse({"detail": _("Invalid log offset")}, status=400)
+        if "text/event-stream" in request.headers.get("Accept", ""):
+            response = StreamingHttpResponse(
+                self._stream(pk, last_event_id, log_since),
+                content_type="text/event-stream",
+            )
+            response["Cache-Control"] = "no-cache"
+            # disables the buffering of nginx
+            response["X-Accel-Buffering"] = "no"
+            return response
+        return await self._long_poll(pk, last_event_id, log_since)
+
+    async def _authenticate(self, request):
+        user = await request.auser()
+        if user.is_authenticated:
+            return user
+        try:
+            result = await sync_to_async(BearerAuthentication().authenticate)(request)
+        except AuthenticationFailed:
+            return None
+        return result[0] if result else None
+
+    def _get_queryset(self, pk):
+        UpgradeEvent = load_model("UpgradeEvent")
+        return UpgradeEvent.objects.filter(**{self.event_field: pk})
+
+    async def _get_latest_event_id(self, pk):
+        latest = await (
+            self._get_queryset(pk).order_by("-id").values_list("id", flat=True).afirst()
+        )
+        return latest or 0
+
+    async def _get_events(self, pk, last_event_id):
+        queryset = (
+            self._get_queryset(pk)
+            .filter(id__gt=last_event_id)
+            .order_by("id")
+            .values_list("id", "payload")
+        )
+        return [event async for event in queryset[: self.max_events]]
+
+    async def _get_log_delta(self, pk, events, log_since):
+        """
+        Returns the lines added to the log of the upgrade operation
+        by the events, starting from ``log_since``, in the format of
+        the responses of the log endpoint
+        """
+        if not self.stream_logs:
+            return None
+        log_length = None
+        for _event_id, payload in events:
+            if '"log_length"' not in payload:
+                continue
+            message = json.loads(payload)
+            if message.get("type") == "operation_update":
+                log_length = message["operation"].get("log_length", log_length)
+        if log_length is None or log_length <= log_since:
+            return None
+        operation = await (
+            load_model("UpgradeOperation")
+            .objects.only("id", "log")
+            .filter(pk=pk)
+            .afirst()
+        )
+        if operation is None:
+            return None
+        return {
+            "since": log_since,
+            "offset": log_length,
+            "log": operation.log[log_since:log_length],
+        }
+
+    @staticmethod
+    async def _wait(waiter, timeout):
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _stream(self, pk, last_event_id, log_since):
+        interval = app_settings.EVENT_STREAM_POLL_INTERVAL
+        # the ID allows clients which have not received
+        # any event yet to resume from the right position
+        yield f"retry: {int(interval * 1000)}\nid: {last_event_id}\n\n"
+        deadline = time.monotonic() + app_settings.EVENT_STREAM_TIMEOUT
+        if time.monotonic() >= deadline:
+            return
+        poller = UpgradeEventPoller.get_instance()
+        waiter = await poller.subscribe(self.event_field, pk)
+        try:
+            while time.monotonic() < deadline:
+                waiter.clear()
+                events = await self._get_events(pk, last_event_id)
+                for event_id, payload in events:
+                    yield f"id: {event_id}\ndata: {payload}\n\n"
+                if events:
+                    last_event_id = events[-1][0]
+                    delta = await self._get_log_delta(pk, events, log_since)
+                    if delta:
+                        log_since = delta["offset"]
+                        yield f"event: log\ndata: {json.dumps(delta)}\n\n"
+                    if len(events) == self.max_events:
+                        continue
+                timeout = min(self.keepalive_interval, deadline - time.monotonic())
+                if not await self._wait(waiter, timeout):
+                    if time.monotonic() < deadline:
+                        yield ": keepalive\n\n"
+        finally:
+            poller.unsubscribe(self.event_field, pk, waiter)
+
+    async def _long_poll(self, pk, last_event_id, log_since):
+        deadline = time.monotonic() + min(
+            self.long_poll_timeout, app_settings.EVENT_STREAM_TIMEOUT
+        )
+        events = await self._get_events(pk, last_event_id)
+        if not events and time.monotonic() < deadline:
+            poller = UpgradeEventPoller.get_instance()
+            waiter = await poller.subscribe(self.event_field, pk)
+            try:
+                while not events and time.monotonic() < deadline:
+                    waiter.clear()
+                    events = await self._get_events(pk, last_event_id)
+                    if not events:
+                        await self._wait(waiter, deadline - time.monotonic())
+            finally:
+                poller.unsubscribe(self.event_field, pk, waiter)
+        if events:
+            last_event_id = events[-1][0]
+        # the payloads are already encoded in JSON
+        content = ",".join(
+            f'{{"id":{event_id},"data":{payload}}}' for event_id, payload in events
+        )
+        delta = await self._get_log_delta(pk, events, log_since)
+        log = f',"log":{json.dumps(delta)}' if delta else ""
+        return HttpResponse(
+            f'{{"last_event_id":{last_event_id},"events":[{content}]{log}}}',
+            content_type="application/json",
+        )
+
+
+class UpgradeOperationEventStreamView(UpgradeEventStreamView):
+    organization_field = "device__organization_id"
+    event_field = "operation_id"
+    stream_logs = True
+
+    def get_model(self):
+        return load_model("UpgradeOperation")
+
+
+class DeviceUpgradeEventStreamView(UpgradeEventStreamView):
+    event_field = "device_id"
+
+    def get_model(self):
+        return swapper.load_model("config", "Device")
+
+
+class BatchUpgradeOperationEventStreamView(UpgradeEventStreamView):
+    organization_field = "build__category__organization_id"
+    event_field = "batch_id"
+
+    def get_model(self):
+        return load_model("BatchUpgradeOperation")
+
+
+upgrade_operation_events = UpgradeOperationEventStreamView.as_view()
+device_upgrade_events = DeviceUpgradeEventStreamView.as_view()
+batch_upgrade_operation_events = BatchUpgradeOperationEventStreamView.as_view()
@@ -39,3 +39,10 @@ class DeviceUpgradeOperationFilter(FilterDjangoByOrgManaged):
     class Meta:
         model = UpgradeOperation
         fields = ["status"]
+
+
+class UpgradeOperationExportFilter(UpgradeOperationFilter):
+    created = filters.IsoDateTimeFromToRangeFilter()
+
+    class Meta(UpgradeOperationFilter.Meta):
+        fields = UpgradeOperationFilter.Meta.fields + ["batch"]
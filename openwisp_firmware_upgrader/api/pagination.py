@@ -0,0 +1,69 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+from openwisp_utils.api.pagination import OpenWispPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Paginates objects ordered by descending creation date using the
+    creation date and the primary key of the last object of a page
+    as the cursor of the next page, hence retrieving a page does not
+    get slower as its position grows.
+    """
+
+    page_size = OpenWispPagination.page_size
+    max_page_size = OpenWispPagination.max_page_size
+    page_size_query_param = "page_size"
+    invalid_cursor_message = _("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.has_next = False
+        self.page = []
+        if isinstance(queryset, list):
+            return self.page
+        queryset = queryset.order_by("-created", "-pk")
+        position = self.get_position(request, queryset.model)
+        if position:
+            created, pk = position
+            queryset = queryset.filter(
+                Q(created__lt=created) | Q(created=created, pk__lt=pk)
+            )
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        self.has_next = len(results) > self.page_size
+        return self.page
+
+    def get_position(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created, pk = urlsafe_b64decode(encoded).decode("ascii").split("|")
+            created = parse_datetime(created)
+            pk = model._meta.pk.to_python(pk)
+            assert created is not None
+        except (AssertionError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return created, pk
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        position = f"{last.created.isoformat()}|{last.pk}"
+        encoded = urlsafe_b64encode(position.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_previous_link(self):
+        return None
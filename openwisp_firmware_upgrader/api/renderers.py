@@ -0,0 +1,24 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .. import settings as app_settings
+from ..utils import dumps_json
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Renders JSON with the backend set in
+    ``OPENWISP_FIRMWARE_UPGRADER_JSON_BACKEND``, falls back
+    to the default renderer for indented or ASCII-only output
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            app_settings.JSON_BACKEND == "json"
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps_json(data, default=JSONEncoder().default)
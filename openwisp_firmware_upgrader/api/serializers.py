@@ -8,6 +8,7 @@ from openwisp_utils.api.serializers import ValidatedModelSerializer
 from ..swapper import load_model
 
 BatchUpgradeOperation = load_model("BatchUpgradeOperation")
+BatchUpgradeWave = load_model("BatchUpgradeWave")
 Build = load_model("Build")
 Category = load_model("Category")
 FirmwareImage = load_model("FirmwareImage")
@@ -82,15 +83,32 @@ class BatchUpgradeSerializer(FilterSerializerByOrgManaged, serializers.ModelSeri
     upgrade_all = serializers.BooleanField(required=False, default=False)
 
     class Meta:
-        fields = ("upgrade_all", "group", "location")
+        fields = ("upgrade_all", "group", "location", "rollout_plan")
         model = BatchUpgradeOperation
         extra_kwargs = {
             "group": {"required": False, "allow_null": True},
             "location": {"required": False, "allow_null": True},
+            "rollout_plan": {"required": False},
         }
 
 
-class UpgradeOperationSerializer(serializers.ModelSerializer):
+class SparseFieldsetSerializerMixin:
+    """
+    Restricts the serialized fields to the ``sparse_fields``
+    passed in the serializer context, if any.
+    """
+
+    def get_field_names(self, declared_fields, info):
+        field_names = super().get_field_names(declared_fields, info)
+        sparse_fields = self.context.get("sparse_fields")
+        if sparse_fields is None:
+            return field_names
+        return [name for name in field_names if name in sparse_fields]
+
+
+class UpgradeOperationSerializer(
+    SparseFieldsetSerializerMixin, serializers.ModelSerializer
+):
     class Meta:
         model = UpgradeOperation
         fields = (
@@ -105,12 +123,49 @@ class UpgradeOperationSerializer(serializers.ModelSerializer):
         )
 
 
-class DeviceUpgradeOperationSerializer(serializers.ModelSerializer):
+class DeviceUpgradeOperationSerializer(
+    SparseFieldsetSerializerMixin, serializers.ModelSerializer
+):
     class Meta:
         model = UpgradeOperation
         fields = ("id", "device", "image", "status", "log", "progress", "modified")
 
 
+class UpgradeOperationLogSerializer(serializers.ModelSerializer):
+    log = serializers.SerializerMethodField()
+    offset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UpgradeOperation
+        fields = ("id", "status", "log", "offset")
+
+    def get_log(self, obj):
+        since = self.context.get("since", 0)
+        return obj.log[since:]
+
+    def get_offset(self, obj):
+        return len(obj.log)
+
+
+class BatchUpgradeWaveSerializer(serializers.ModelSerializer):
+    success_rate = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = BatchUpgradeWave
+        fields = (
+            "number",
+            "size",
+            "status",
+            "success",
+            "failed",
+            "aborted",
+            "cancelled",
+            "success_rate",
+            "launched",
+            "completed",
+        )
+
+
 class BatchUpgradeOperationListSerializer(BaseSerializer):
     build = BuildSerializer(read_only=True)
 
@@ -125,8 +180,8 @@ class BatchUpgradeOperationSerializer(BatchUpgradeOperationListSerializer):
     failed_rate = serializers.IntegerField(read_only=True)
     aborted_rate = serializers.IntegerField(read_only=True)
     cancelled_rate = serializers.IntegerField(read_only=True)
-    upgradeoperations = UpgradeOperationSerializer(
-        read_only=True, source="upgradeoperation_set", many=True
+    waves = BatchUpgradeWaveSerializer(
+        read_only=True, source="batchupgradewave_set", many=True
     )
 
     class Meta:
@@ -1,6 +1,6 @@
 from django.urls import include, path
 
-from . import views
+from . import events, views
 
 app_name = "upgrader"
 
@@ -47,11 +47,41 @@ urlpatterns = [
                     views.batch_upgrade_operation_detail,
                     name="api_batchupgradeoperation_detail",
                 ),
+                path(
+                    "batch-upgrade-operation/<uuid:pk>/upgrade-operation/",
+                    views.batch_upgrade_operation_upgrade_operation_list,
+                    name="api_batchupgradeoperation_upgradeoperation_list",
+                ),
+                path(
+                    "batch-upgrade-operation/<uuid:pk>/cancel/",
+                    views.batch_upgrade_operation_cancel,
+                    name="api_batchupgradeoperation_cancel",
+                ),
+                path(
+                    "batch-upgrade-operation/<uuid:pk>/retry/",
+                    views.batch_upgrade_operation_retry,
+                    name="api_batchupgradeoperation_retry",
+                ),
+                path(
+                    "batch-upgrade-operation/<uuid:pk>/resume/",
+                    views.batch_upgrade_operation_resume,
+                    name="api_batchupgradeoperation_resume",
+                ),
+                path(
+                    "batch-upgrade-operation/<uuid:pk>/events/",
+                    events.batch_upgrade_operation_events,
+                    name="api_batchupgradeoperation_events",
+                ),
                 path(
                     "upgrade-operation/",
                     views.upgrade_operation_list,
                     name="api_upgradeoperation_list",
                 ),
+                path(
+                    "upgrade-operation/export/<str:export_format>/",
+                    views.upgrade_operation_export,
+                    name="api_upgradeoperation_export",
+                ),
                 path(
                     "upgrade-operation/<uuid:pk>/",
                     views.upgrade_operation_detail,
@@ -62,11 +92,26 @@ urlpatterns = [
                     views.upgrade_operation_cancel,
                     name="api_upgradeoperation_cancel",
                 ),
+                path(
+                    "upgrade-operation/<uuid:pk>/log/",
+                    views.upgrade_operation_log,
+                    name="api_upgradeoperation_log",
+                ),
+                path(
+                    "upgrade-operation/<uuid:pk>/events/",
+                    events.upgrade_operation_events,
+                    name="api_upgradeoperation_events",
+                ),
                 path(
                     "device/<uuid:pk>/upgrade-operation/",
                     views.device_upgrade_operation_list,
                     name="api_deviceupgradeoperation_list",
                 ),
+                path(
+                    "device/<uuid:pk>/upgrade-events/",
+                    events.device_upgrade_events,
+                    name="api_deviceupgrade_events",
+                ),
                 path(
                     "device/<uuid:pk>/firmware/",
                     views.device_firmware_detail,
@@ -1,19 +1,25 @@
+import csv
 import logging
+from datetime import datetime
 
 import swapper
 from django.core.exceptions import ValidationError
-from django.http import Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
 from django.utils.translation import gettext_lazy as _
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import filters, generics, serializers, status
 from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.renderers import JSONRenderer
 from rest_framework.request import clone_request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.utils.serializer_helpers import ReturnDict
 
 from openwisp_firmware_upgrader import private_storage
+from openwisp_firmware_upgrader import settings as app_settings
 from openwisp_firmware_upgrader.constants import DEACTIVATED_DEVICE_FIRMWARE_ERROR
 from openwisp_users.api.mixins import FilterByOrganizationManaged, IsOrganizationManager
 from openwisp_users.api.mixins import ProtectedAPIMixin as BaseProtectedAPIMixin
@@ -21,7 +27,14 @@ from openwisp_users.api.permissions import DjangoModelPermissions
 from openwisp_utils.api.pagination import OpenWispPagination
 
 from ..swapper import load_model
-from .filters import DeviceUpgradeOperationFilter, UpgradeOperationFilter
+from ..utils import decompress_log, dumps_json
+from .filters import (
+    DeviceUpgradeOperationFilter,
+    UpgradeOperationExportFilter,
+    UpgradeOperationFilter,
+)
+from .pagination import KeysetPagination
+from .renderers import FastJSONRenderer
 from .serializers import (
     BatchUpgradeOperationListSerializer,
     BatchUpgradeOperationSerializer,
@@ -31,6 +44,7 @@ from .serializers import (
     DeviceFirmwareSerializer,
     DeviceUpgradeOperationSerializer,
     FirmwareImageSerializer,
+    UpgradeOperationLogSerializer,
     UpgradeOperationSerializer,
 )
 
@@ -48,6 +62,11 @@ Device = swapper.load_model("config", "Device")
 class ProtectedAPIMixin(BaseProtectedAPIMixin, FilterByOrganizationManaged):
     throttle_scope = "firmware_upgrader"
     pagination_class = OpenWispPagination
+    renderer_classes = [FastJSONRenderer] + [
+        renderer
+        for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+        if not issubclass(renderer, JSONRenderer)
+    ]
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -62,6 +81,87 @@ class ProtectedAPIMixin(BaseProtectedAPIMixin, FilterByOrganizationManaged):
         return qs
 
 
+class SparseFieldsetViewMixin:
+    """
+    Allows to select the fields returned by list endpoints with the
+    ``fields`` or ``exclude`` query parameters (comma separated),
+    the columns which are not returned are not loaded from the database.
+    """
+
+    default_exclude_fields = ["log"]
+
+    def _get_field_list(self, param, available_fields):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        field_names = [name.strip() for name in value.split(",") if name.strip()]
+        unknown_fields = set(field_names) - set(available_fields)
+        if unknown_fields:
+            raise serializers.ValidationError(
+                {
+                    param: _("Unknown fields: {fields}").format(
+                        fields=", ".join(sorted(unknown_fields))
+                    )
+                }
+            )
+        return field_names
+
+    def get_sparse_fields(self):
+        if hasattr(self, "_sparse_fields"):
+            return self._sparse_fields
+        available_fields = list(self.get_serializer_class().Meta.fields)
+        if self.request is None:
+            return available_fields
+        fields = self._get_field_list("fields", available_fields)
+        exclude = self._get_field_list("exclude", available_fields)
+        if fields is not None and exclude is not None:
+            raise serializers.ValidationError(
+                _("The fields and exclude parameters cannot be used together")
+            )
+        if fields is not None:
+            sparse_fields = [name for name in available_fields if name in fields]
+        else:
+            if exclude is None:
+                exclude = self.default_exclude_fields
+            sparse_fields = [name for name in available_fields if name not in exclude]
+        self._sparse_fields = sparse_fields
+        return sparse_fields
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if not hasattr(qs, "only"):
+            return qs
+        model_fields = {field.name for field in qs.model._meta.concrete_fields}
+        columns = [name for name in self.get_sparse_fields() if name in model_fields]
+        # related objects are serialized as primary keys,
+        # hence there's no need to join their tables
+        return qs.select_related(None).only(*columns)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["sparse_fields"] = self.get_sparse_fields()
+        return context
+
+
+class KeysetPaginationMixin:
+    """
+    Switches to keyset pagination when the ``cursor`` query parameter
+    is passed (an empty value returns the first page).
+    """
+
+    def use_keyset_pagination(self):
+        return (
+            self.request is not None
+            and KeysetPagination.cursor_query_param in self.request.query_params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.use_keyset_pagination():
+            self._paginator = KeysetPagination()
+        return super().paginator
+
+
 class RelatedDeviceAPIMixin(ProtectedAPIMixin):
     """
     Resolve and cache the device used by nested device firmware API views.
@@ -122,9 +222,13 @@ class BuildBatchUpgradeView(ProtectedAPIMixin, generics.GenericAPIView):
         upgrade_all = serializer.validated_data.get("upgrade_all", False)
         group = serializer.validated_data.get("group")
         location = serializer.validated_data.get("location")
+        rollout_plan = serializer.validated_data.get("rollout_plan")
         try:
             batch = instance.batch_upgrade(
-                firmwareless=upgrade_all, group=group, location=location
+                firmwareless=upgrade_all,
+                group=group,
+                location=location,
+                rollout_plan=rollout_plan,
             )
         except ValidationError as e:
             return Response(
@@ -168,7 +272,9 @@ class CategoryDetailView(ProtectedAPIMixin, generics.RetrieveUpdateDestroyAPIVie
     organization_field = "organization"
 
 
-class BatchUpgradeOperationListView(ProtectedAPIMixin, generics.ListAPIView):
+class BatchUpgradeOperationListView(
+    KeysetPaginationMixin, ProtectedAPIMixin, generics.ListAPIView
+):
     queryset = BatchUpgradeOperation.objects.all().select_related(
         "build", "build__category"
     )
@@ -184,13 +290,43 @@ class BatchUpgradeOperationDetailView(ProtectedAPIMixin, generics.RetrieveAPIVie
     queryset = (
         BatchUpgradeOperation.objects.all()
         .select_related("build", "build__category")
-        .prefetch_related("upgradeoperation_set")
+        .prefetch_related("batchupgradewave_set")
     )
     serializer_class = BatchUpgradeOperationSerializer
     lookup_fields = ["pk"]
     organization_field = "build__category__organization"
 
 
+class BatchUpgradeOperationUpgradeOperationListView(
+    SparseFieldsetViewMixin, ProtectedAPIMixin, generics.ListAPIView
+):
+    queryset = UpgradeOperation.objects.all()
+    serializer_class = UpgradeOperationSerializer
+    pagination_class = KeysetPagination
+    organization_field = "device__organization"
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["status", "device", "image"]
+
+    def get_parent_queryset(self):
+        qs = BatchUpgradeOperation.objects.filter(pk=self.kwargs["pk"])
+        if not self.request.user.is_superuser:
+            qs = qs.filter(
+                build__category__organization__in=self.request.user.organizations_managed
+            )
+        return qs
+
+    def assert_parent_exists(self):
+        if not self.get_parent_queryset().exists():
+            raise NotFound(detail=_("mass upgrade operation not found"))
+
+    def get_queryset(self):
+        return super().get_queryset().filter(batch=self.kwargs["pk"])
+
+    def initial(self, *args, **kwargs):
+        super().initial(*args, **kwargs)
+        self.assert_parent_exists()
+
+
 class FirmwareImageMixin(ProtectedAPIMixin):
     queryset = FirmwareImage.objects.all()
     parent = None
@@ -263,7 +399,12 @@ class DeviceUpgradeOperationMixin(ProtectedAPIMixin):
         super().initial(*args, **kwargs)
 
 
-class UpgradeOperationListView(ProtectedAPIMixin, generics.ListAPIView):
+class UpgradeOperationListView(
+    KeysetPaginationMixin,
+    SparseFieldsetViewMixin,
+    ProtectedAPIMixin,
+    generics.ListAPIView,
+):
     queryset = UpgradeOperation.objects.select_related("device", "image")
     serializer_class = UpgradeOperationSerializer
     organization_field = "device__organization"
@@ -282,7 +423,9 @@ class UpgradeOperationDetailView(ProtectedAPIMixin, generics.RetrieveAPIView):
     organization_field = "device__organization"
 
 
-class DeviceUpgradeOperationListView(DeviceUpgradeOperationMixin, generics.ListAPIView):
+class DeviceUpgradeOperationListView(
+    SparseFieldsetViewMixin, DeviceUpgradeOperationMixin, generics.ListAPIView
+):
     queryset = UpgradeOperation.objects.select_related("device", "image").order_by(
         "-created"
     )
@@ -296,6 +439,161 @@ class DeviceUpgradeOperationListView(DeviceUpgradeOperationMixin, generics.ListA
         return qs.filter(device__pk=self.kwargs["pk"])
 
 
+class UpgradeOperationLogView(ProtectedAPIMixin, generics.RetrieveAPIView):
+    queryset = UpgradeOperation.objects.only("id", "status", "log")
+    serializer_class = UpgradeOperationLogSerializer
+    lookup_fields = ["pk"]
+    organization_field = "device__organization"
+
+    def _get_since(self):
+        since = self.request.query_params.get("since", 0)
+        try:
+            since = int(since)
+            assert since >= 0
+        except (AssertionError, ValueError):
+            raise serializers.ValidationError(
+                {"since": _("Must be a positive integer")}
+            )
+        return since
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None:
+            context["since"] = self._get_since()
+        return context
+
+    @swagger_auto_schema(
+        operation_description=_(
+            "Returns the log of an upgrade operation, the since parameter "
+            "allows to retrieve only the part of the log which follows the "
+            "offset returned by a previous request"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                "since",
+                openapi.IN_QUERY,
+                description=_("Offset from which the log is returned"),
+                type=openapi.TYPE_INTEGER,
+            )
+        ],
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class PseudoBuffer:
+    """
+    Returns what is written to it instead of storing it,
+    allows to stream the rows produced by ``csv.writer``.
+    """
+
+    def write(self, value):
+        return value
+
+
+class UpgradeOperationExportView(ProtectedAPIMixin, generics.GenericAPIView):
+    queryset = UpgradeOperation.objects.all()
+    serializer_class = serializers.Serializer
+    organization_field = "device__organization"
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = UpgradeOperationExportFilter
+    pagination_class = None
+    export_fields = [
+        ("id", "id"),
+        ("device", "device_id"),
+        ("device_name", "device__name"),
+        ("image", "image_id"),
+        ("image_type", "image__type"),
+        ("batch", "batch_id"),
+        ("status", "status"),
+        ("progress", "progress"),
+        ("created", "created"),
+        ("modified", "modified"),
+    ]
+    content_types = {
+        "csv": "text/csv",
+        "ndjson": "application/x-ndjson",
+    }
+
+    @swagger_auto_schema(
+        operation_description=_(
+            "Exports the upgrade operations in CSV or NDJSON format, the rows "
+            "are streamed while they're read from the database"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                "log",
+                openapi.IN_QUERY,
+                description=_("Includes the log of the upgrade operations"),
+                type=openapi.TYPE_BOOLEAN,
+            )
+        ],
+    )
+    def get(self, request, export_format):
+        if export_format not in self.content_types:
+            raise NotFound(detail=_("export format not supported"))
+        fields = list(self.export_fields)
+        include_log = request.query_params.get("log", "").lower() in ["1", "true"]
+        if include_log:
+            fields.append(("log", "log"))
+        # the queryset is built before streaming the response,
+        # so that invalid filters return an error response
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .order_by("created", "pk")
+            .values_list(*[column for name, column in fields])
+        )
+        header = [name for name, column in fields]
+        head, encode = getattr(self, f"_get_{export_format}_encoder")(header)
+        if isinstance(request._request, ASGIRequest):
+            # the ASGI handler reads synchronous iterators entirely
+            # before sending them, hence the rows are read
+            # asynchronously to keep streaming them in chunks
+            stream = self._astream(queryset, head, encode, include_log)
+        else:
+            stream = self._stream(queryset, head, encode, include_log)
+        response = StreamingHttpResponse(
+            stream, content_type=self.content_types[export_format]
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="upgrade-operations.{export_format}"'
+        )
+        return response
+
+    def _format_row(self, row, include_log):
+        row = [
+            value.isoformat() if isinstance(value, datetime) else value for value in row
+        ]
+        if include_log:
+            row[-1] = decompress_log(row[-1])
+        return row
+
+    def _stream(self, queryset, head, encode, include_log):
+        if head:
+            yield head
+        for row in queryset.iterator(chunk_size=app_settings.EXPORT_CHUNK_SIZE):
+            yield encode(self._format_row(row, include_log))
+
+    async def _astream(self, queryset, head, encode, include_log):
+        if head:
+            yield head
+        async for row in queryset.aiterator(chunk_size=app_settings.EXPORT_CHUNK_SIZE):
+            yield encode(self._format_row(row, include_log))
+
+    def _get_csv_encoder(self, header):
+        """
+        Returns the header line and the function which encodes the rows
+        """
+        writer = csv.writer(PseudoBuffer())
+        return writer.writerow(header), writer.writerow
+
+    def _get_ndjson_encoder(self, header):
+        def encode(row):
+            return dumps_json(dict(zip(header, row))) + b"\n"
+
+        return None, encode
+
+
 class DeviceFirmwareDetailView(
     RelatedDeviceAPIMixin, generics.RetrieveUpdateDestroyAPIView
 ):
@@ -474,6 +772,204 @@ class UpgradeOperationCancelView(ProtectedAPIMixin, generics.GenericAPIView):
         return Response({"error": message}, status=status_code)
 
 
+class BatchUpgradeOperationResumePermission(DjangoModelPermissions):
+    perms_map = {
+        **DjangoModelPermissions.perms_map,
+        "POST": ["%(app_label)s.change_%(model_name)s"],
+    }
+
+
+class BatchUpgradeOperationResumeView(ProtectedAPIMixin, generics.GenericAPIView):
+    queryset = BatchUpgradeOperation.objects.select_related("build__category")
+    serializer_class = serializers.Serializer
+    permission_classes = (
+        IsOrganizationManager,
+        BatchUpgradeOperationResumePermission,
+    )
+    lookup_field = "pk"
+    organization_field = "build__category__organization"
+
+    @swagger_auto_schema(
+        operation_description=_(
+            "Resume the launch of a mass upgrade operation "
+            "which has been interrupted before reaching all the devices"
+        ),
+        operation_summary=_("Resume mass upgrade operation"),
+        responses={
+            200: openapi.Response(
+                description=_("Mass upgrade operation resumed successfully"),
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "message": openapi.Schema(
+                            type=openapi.TYPE_STRING, description=_("Success message")
+                        )
+                    },
+                ),
+            ),
+            409: openapi.Response(
+                description=_("Mass upgrade operation cannot be resumed"),
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "error": openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            description=_(
+                                "Error message explaining why resuming is not allowed"
+                            ),
+                        )
+                    },
+                ),
+            ),
+        },
+    )
+    def post(self, request, pk):
+        """Resume the launch of a mass upgrade operation."""
+        try:
+            batch = self.get_object()
+        except Http404:
+            return Response(
+                {"error": "Mass upgrade operation not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        try:
+            batch.resume()
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        logger.info(f"Mass upgrade operation {pk} resumed by user {request.user}")
+        return Response(
+            {"message": "Mass upgrade operation resumed successfully"},
+            status=status.HTTP_200_OK,
+        )
+
+
+class BatchUpgradeOperationCancelPermission(DjangoModelPermissions):
+    perms_map = {
+        **DjangoModelPermissions.perms_map,
+        "POST": ["%(app_label)s.change_%(model_name)s"],
+    }
+
+
+class BatchUpgradeOperationCancelView(ProtectedAPIMixin, generics.GenericAPIView):
+    queryset = BatchUpgradeOperation.objects.select_related("build__category")
+    serializer_class = serializers.Serializer
+    permission_classes = (
+        IsOrganizationManager,
+        BatchUpgradeOperationCancelPermission,
+    )
+    lookup_field = "pk"
+    organization_field = "build__category__organization"
+
+    @swagger_auto_schema(
+        operation_description=_(
+            "Cancel all the upgrade operations of a mass upgrade operation "
+            "which have not started flashing the firmware yet, if the launch "
+            "has not reached all the devices it is stopped and the mass "
+            "upgrade operation, which becomes cancelled, cannot be resumed"
+        ),
+        operation_summary=_("Cancel mass upgrade operation"),
+        responses={
+            200: openapi.Response(
+                description=_("Upgrade operations cancelled successfully"),
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "message": openapi.Schema(
+                            type=openapi.TYPE_STRING, description=_("Success message")
+                        ),
+                        "cancelled": openapi.Schema(
+                            type=openapi.TYPE_INTEGER,
+                            description=_("Number of cancelled upgrade operations"),
+                        ),
+                    },
+                ),
+            ),
+        },
+    )
+    def post(self, request, pk):
+        """Cancel the upgrade operations of a mass upgrade operation."""
+        try:
+            batch = self.get_object()
+        except Http404:
+            return Response(
+                {"error": "Mass upgrade operation not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        cancelled = batch.cancel()
+        logger.info(
+            f"{cancelled} upgrade operations of mass upgrade operation {pk} "
+            f"cancelled by user {request.user}"
+        )
+        return Response(
+            {
+                "message": "Mass upgrade operation cancelled successfully",
+                "cancelled": cancelled,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class BatchUpgradeOperationRetryView(ProtectedAPIMixin, generics.GenericAPIView):
+    queryset = BatchUpgradeOperation.objects.select_related("build__category")
+    serializer_class = serializers.Serializer
+    lookup_field = "pk"
+    organization_field = "build__category__organization"
+
+    @swagger_auto_schema(
+        operation_description=_(
+            "Create a mass upgrade operation which upgrades again the devices "
+            "whose upgrade operations have failed, have been aborted or cancelled"
+        ),
+        operation_summary=_("Retry failed upgrades of mass upgrade operation"),
+        responses={
+            201: openapi.Response(
+                description=_("Mass upgrade operation created successfully"),
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "batch": openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            description=_("ID of the new mass upgrade operation"),
+                        )
+                    },
+                ),
+            ),
+            409: openapi.Response(
+                description=_("There are no upgrade operations to retry"),
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "error": openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            description=_(
+                                "Error message explaining why retrying is not allowed"
+                            ),
+                        )
+                    },
+                ),
+            ),
+        },
+    )
+    def post(self, request, pk):
+        """Retry the failed upgrades of a mass upgrade operation."""
+        try:
+            parent = self.get_object()
+        except Http404:
+            return Response(
+                {"error": "Mass upgrade operation not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        try:
+            batch = parent.retry_failed()
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        logger.info(
+            f"Failed upgrades of mass upgrade operation {pk} "
+            f"retried by user {request.user} in {batch.pk}"
+        )
+        return Response({"batch": str(batch.pk)}, status=status.HTTP_201_CREATED)
+
+
 build_list = BuildListView.as_view()
 build_detail = BuildDetailView.as_view()
 api_batch_upgrade = BuildBatchUpgradeView.as_view()
@@ -481,11 +977,19 @@ category_list = CategoryListView.as_view()
 category_detail = CategoryDetailView.as_view()
 batch_upgrade_operation_list = BatchUpgradeOperationListView.as_view()
 batch_upgrade_operation_detail = BatchUpgradeOperationDetailView.as_view()
+batch_upgrade_operation_resume = BatchUpgradeOperationResumeView.as_view()
+batch_upgrade_operation_cancel = BatchUpgradeOperationCancelView.as_view()
+batch_upgrade_operation_retry = BatchUpgradeOperationRetryView.as_view()
+batch_upgrade_operation_upgrade_operation_list = (
+    BatchUpgradeOperationUpgradeOperationListView.as_view()
+)
 firmware_image_list = FirmwareImageListView.as_view()
 firmware_image_detail = FirmwareImageDetailView.as_view()
 firmware_image_download = FirmwareImageDownloadView.as_view()
 upgrade_operation_list = UpgradeOperationListView.as_view()
 upgrade_operation_detail = UpgradeOperationDetailView.as_view()
+upgrade_operation_log = UpgradeOperationLogView.as_view()
+upgrade_operation_export = UpgradeOperationExportView.as_view()
 device_upgrade_operation_list = DeviceUpgradeOperationListView.as_view()
 device_firmware_detail = DeviceFirmwareDetailView.as_view()
 upgrade_operation_cancel = UpgradeOperationCancelView.as_view()
@@ -1,4 +1,5 @@
-from django.db.models.signals import post_save, pre_delete
+from celery.signals import worker_init
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.utils.translation import gettext_lazy as _
 from swapper import get_model_name, load_model
 
@@ -7,7 +8,13 @@ from openwisp_utils.api.apps import ApiAppConfig
 from openwisp_utils.utils import default_or_test
 
 from . import settings as app_settings
-from .websockets import BatchUpgradeProgressPublisher, UpgradeProgressPublisher
+from .signals import batch_upgrade_operations_cancelled
+from .websockets import (
+    AuthenticatedWebSocketConsumer,
+    BatchUpgradeProgressPublisher,
+    UpgradeProgressPublisher,
+    enable_background_publisher,
+)
 
 
 class FirmwareUpdaterConfig(ApiAppConfig):
@@ -29,6 +36,7 @@ class FirmwareUpdaterConfig(ApiAppConfig):
         self.connect_device_signals()
         self.connect_upgrade_signals()
         self.connect_delete_signals()
+        self.connect_authorization_signals()
 
     def register_menu_groups(self):
         register_menu_group(
@@ -89,6 +97,17 @@ class FirmwareUpdaterConfig(ApiAppConfig):
             sender=BatchUpgradeOperation,
             dispatch_uid="batch_upgrade_operation.websocket_publish",
         )
+        batch_upgrade_operations_cancelled.connect(
+            BatchUpgradeProgressPublisher.handle_operations_cancelled,
+            sender=BatchUpgradeOperation,
+            dispatch_uid="batch_upgrade_operation.operations_cancelled_publish",
+        )
+        # celery workers publish websocket messages from a
+        # background thread, which is inherited by forked processes
+        worker_init.connect(
+            enable_background_publisher,
+            dispatch_uid="firmware_upgrader.enable_background_publisher",
+        )
 
     def connect_delete_signals(self):
         """
@@ -116,5 +135,38 @@ class FirmwareUpdaterConfig(ApiAppConfig):
             dispatch_uid="organization.pre_delete.firmware_files",
         )
 
+    def connect_authorization_signals(self):
+        """
+        Connect signals which invalidate the cached
+        authorization decisions of the websocket consumers.
+        """
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Group
+
+        User = get_user_model()
+        OrganizationUser = load_model("openwisp_users", "OrganizationUser")
+
+        post_save.connect(
+            AuthenticatedWebSocketConsumer.handle_user_changed,
+            sender=User,
+            dispatch_uid="user.websocket_auth_invalidation",
+        )
+        for signal in [post_save, post_delete]:
+            signal.connect(
+                AuthenticatedWebSocketConsumer.handle_user_changed,
+                sender=OrganizationUser,
+                dispatch_uid="organization_user.websocket_auth_invalidation",
+            )
+        for sender in [
+            User.user_permissions.through,
+            User.groups.through,
+            Group.permissions.through,
+        ]:
+            m2m_changed.connect(
+                AuthenticatedWebSocketConsumer.handle_permissions_changed,
+                sender=sender,
+                dispatch_uid=f"{sender._meta.label_lower}.websocket_auth_invalidation",
+            )
+
 
 del ApiAppConfig
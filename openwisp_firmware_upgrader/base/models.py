@@ -1,6 +1,9 @@
 import logging
+from collections import Counter
+from datetime import timedelta
 from decimal import Decimal
 from functools import partial
+from itertools import islice
 from pathlib import Path
 
 import jsonschema
@@ -8,7 +11,7 @@ import swapper
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.validators import MaxValueValidator
 from django.db import models, transaction
-from django.db.models import Q
+from django.db.models import F, Q, Subquery
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
@@ -22,6 +25,7 @@ from .. import settings as app_settings
 from ..constants import (
     DEACTIVATED_DEVICE_FIRMWARE_ERROR,
     DEACTIVATED_DEVICE_UPGRADE_OPERATION_ERROR,
+    ROLLOUT_PLAN_SCHEMA,
 )
 from ..exceptions import (
     FirmwareUpgradeOptionsException,
@@ -31,12 +35,18 @@ from ..exceptions import (
     UpgradeCancelled,
     UpgradeNotNeeded,
 )
+from ..fields import CompressedTextField
 from ..hardware import (
     FIRMWARE_IMAGE_MAP,
     FIRMWARE_IMAGE_TYPE_CHOICES,
     REVERSE_FIRMWARE_IMAGE_MAP,
 )
-from ..signals import firmware_upgrader_log_updated
+from ..signals import (
+    batch_upgrade_operations_cancelled,
+    batch_upgrade_paused,
+    device_upgrade_lock_contended,
+    firmware_upgrader_log_updated,
+)
 from ..swapper import get_model_name, load_model
 from ..tasks import (
     batch_upgrade_operation,
@@ -46,9 +56,14 @@ from ..tasks import (
 )
 from ..utils import (
     UpgradeProgress,
+    acquire_device_upgrade_lock,
+    acquire_lock,
+    get_batch_launch_lock_key,
     get_upgrader_class_for_device,
     get_upgrader_class_from_device_connection,
     get_upgrader_schema_for_device,
+    release_device_upgrade_lock,
+    release_lock,
 )
 
 logger = logging.getLogger(__name__)
@@ -172,29 +187,40 @@ class AbstractBuild(TimeStampedEditableModel):
             )
 
     def batch_upgrade(
-        self, firmwareless, upgrade_options=None, group=None, location=None
+        self,
+        firmwareless,
+        upgrade_options=None,
+        group=None,
+        location=None,
+        rollout_plan=None,
     ):
         upgrade_options = upgrade_options or {}
-        # Check if there are any devices to upgrade with the given filters
-        dry_run_result = load_model("BatchUpgradeOperation").dry_run(
-            build=self, group=group, location=location
-        )
-        # If no devices match the filters, don't start the upgrade
-        if not (
-            dry_run_result["device_firmwares"].exists()
-            or (firmwareless and dry_run_result["devices"].exists())
-        ):
-            raise ValidationError(
-                _(
-                    "No devices found matching the specified filters. "
-                    "Please adjust your group and/or location filters."
-                )
-            )
         batch = load_model("BatchUpgradeOperation")(
-            build=self, upgrade_options=upgrade_options, group=group, location=location
+            build=self,
+            upgrade_options=upgrade_options,
+            group=group,
+            location=location,
+            firmwareless=bool(firmwareless),
+            rollout_plan=rollout_plan or {},
+            launch_phase="launching",
         )
-        batch.full_clean()
-        batch.save()
+        # the waves are created together with the
+        # snapshot, hence the plan is validated first
+        batch.validate_rollout_plan()
+        # the target devices are determined only once, when the
+        # mass upgrade operation is created, the launch and the
+        # reports read them from the snapshot stored in the database
+        with transaction.atomic():
+            batch.save()
+            # If no devices match the filters, don't start the upgrade
+            if not batch.create_targets():
+                raise ValidationError(
+                    _(
+                        "No devices found matching the specified filters. "
+                        "Please adjust your group and/or location filters."
+                    )
+                )
+            batch.full_clean()
         transaction.on_commit(
             partial(batch_upgrade_operation.delay, batch.pk, firmwareless)
         )
@@ -247,6 +273,33 @@ class AbstractBuild(TimeStampedEditableModel):
             qs = qs.filter(devicelocation__location=location)
         return qs.order_by("-created")
 
+    def _find_firmwareless_device_images(self, images=None, group=None, location=None):
+        """
+        Returns the devices which have no related DeviceFirmware,
+        each one annotated with the ``firmware_image_id`` of the
+        image of this build which matches its board
+        """
+        if images is None:
+            images = self.firmwareimage_set.all()
+        board_images = {}
+        for image in images:
+            for board in image.boards:
+                board_images.setdefault(board, image.pk)
+        qs = self._find_firmwareless_devices(
+            list(board_images.keys()), group=group, location=location
+        )
+        if not board_images:
+            return qs.none()
+        return qs.annotate(
+            firmware_image_id=models.Case(
+                *[
+                    models.When(model=board, then=models.Value(image_id))
+                    for board, image_id in board_images.items()
+                ],
+                output_field=models.UUIDField(),
+            )
+        )
+
 
 def get_build_directory(instance, filename):
     build_pk = str(instance.build.pk)
@@ -398,6 +451,13 @@ class AbstractDeviceFirmware(TimeStampedEditableModel):
     class Meta:
         verbose_name = _("Device Firmware")
         abstract = True
+        indexes = [
+            # devices of a firmware category which
+            # have not been upgraded yet
+            models.Index(
+                fields=["image", "installed"], name="devicefw_image_installed_idx"
+            ),
+        ]
 
     def clean(self):
         if not hasattr(self, "image") or not hasattr(self, "device"):
@@ -570,19 +630,110 @@ class AbstractBatchUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableMode
         ("success", _("completed successfully")),
         ("failed", _("completed with some failures")),
         ("cancelled", _("completed with some cancellations")),
+        ("paused", _("paused because of too many failures")),
     )
     status = models.CharField(
         max_length=12, choices=STATUS_CHOICES, default=STATUS_CHOICES[0][0]
     )
+    # failures which happened before the last resume
+    # are not considered by the circuit breaker
+    resumed = models.DateTimeField(blank=True, null=True, editable=False)
+    firmwareless = models.BooleanField(
+        _("upgrade firmwareless devices"),
+        default=False,
+        help_text=_(
+            "whether devices which do not have a related "
+            "firmware image yet are upgraded too"
+        ),
+    )
+    LAUNCH_PHASE_CHOICES = (
+        ("pending", _("target devices not determined yet")),
+        ("launching", _("launching upgrades of the target devices")),
+        ("completed", _("all the devices have been reached")),
+        ("cancelled", _("launch cancelled by the user")),
+    )
+    # checkpoint of the launch of the upgrade operations,
+    # allows to resume launches which have been interrupted
+    launch_phase = models.CharField(
+        max_length=12,
+        choices=LAUNCH_PHASE_CHOICES,
+        default=LAUNCH_PHASE_CHOICES[0][0],
+        editable=False,
+    )
+    launch_cursor = models.UUIDField(blank=True, null=True, editable=False)
+    # statistics of the upgrade operations which have been archived
+    archived_operations = models.JSONField(default=dict, blank=True, editable=False)
+    # mass upgrade operation whose failures are retried by this one
+    parent = models.ForeignKey(
+        get_model_name("BatchUpgradeOperation"),
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        editable=False,
+        related_name="retries",
+        verbose_name=_("retry of"),
+    )
+    rollout_plan = models.JSONField(
+        _("rollout plan"),
+        default=dict,
+        blank=True,
+        help_text=_(
+            "upgrades the target devices in waves, each wave is launched "
+            "only if the previous one was successful"
+        ),
+    )
+
+    # counters of the upgrade operations, maintained with
+    # atomic increments like the counters of the waves
+    total_targets = models.PositiveIntegerField(default=0, editable=False)
+    launched_operations = models.PositiveIntegerField(default=0, editable=False)
+    completed_operations = models.PositiveIntegerField(default=0, editable=False)
+    failed_operations = models.PositiveIntegerField(default=0, editable=False)
+
+    # upgrade operations which can be retried with ``retry_failed``
+    RETRY_STATUSES = ["failed", "aborted", "cancelled"]
+    COUNTER_FIELDS = [
+        "total_targets",
+        "launched_operations",
+        "completed_operations",
+        "failed_operations",
+    ]
 
     class Meta:
         abstract = True
         verbose_name = _("Mass upgrade operation")
         verbose_name_plural = _("Mass upgrade operations")
+        indexes = [
+            models.Index(fields=["-created", "-id"], name="batchupgrade_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.build} ({timezone.localtime(self.created).strftime('%Y-%m-%d %H:%M:%S')})"
 
+    def save(self, *args, **kwargs):
+        # the counters are changed only by ``increment_counters``,
+        # their values in memory may be stale and are not saved
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        # the events of the outbox are written in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def increment_counters(self, **increments):
+        """
+        increments atomically the counters of the upgrade operations,
+        eg: ``increment_counters(completed_operations=1)``
+        """
+        increments = {
+            field: F(field) + value for field, value in increments.items() if value
+        }
+        if increments:
+            self._meta.model.objects.filter(pk=self.pk).update(**increments)
+
     def clean(self):
         super().clean()
         if (
@@ -611,13 +762,322 @@ class AbstractBatchUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableMode
                     )
                 }
             )
+        self.validate_rollout_plan()
 
-    def upgrade(self, firmwareless):
+    def validate_rollout_plan(self):
+        if not self.rollout_plan:
+            return
+        try:
+            jsonschema.Draft4Validator(ROLLOUT_PLAN_SCHEMA).validate(self.rollout_plan)
+        except jsonschema.ValidationError as error:
+            raise ValidationError(
+                {
+                    "rollout_plan": _("The rollout plan is invalid: %(error)s")
+                    % {"error": error.message}
+                }
+            )
+
+    @property
+    def is_launched(self):
+        return self.launch_phase == "completed"
+
+    def upgrade(self, firmwareless=None):
+        """
+        Launches the upgrade operations of the target devices,
+        resumes from the last checkpoint if a previous launch
+        has been interrupted
+        """
+        lock_key = get_batch_launch_lock_key(self.pk)
+        acquired, holder = acquire_lock(lock_key, self.pk)
+        # a launch of this batch is already running,
+        # eg: duplicate delivery of the same celery task
+        if not acquired:
+            logger.info(f"Mass upgrade operation {self.pk} is already being launched")
+            return
+        try:
+            self._launch(firmwareless)
+        finally:
+            release_lock(lock_key, self.pk)
+
+    def _launch(self, firmwareless):
+        if firmwareless is not None:
+            self.firmwareless = bool(firmwareless)
+        if self.launch_phase in ["completed", "cancelled"] or self.status == "paused":
+            return
         self.status = "in-progress"
         self.save()
-        self.upgrade_related_devices()
-        if firmwareless:
-            self.upgrade_firmwareless_devices()
+        # mass upgrade operations which have not been
+        # created with ``Build.batch_upgrade``
+        if self.launch_phase == "pending":
+            with transaction.atomic():
+                self.create_targets()
+                self._set_launch_phase("launching")
+        if self.upgrade_targets():
+            self._set_launch_phase("completed")
+            # the upgrade operations may have completed during the launch
+            self.calculate_and_update_status()
+
+    def _set_launch_phase(self, phase):
+        self.launch_phase = phase
+        self.launch_cursor = None
+        self.save(update_fields=["launch_phase", "launch_cursor"])
+
+    def _launch_in_chunks(self, queryset, cursor_field, launch):
+        """
+        Walks ``queryset`` with a keyset cursor on ``cursor_field``,
+        calls ``launch`` on each object and persists the cursor
+        after each chunk, returns ``False`` if the launch has been
+        interrupted because the batch has been paused or cancelled
+        """
+        chunk_size = app_settings.BATCH_LAUNCH_CHUNK_SIZE
+        queryset = queryset.order_by(cursor_field)
+        while True:
+            if (
+                self._meta.model.objects.filter(pk=self.pk)
+                .filter(Q(status="paused") | Q(launch_phase="cancelled"))
+                .exists()
+            ):
+                logger.warning(
+                    f"Launch of mass upgrade operation {self.pk} interrupted"
+                )
+                return False
+            qs = queryset
+            if self.launch_cursor:
+                qs = qs.filter(**{f"{cursor_field}__gt": self.launch_cursor})
+            chunk = list(qs[:chunk_size])
+            if not chunk:
+                return True
+            # the upgrade operations of the chunk are committed together
+            # with the checkpoint, therefore resuming an interrupted launch
+            # does not create duplicate upgrade operations
+            with transaction.atomic():
+                for obj in chunk:
+                    launch(obj)
+                self.launch_cursor = getattr(chunk[-1], cursor_field)
+                self.save(update_fields=["launch_cursor"])
+            if len(chunk) < chunk_size:
+                return True
+
+    def resume(self):
+        """
+        Resumes a mass upgrade operation which has been paused
+        or whose launch has been interrupted before reaching
+        all the devices
+        """
+        if self.launch_phase == "cancelled":
+            raise ValueError(
+                _("The launch of this mass upgrade operation has been cancelled")
+            )
+        if self.status == "paused":
+            self.status = "in-progress"
+            self.resumed = timezone.now()
+            self.save(update_fields=["status", "resumed"])
+            # resuming a halted staged rollout promotes the halted wave
+            self.batchupgradewave_set.filter(status="halted").update(status="completed")
+            if self.is_launched:
+                # the upgrade operations may have completed while paused
+                self.calculate_and_update_status()
+        elif self.is_launched:
+            raise ValueError(
+                _("All the devices of this mass upgrade operation have been reached")
+            )
+        if not self.is_launched:
+            transaction.on_commit(
+                partial(batch_upgrade_operation.delay, self.pk, self.firmwareless)
+            )
+
+    def pause(self, reason=""):
+        """
+        Stops the launch of further upgrades and cancels the
+        upgrade operations which have not reached the point of
+        no return (``UpgradeProgress.CANCELLATION_THRESHOLD``),
+        returns ``False`` if the batch was already paused
+        """
+        updated = (
+            self._meta.model.objects.filter(pk=self.pk)
+            .exclude(status="paused")
+            .update(status="paused")
+        )
+        if not updated:
+            return False
+        self.status = "paused"
+        logger.warning(f"Mass upgrade operation {self.pk} paused: {reason}")
+        self.cancel_operations()
+        batch_upgrade_paused.send(sender=self.__class__, instance=self, reason=reason)
+        return True
+
+    def retry_failed(self):
+        """
+        Creates a mass upgrade operation which upgrades again the
+        devices whose upgrade operations have failed, have been
+        aborted or cancelled, with the same upgrade options
+        """
+        if self.status in ["idle", "in-progress", "paused"]:
+            raise ValueError(_("The mass upgrade operation has not completed yet"))
+        batch = self._meta.model(
+            build=self.build,
+            upgrade_options=self.upgrade_options,
+            group=self.group,
+            location=self.location,
+            firmwareless=self.firmwareless,
+            parent=self,
+            launch_phase="launching",
+        )
+        with transaction.atomic():
+            batch.save()
+            if not batch.create_targets(self._find_failed_targets()):
+                raise ValueError(_("There are no failed upgrade operations to retry"))
+        transaction.on_commit(
+            partial(batch_upgrade_operation.delay, batch.pk, batch.firmwareless)
+        )
+        return batch
+
+    def _find_failed_targets(self):
+        """
+        Yields a ``(device_id, image_id)`` tuple for each device
+        whose upgrade has not succeeded in this mass upgrade operation
+        """
+        operations = self.upgradeoperation_set
+        failed = (
+            operations.filter(
+                status__in=self.RETRY_STATUSES,
+                image__isnull=False,
+                device___is_deactivated=False,
+            )
+            .exclude(device__in=operations.filter(status="success").values("device"))
+            .order_by("device_id", "-created")
+            .values_list("device_id", "image_id")
+        )
+        last_device_id = None
+        for device_id, image_id in failed.iterator():
+            # a device may have been upgraded more than once,
+            # its most recent upgrade operation is retried
+            if device_id != last_device_id:
+                yield device_id, image_id
+            last_device_id = device_id
+
+    def cancel(self):
+        """
+        Cancels the upgrade operations which have not reached the
+        point of no return and stops the launch of the devices which
+        have not been reached yet, returns the number of cancelled
+        upgrade operations
+        """
+        if not self.is_launched:
+            # the launch stops before its next chunk and the
+            # batch stays cancelled, it cannot be resumed
+            self.status = "cancelled"
+            self.launch_phase = "cancelled"
+            self.launch_cursor = None
+            self.save(update_fields=["status", "launch_phase", "launch_cursor"])
+        return self.cancel_operations()
+
+    def cancel_operations(self):
+        """
+        Cancels in bulk the upgrade operations which have not reached
+        ``UpgradeProgress.CANCELLATION_THRESHOLD``: the status is changed
+        with one UPDATE query, the log lines are appended with one bulk
+        update and a single ``batch_upgrade_operations_cancelled`` signal
+        is sent, returns the number of cancelled upgrade operations
+        """
+        UpgradeOperation = load_model("UpgradeOperation")
+        line = str(_("Upgrade operation has been cancelled by user"))
+        with transaction.atomic():
+            # the rows are locked to avoid overwriting log lines
+            # which are written concurrently by the upgrade workers
+            operations = list(
+                self.upgradeoperation_set.filter(
+                    status=UpgradeOperation.CANCELLABLE_STATUS,
+                    progress__lt=UpgradeProgress.CANCELLATION_THRESHOLD,
+                )
+                .select_for_update()
+                .only("id", "device", "log")
+            )
+            if not operations:
+                return 0
+            modified = timezone.now()
+            UpgradeOperation.objects.filter(
+                pk__in=[operation.pk for operation in operations]
+            ).update(status="cancelled", modified=modified)
+            for operation in operations:
+                operation.log = f"{operation.log}\n{line}" if operation.log else line
+            UpgradeOperation.objects.bulk_update(
+                operations, ["log"], batch_size=app_settings.BATCH_LAUNCH_CHUNK_SIZE
+            )
+            self.increment_counters(completed_operations=len(operations))
+            if self.rollout_plan:
+                self._update_waves(operations, "cancelled")
+            status, stats = self.calculate_and_update_status()
+        logger.info(
+            f"{len(operations)} upgrade operations of mass upgrade "
+            f"operation {self.pk} have been cancelled"
+        )
+        batch_upgrade_operations_cancelled.send(
+            sender=self.__class__,
+            instance=self,
+            operation_ids=[operation.pk for operation in operations],
+            modified=modified,
+            stats=stats,
+        )
+        return len(operations)
+
+    def _update_waves(self, operations, status):
+        """
+        increments the counters of the waves of the staged
+        rollout which include the upgrade operations
+        """
+        BatchUpgradeWave = load_model("BatchUpgradeWave")
+        numbers = Counter(
+            self.batchupgradetarget_set.filter(
+                device__in=[operation.device_id for operation in operations]
+            ).values_list("wave", flat=True)
+        )
+        for number, count in numbers.items():
+            BatchUpgradeWave.objects.filter(batch=self, number=number).update(
+                **{status: F(status) + count}
+            )
+        for wave in self.batchupgradewave_set.filter(number__in=numbers):
+            wave.batch = self
+            wave.check_promotion()
+
+    def check_failure_thresholds(self):
+        """
+        Circuit breaker: pauses the batch if the amount of failed
+        or aborted upgrade operations among the most recently
+        completed ones exceeds the configured thresholds
+        """
+        window = app_settings.BATCH_FAILURE_WINDOW
+        thresholds = [
+            (status, threshold)
+            for status, threshold in (
+                ("failed", app_settings.BATCH_FAILURE_THRESHOLD),
+                ("aborted", app_settings.BATCH_ABORT_THRESHOLD),
+            )
+            if threshold is not None
+        ]
+        # the circuit breaker is disabled unless configured
+        if not window or not thresholds or self.status == "paused":
+            return False
+        completed = self.upgradeoperation_set.exclude(status="in-progress")
+        if self.resumed:
+            completed = completed.filter(modified__gt=self.resumed)
+        statuses = list(
+            completed.order_by("-modified").values_list("status", flat=True)[:window]
+        )
+        # not enough upgrade operations completed yet
+        if len(statuses) < window:
+            return False
+        for status, threshold in thresholds:
+            rate = statuses.count(status) * 100 / window
+            if rate >= threshold:
+                return self.pause(
+                    _(
+                        "%(rate)d%% of the last %(window)d upgrade operations "
+                        "have %(status)s"
+                    )
+                    % {"rate": rate, "window": window, "status": status}
+                )
+        return False
 
     @staticmethod
     def dry_run(build, group=None, location=None):
@@ -632,81 +1092,217 @@ class AbstractBatchUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableMode
             "devices": firmwareless_devices,
         }
 
+    def create_targets(self, targets=None):
+        """
+        Stores the snapshot of the devices targeted by this
+        mass upgrade operation, returns the number of targets;
+        ``targets`` is an iterable of ``(device_id, image_id)``
+        tuples, defaults to the devices matching the filters
+        """
+        BatchUpgradeTarget = load_model("BatchUpgradeTarget")
+        chunk_size = app_settings.BATCH_LAUNCH_CHUNK_SIZE
+        if targets is None:
+            targets = self._find_targets()
+        targets = iter(targets)
+        count = 0
+        while True:
+            chunk = [
+                BatchUpgradeTarget(batch=self, device_id=device_id, image_id=image_id)
+                for device_id, image_id in islice(targets, chunk_size)
+            ]
+            if not chunk:
+                break
+            BatchUpgradeTarget.objects.bulk_create(chunk)
+            count += len(chunk)
+        self.increment_counters(total_targets=count)
+        if self.rollout_plan:
+            self.create_waves(count)
+        return count
+
+    def create_waves(self, total):
+        """
+        Splits the snapshot of the target devices in the waves
+        of the rollout plan: the canary wave, the waves with
+        the sizes listed in the plan, and a last wave
+        with the remaining devices
+        """
+        sizes = []
+        canary = self.rollout_plan.get("canary")
+        if canary:
+            sizes.append(max(1, int(total * canary // 100)))
+        sizes.extend(self.rollout_plan.get("waves", []))
+        BatchUpgradeWave = load_model("BatchUpgradeWave")
+        targets = self.batchupgradetarget_set.order_by("id")
+        waves = []
+        start = 0
+        for size in sizes + [total]:
+            size = min(size, total - start)
+            if size <= 0:
+                break
+            # the targets are inserted in sequence, therefore
+            # each wave is assigned with one UPDATE on an id range
+            first_id = targets.values_list("id", flat=True)[start]
+            last_id = targets.values_list("id", flat=True)[start + size - 1]
+            targets.filter(id__gte=first_id, id__lte=last_id).update(wave=len(waves))
+            waves.append(BatchUpgradeWave(batch=self, number=len(waves), size=size))
+            start += size
+        BatchUpgradeWave.objects.bulk_create(waves)
+
+    def _find_targets(self):
+        """
+        Yields a ``(device_id, image_id)`` tuple
+        for each device which shall be upgraded
+        """
+        images = list(self.build.firmwareimage_set.all())
+        type_images = {image.type: image.pk for image in images}
+        device_firmwares = (
+            self.build._find_related_device_firmwares(
+                group=self.group, location=self.location
+            )
+            .order_by()
+            .values_list("device_id", "image__type")
+        )
+        for device_id, image_type in device_firmwares.iterator():
+            # skip devices which have no image in this build
+            if image_type in type_images:
+                yield device_id, type_images[image_type]
+        if not self.firmwareless:
+            return
+        devices = (
+            self.build._find_firmwareless_device_images(
+                images, group=self.group, location=self.location
+            )
+            .order_by()
+            .values_list("pk", "firmware_image_id")
+        )
+        yield from devices.iterator()
+
+    def upgrade_targets(self):
+        """
+        upgrades the devices stored in the
+        snapshot of the target devices
+        """
+        targets = self.batchupgradetarget_set.select_related(
+            "device", "image__build__category", "device__devicefirmware__image"
+        )
+        if not self.rollout_plan:
+            return self._launch_in_chunks(targets, "device_id", self._upgrade_target)
+        return self._upgrade_next_wave(targets)
+
     def upgrade_related_devices(self):
         """
-        upgrades all devices which have an
+        upgrades the target devices which have an
         existing related DeviceFirmware
         """
-        device_firmwares = self.build._find_related_device_firmwares(
-            group=self.group, location=self.location
-        )
-        for device_fw in device_firmwares:
-            image = self.build.firmwareimage_set.filter(
-                type=device_fw.image.type
-            ).first()
-            if image:
-                device_fw.image = image
-                device_fw.full_clean()
-                device_fw.save(self, upgrade_options=self.upgrade_options)
+        self._upgrade_targets_without_checkpoint(device__devicefirmware__isnull=False)
 
     def upgrade_firmwareless_devices(self):
         """
-        upgrades all devices which do not
+        upgrades the target devices which do not
         have a related DeviceFirmware yet
         (referred as "firmwareless")
         """
-        # for each image, find related "firmwareless"
-        # devices and perform upgrade one by one
-        for image in self.build.firmwareimage_set.all():
-            devices = self.build._find_firmwareless_devices(
-                image.boards, group=self.group, location=self.location
-            )
-            for device in devices:
-                DeviceFirmware = load_model("DeviceFirmware")
-                device_fw = DeviceFirmware(device=device, image=image)
-                device_fw.full_clean()
-                device_fw.save(self, upgrade_options=self.upgrade_options)
+        self._upgrade_targets_without_checkpoint(device__devicefirmware__isnull=True)
+
+    def _upgrade_targets_without_checkpoint(self, **filters):
+        # kept for backward compatibility, the launch
+        # of mass upgrade operations uses ``upgrade_targets``
+        if self.launch_phase == "pending":
+            with transaction.atomic():
+                self.create_targets()
+                self._set_launch_phase("launching")
+        targets = self.batchupgradetarget_set.filter(**filters).select_related(
+            "device", "image__build__category", "device__devicefirmware__image"
+        )
+        for target in list(targets.order_by("device_id")):
+            self._upgrade_target(target)
+
+    def _upgrade_next_wave(self, targets):
+        """
+        upgrades the devices of the next wave of a staged rollout,
+        returns ``True`` if the last wave has been launched
+        """
+        wave = (
+            self.batchupgradewave_set.exclude(status="completed")
+            .order_by("number")
+            .first()
+        )
+        if wave is None:
+            return True
+        # the previous wave has not been promoted yet
+        if wave.status not in ["pending", "launching"]:
+            return not self.batchupgradewave_set.filter(status="pending").exists()
+        wave.batch = self
+        if wave.status == "pending":
+            wave.status = "launching"
+            wave.launched = timezone.now()
+            wave.save(update_fields=["status", "launched"])
+        targets = targets.filter(wave=wave.number)
+        if not self._launch_in_chunks(targets, "device_id", self._upgrade_target):
+            return False
+        # devices which have been skipped are not part of the wave anymore
+        wave.size = targets.count()
+        wave.status = "launched"
+        wave.save(update_fields=["size", "status"])
+        self.launch_cursor = None
+        self.save(update_fields=["launch_cursor"])
+        # the upgrade operations may have completed already
+        wave.refresh_from_db(fields=wave.COUNTER_FIELDS)
+        wave.check_promotion()
+        return not self.batchupgradewave_set.filter(status="pending").exists()
+
+    def _upgrade_target(self, target):
+        DeviceFirmware = load_model("DeviceFirmware")
+        device = target.device
+        try:
+            device_fw = device.devicefirmware
+        except DeviceFirmware.DoesNotExist:
+            device_fw = DeviceFirmware(device=device)
+        # devices which have been deactivated or which have been
+        # upgraded by other means after the creation of the snapshot
+        # are removed from it, otherwise the batch would never complete
+        if device.is_deactivated() or (
+            device_fw.installed and device_fw.image_id == target.image_id
+        ):
+            target.delete()
+            self.increment_counters(total_targets=-1)
+            return
+        device_fw.image = target.image
+        device_fw.full_clean()
+        device_fw.save(self, upgrade_options=self.upgrade_options)
 
     @cached_property
     def upgrade_operations(self):
         return self.upgradeoperation_set.all()
 
     @cached_property
+    def operation_stats(self):
+        return self.get_operation_stats()
+
+    @property
     def total_operations(self):
-        return self.upgrade_operations.count()
+        return self.operation_stats["total_operations"]
 
     @property
     def progress_report(self):
-        completed = self.upgrade_operations.exclude(status="in-progress").count()
-        return _(f"{completed} out of {self.total_operations}")
+        stats = self.operation_stats
+        return _(f"{stats['completed']} out of {stats['total_operations']}")
 
     @property
     def success_rate(self):
-        if not self.total_operations:
-            return 0
-        success = self.upgrade_operations.filter(status="success").count()
-        return self.__get_rate(success)
+        return self.__get_rate(self.operation_stats["successful"])
 
     @property
     def failed_rate(self):
-        if not self.total_operations:
-            return 0
-        failed = self.upgrade_operations.filter(status="failed").count()
-        return self.__get_rate(failed)
+        return self.__get_rate(self.operation_stats["failed"])
 
     @property
     def aborted_rate(self):
-        if not self.total_operations:
-            return 0
-        aborted = self.upgrade_operations.filter(status="aborted").count()
-        return self.__get_rate(aborted)
+        return self.__get_rate(self.operation_stats["aborted"])
 
     @property
     def cancelled_rate(self):
-        if not self.total_operations:
-            return 0
-        cancelled = self.upgrade_operations.filter(status="cancelled").count()
-        return self.__get_rate(cancelled)
+        return self.__get_rate(self.operation_stats["cancelled"])
 
     @property
     def upgrader_class(self):
@@ -717,6 +1313,10 @@ class AbstractBatchUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableMode
         return self._get_upgrader_schema()
 
     def _get_upgrader_class(self, related_device_fw=None, firmwareless_devices=None):
+        if not self._state.adding:
+            target = self.batchupgradetarget_set.select_related("device").first()
+            if target:
+                return get_upgrader_class_for_device(target.device)
         if self.upgrade_operations:
             return get_upgrader_class_for_device(self.upgrade_operations[0].device)
         related_device_fw = (
@@ -738,24 +1338,17 @@ class AbstractBatchUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableMode
         return getattr(upgrader_class, "SCHEMA", None)
 
     def __get_rate(self, number):
+        if not self.total_operations:
+            return 0
         result = Decimal(number) / Decimal(self.total_operations) * 100
         return round(result, 2)
 
-    def calculate_and_update_status(self):
+    def get_operation_stats(self):
         """
-        Calculate batch status based on operation statuses and update if changed.
-        This method consolidates all business logic for determining batch status.
-        Returns tuple of (status, stats_dict) for WebSocket publishing.
-
-        Status determination rules:
-        - 'in-progress': If any operation is still in progress
-        - 'cancelled': If completed and any operation was cancelled
-        - 'failed': If completed and any operation failed or aborted
-        - 'success': If all operations completed successfully
-        - Otherwise: Maintain current status
+        Returns the number of upgrade operations of the
+        mass upgrade grouped by status, computed in one query.
         """
-        operations = self.upgradeoperation_set
-        stats = operations.aggregate(
+        stats = self.upgradeoperation_set.aggregate(
             total_operations=models.Count("id"),
             in_progress=models.Count(
                 models.Case(
@@ -794,8 +1387,39 @@ class AbstractBatchUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableMode
                 )
             ),
         )
+        # include the upgrade operations which have been archived
+        for status, count in self.archived_operations.items():
+            stats["total_operations"] += count
+            stats["completed"] += count
+            stats["successful" if status == "success" else status] += count
+        # the launch may not have reached all the target devices yet
+        stats["total_operations"] = max(
+            stats["total_operations"], self.batchupgradetarget_set.count()
+        )
+        return stats
+
+    def calculate_and_update_status(self):
+        """
+        Calculate batch status based on operation statuses and update if changed.
+        This method consolidates all business logic for determining batch status.
+        Returns tuple of (status, stats_dict) for WebSocket publishing.
+
+        Status determination rules:
+        - 'in-progress': If any operation is still in progress
+        - 'cancelled': If completed and any operation was cancelled
+        - 'failed': If completed and any operation failed or aborted
+        - 'success': If all operations completed successfully
+        - Otherwise: Maintain current status
+        """
+        stats = self.get_operation_stats()
+        self.operation_stats = stats
         # Determine overall batch status based on individual operation statuses
-        if stats["in_progress"] > 0:
+        # the batch stays paused until it's resumed,
+        # mass upgrades whose launch was cancelled stay cancelled
+        if self.status == "paused" or self.launch_phase == "cancelled":
+            new_status = self.status
+        # waves of a staged rollout have not been launched yet
+        elif stats["in_progress"] > 0 or (self.rollout_plan and not self.is_launched):
             new_status = "in-progress"
         elif stats["failed"] > 0 or stats["aborted"] > 0:
             new_status = "failed"
@@ -811,14 +1435,142 @@ class AbstractBatchUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableMode
             new_status = self.status
         # Update status only if it has changed
         if self.status != new_status:
+            # do not overwrite a pause or a cancellation triggered concurrently
+            stopped_status = (
+                self._meta.model.objects.filter(pk=self.pk)
+                .filter(Q(status="paused") | Q(launch_phase="cancelled"))
+                .values_list("status", flat=True)
+                .first()
+            )
+            if stopped_status:
+                self.status = stopped_status
+                return self.status, stats
             self.status = new_status
             self.save(update_fields=["status"])
         return new_status, stats
 
 
+class AbstractBatchUpgradeTarget(models.Model):
+    """
+    Snapshot of the devices targeted by a mass upgrade
+    operation, stored when the mass upgrade operation is created
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    batch = models.ForeignKey(
+        get_model_name("BatchUpgradeOperation"), on_delete=models.CASCADE
+    )
+    device = models.ForeignKey(
+        swapper.get_model_name("config", "Device"), on_delete=models.CASCADE
+    )
+    image = models.ForeignKey(get_model_name("FirmwareImage"), on_delete=models.CASCADE)
+    # number of the wave of the staged rollout
+    wave = models.PositiveSmallIntegerField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
+        verbose_name = _("Mass upgrade target")
+        verbose_name_plural = _("Mass upgrade targets")
+        unique_together = ("batch", "device")
+
+    def __str__(self):
+        return f"{self.batch_id}: {self.device_id}"
+
+
+class AbstractBatchUpgradeWave(models.Model):
+    """
+    Wave of a staged rollout, its statistics are
+    maintained with counters which are incremented when
+    the upgrade operations of the wave complete
+    """
+
+    COUNTER_FIELDS = ["success", "failed", "aborted", "cancelled"]
+    STATUS_CHOICES = (
+        ("pending", _("pending")),
+        ("launching", _("launching")),
+        ("launched", _("waiting for the upgrade results")),
+        ("completed", _("completed")),
+        ("halted", _("halted because of too many failures")),
+    )
+    id = models.BigAutoField(primary_key=True)
+    batch = models.ForeignKey(
+        get_model_name("BatchUpgradeOperation"), on_delete=models.CASCADE
+    )
+    number = models.PositiveSmallIntegerField()
+    size = models.PositiveIntegerField()
+    status = models.CharField(
+        max_length=12, choices=STATUS_CHOICES, default=STATUS_CHOICES[0][0]
+    )
+    success = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    aborted = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    launched = models.DateTimeField(blank=True, null=True)
+    completed = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
+        verbose_name = _("Mass upgrade wave")
+        verbose_name_plural = _("Mass upgrade waves")
+        unique_together = ("batch", "number")
+        ordering = ("batch", "number")
+
+    def __str__(self):
+        return f"{self.batch_id}: {self.number}"
+
+    @property
+    def completed_operations(self):
+        return sum(getattr(self, field) for field in self.COUNTER_FIELDS)
+
+    @property
+    def success_rate(self):
+        if not self.size:
+            return 100
+        return round(self.success * 100 / self.size)
+
+    def check_promotion(self):
+        """
+        Once all the upgrade operations of the wave have completed,
+        schedules the launch of the next wave if the success rate
+        reaches the threshold of the rollout plan, otherwise
+        halts the wave and pauses the mass upgrade operation
+        """
+        if self.status != "launched" or self.completed_operations < self.size:
+            return
+        batch = self.batch
+        threshold = batch.rollout_plan.get(
+            "success_threshold", app_settings.ROLLOUT_SUCCESS_THRESHOLD
+        )
+        promoted = self.success_rate >= threshold
+        self.status = "completed" if promoted else "halted"
+        self.completed = timezone.now()
+        # the last upgrade operations of the wave may complete concurrently
+        if not self._meta.model.objects.filter(pk=self.pk, status="launched").update(
+            status=self.status, completed=self.completed
+        ):
+            return
+        if not promoted:
+            batch.pause(
+                _(
+                    "%(rate)d%% of the upgrade operations of wave %(number)d "
+                    "were successful"
+                )
+                % {"rate": self.success_rate, "number": self.number}
+            )
+        elif self._meta.model.objects.filter(batch=batch, status="pending").exists():
+            transaction.on_commit(
+                partial(
+                    batch_upgrade_operation.apply_async,
+                    (batch.pk, batch.firmwareless),
+                    countdown=batch.rollout_plan.get("soak_time", 0),
+                )
+            )
+
+
 class AbstractUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableModel):
 
     CANCELLABLE_STATUS = "in-progress"
+    FAILURE_STATUSES = ["failed", "aborted"]
     STATUS_CHOICES = (
         ("in-progress", _("in progress")),
         ("success", _("success")),
@@ -826,8 +1578,12 @@ class AbstractUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableModel):
         ("cancelled", _("cancelled")),  # cancelled by the user
         ("aborted", _("aborted")),  # aborted due to prerequisites not met
     )
+    # the device and the batch columns are indexed by the
+    # multi-column indexes which start with them, see Meta
     device = models.ForeignKey(
-        swapper.get_model_name("config", "Device"), on_delete=models.CASCADE
+        swapper.get_model_name("config", "Device"),
+        on_delete=models.CASCADE,
+        db_index=False,
     )
     image = models.ForeignKey(
         get_model_name("FirmwareImage"), null=True, on_delete=models.SET_NULL
@@ -835,7 +1591,12 @@ class AbstractUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableModel):
     status = models.CharField(
         max_length=12, choices=STATUS_CHOICES, default=STATUS_CHOICES[0][0]
     )
-    log = models.TextField(blank=True)
+    log = CompressedTextField(blank=True)
+    # last line of the log of the upgrade operations which
+    # have failed or have been aborted, see ``get_failure_reason``
+    failure_reason = models.CharField(
+        _("failure reason"), max_length=200, blank=True, editable=False
+    )
     progress = models.PositiveSmallIntegerField(
         default=PROGRESS_MIN,
         validators=[
@@ -847,13 +1608,46 @@ class AbstractUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableModel):
         on_delete=models.CASCADE,
         blank=True,
         null=True,
+        db_index=False,
     )
+    _old_status = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._update_old_status()
 
     def __str__(self):
         return f"{self.device} ({timezone.localtime(self.created).strftime('%Y-%m-%d %H:%M:%S')})"
 
     class Meta:
         abstract = True
+        indexes = [
+            # upgrade operations running on a device
+            models.Index(
+                fields=["device"],
+                condition=Q(status="in-progress"),
+                name="upgradeop_device_running_idx",
+            ),
+            # most recent upgrade operations of a device, a device has
+            # few of them, hence sorting them by modification time is cheap
+            models.Index(
+                fields=["device", "-created"], name="upgradeop_device_created_idx"
+            ),
+            # keyset pagination of the upgrade operations in the API
+            models.Index(fields=["-created", "-id"], name="upgradeop_created_idx"),
+            # keyset pagination of the upgrade operations of a mass upgrade
+            # in the API and in the admin and snapshots of the WebSocket
+            # API, see also the trigram index created by the migrations
+            models.Index(
+                fields=["batch", "-created", "-id"],
+                name="upgradeop_batch_created_idx",
+            ),
+            # the same filtered by status
+            models.Index(
+                fields=["batch", "status", "-created", "-id"],
+                name="upgradeop_batch_status_idx",
+            ),
+        ]
 
     def clean(self):
         super().clean()
@@ -921,6 +1715,8 @@ class AbstractUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableModel):
             # 2. get any log ling which may have been written
             #    concurrently in background workers, so we avoid overwriting
             self.refresh_from_db()
+            if self.batch_id:
+                self._count_in_batch()
             self.log_line(_("Upgrade operation has been cancelled by user"))
 
     def _recoverable_failure_handler(self, recoverable, error):
@@ -944,6 +1740,42 @@ class AbstractUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableModel):
             )
             self.save()
             return
+        # prevent multiple upgrade operations for
+        # the same device running at the same time
+        if not self._acquire_upgrade_lock():
+            return
+        try:
+            self._upgrade(recoverable)
+        finally:
+            release_device_upgrade_lock(self.device_id, self.pk)
+
+    def _acquire_upgrade_lock(self):
+        acquired, holder = acquire_device_upgrade_lock(self.device_id, self.pk)
+        if acquired:
+            return True
+        duplicate = holder == str(self.pk)
+        device_upgrade_lock_contended.send(
+            sender=self.__class__, instance=self, holder=holder, duplicate=duplicate
+        )
+        # this same operation is already being executed by another
+        # worker (eg: duplicate delivery of the same celery task),
+        # nothing to do here, the other worker will take care of it
+        if duplicate:
+            logger.info(
+                f"Upgrade operation {self.pk} is already running, skipping duplicate"
+            )
+            return False
+        self._abort_concurrent_upgrade()
+        return False
+
+    def _abort_concurrent_upgrade(self):
+        message = _("Another upgrade operation is in progress, aborting...")
+        logger.warning(message)
+        self.log_line(message, save=False)
+        self.status = "aborted"
+        self.save()
+
+    def _upgrade(self, recoverable):
         DeviceConnection = swapper.load_model("connection", "DeviceConnection")
         try:
             conn = DeviceConnection.get_working_connection(self.device)
@@ -977,19 +1809,15 @@ class AbstractUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableModel):
             self.save()
             return
         installed = False
-        # prevent multiple upgrade operations for
-        # the same device running at the same time
-        qs = (
+        # operations which have not been started yet are flagged as
+        # in-progress too, do not flash the device if any is pending
+        if (
             load_model("UpgradeOperation")
             .objects.filter(device=self.device, status="in-progress")
             .exclude(pk=self.pk)
-        )
-        if qs.exists():
-            message = _("Another upgrade operation is in progress, aborting...")
-            logger.warning(message)
-            self.log_line(message, save=False)
-            self.status = "aborted"
-            self.save()
+            .exists()
+        ):
+            self._abort_concurrent_upgrade()
             return
         upgrader_class = get_upgrader_class_from_device_connection(conn)
         if not upgrader_class:
@@ -1057,13 +1885,147 @@ class AbstractUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableModel):
             if self._state.adding:
                 raise
 
+    def get_failure_reason(self):
+        """
+        Returns the last line of the log, which
+        describes why the upgrade operation failed
+        """
+        lines = [line.strip() for line in self.log.splitlines() if line.strip()]
+        if not lines:
+            return ""
+        return lines[-1][: self._meta.get_field("failure_reason").max_length]
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        # logs which have not been loaded are not decompressed
+        if (
+            self.status in self.FAILURE_STATUSES
+            and not self.failure_reason
+            and isinstance(self.__dict__.get("log"), str)
+        ):
+            self.failure_reason = self.get_failure_reason()
+        completed = (
+            not adding
+            and self._old_status == "in-progress"
+            and self.status != "in-progress"
+        )
+        # the events of the outbox are written in the same transaction
+        with transaction.atomic():
+            if completed:
+                # the operation may have been completed meanwhile,
+                # e.g. by a cancellation, the transition is counted
+                # only by the query which changes the status
+                completed = bool(
+                    self._meta.model.objects.filter(
+                        pk=self.pk, status="in-progress"
+                    ).update(status=self.status)
+                )
+            super().save(*args, **kwargs)
+        self._update_old_status()
+        if self.batch_id and (adding or completed):
+            self._count_in_batch(adding)
         # when an operation is completed
         # trigger an update on the batch operation
         if self.batch and self.status != "in-progress":
+            if self.status in self.FAILURE_STATUSES:
+                self.batch.check_failure_thresholds()
             self.batch.calculate_and_update_status()
 
+    @classmethod
+    def archive(cls, days):
+        """
+        Moves the completed upgrade operations older than ``days``
+        to the archive, in chunks of ``RETENTION_CHUNK_SIZE``,
+        returns the number of archived upgrade operations
+        """
+        ArchivedUpgradeOperation = load_model("ArchivedUpgradeOperation")
+        BatchUpgradeOperation = load_model("BatchUpgradeOperation")
+        queryset = (
+            cls.objects.exclude(status="in-progress")
+            .filter(modified__lt=timezone.now() - timedelta(days=days))
+            # the statistics of running mass upgrades are still changing
+            .exclude(batch__status__in=["in-progress", "paused"])
+            .order_by("modified")
+        )
+        chunk_size = app_settings.RETENTION_CHUNK_SIZE
+        count = 0
+        while True:
+            chunk = list(queryset[:chunk_size])
+            if not chunk:
+                return count
+            # each chunk is moved in a short transaction,
+            # which keeps the tables available in the meantime
+            with transaction.atomic():
+                ArchivedUpgradeOperation.objects.bulk_create(
+                    [
+                        ArchivedUpgradeOperation.from_operation(operation)
+                        for operation in chunk
+                    ],
+                    ignore_conflicts=True,
+                )
+                summaries = Counter(
+                    (operation.batch_id, operation.status)
+                    for operation in chunk
+                    if operation.batch_id
+                )
+                batches = BatchUpgradeOperation.objects.select_for_update().filter(
+                    pk__in={batch_id for batch_id, _status in summaries}
+                )
+                for batch in batches:
+                    for (batch_id, status), number in summaries.items():
+                        if batch_id == batch.pk:
+                            archived = batch.archived_operations.get(status, 0)
+                            batch.archived_operations[status] = archived + number
+                    batch.save(update_fields=["archived_operations"])
+                cls.objects.filter(
+                    pk__in=[operation.pk for operation in chunk]
+                ).delete()
+            count += len(chunk)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or "status" in fields:
+            self._update_old_status()
+
+    def _update_old_status(self):
+        # avoids loading the field when it's deferred
+        self._old_status = self.__dict__.get("status")
+
+    def _count_in_batch(self, adding=False):
+        """
+        increments the counters of the mass upgrade and of the wave
+        of the staged rollout when the operation is created or
+        completed, each transition must be counted only once
+        """
+        finished = self.status != "in-progress"
+        self.batch.increment_counters(
+            launched_operations=int(adding),
+            completed_operations=int(finished),
+            failed_operations=int(self.status in self.FAILURE_STATUSES),
+        )
+        if finished and not adding and self.batch.rollout_plan:
+            self._update_wave()
+
+    def _update_wave(self):
+        """
+        increments the counter of the wave of the
+        staged rollout which includes this operation
+        """
+        BatchUpgradeWave = load_model("BatchUpgradeWave")
+        wave_number = (
+            load_model("BatchUpgradeTarget")
+            .objects.filter(batch_id=self.batch_id, device_id=self.device_id)
+            .values("wave")[:1]
+        )
+        waves = BatchUpgradeWave.objects.filter(
+            batch_id=self.batch_id, number=Subquery(wave_number)
+        )
+        waves.update(**{self.status: F(self.status) + 1})
+        wave = waves.first()
+        if wave:
+            wave.batch = self.batch
+            wave.check_promotion()
+
     @property
     def upgrader_schema(self):
         return get_upgrader_schema_for_device(self.device)
@@ -1071,3 +2033,106 @@ class AbstractUpgradeOperation(UpgradeOptionsMixin, TimeStampedEditableModel):
     @property
     def upgrader_class(self):
         return get_upgrader_class_for_device(self.device)
+
+
+class AbstractArchivedUpgradeOperation(models.Model):
+    """
+    Compact copy of an upgrade operation which
+    has been removed by the retention policy
+    """
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    device = models.ForeignKey(
+        swapper.get_model_name("config", "Device"), on_delete=models.CASCADE
+    )
+    image = models.ForeignKey(
+        get_model_name("FirmwareImage"), null=True, on_delete=models.SET_NULL
+    )
+    batch = models.ForeignKey(
+        get_model_name("BatchUpgradeOperation"),
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+    )
+    status = models.CharField(
+        max_length=12, choices=AbstractUpgradeOperation.STATUS_CHOICES
+    )
+    log = CompressedTextField(blank=True)
+    created = models.DateTimeField()
+    modified = models.DateTimeField()
+
+    class Meta:
+        abstract = True
+        verbose_name = _("Archived upgrade operation")
+        verbose_name_plural = _("Archived upgrade operations")
+
+    def __str__(self):
+        return f"{self.device_id} ({timezone.localtime(self.created).strftime('%Y-%m-%d %H:%M:%S')})"
+
+    @classmethod
+    def from_operation(cls, operation):
+        return cls(
+            id=operation.pk,
+            device_id=operation.device_id,
+            image_id=operation.image_id,
+            batch_id=operation.batch_id,
+            status=operation.status,
+            log=operation.log,
+            created=operation.created,
+            modified=operation.modified,
+        )
+
+
+class AbstractUpgradeEvent(models.Model):
+    """
+    Sequenced log of the messages published for upgrade operations,
+    devices and mass upgrade operations, which allows clients to
+    resume the streams of events from the last event they received.
+
+    It's also the outbox of the changes of upgrade operations: the
+    events which have not been published yet are written in the same
+    transaction of the change and published by ``UpgradeEventRelay``.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    # plain identifiers are used instead of foreign keys
+    # to keep writes cheap and the log append-only
+    device_id = models.UUIDField(blank=True, null=True)
+    operation_id = models.UUIDField(blank=True, null=True)
+    batch_id = models.UUIDField(blank=True, null=True)
+    organization_id = models.UUIDField(blank=True, null=True)
+    # message encoded in JSON, which is sent as is to the clients
+    payload = models.TextField()
+    published = models.BooleanField(default=True)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        abstract = True
+        verbose_name = _("Upgrade event")
+        verbose_name_plural = _("Upgrade events")
+        indexes = [
+            models.Index(fields=["device_id", "id"], name="upgradeevent_device_idx"),
+            models.Index(
+                fields=["operation_id", "id"], name="upgradeevent_operation_idx"
+            ),
+            models.Index(fields=["batch_id", "id"], name="upgradeevent_batch_idx"),
+            # the outbox is usually a tiny fraction of the log
+            models.Index(
+                fields=["id"],
+                condition=Q(published=False),
+                name="upgradeevent_outbox_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return str(self.pk)
+
+    @classmethod
+    def purge(cls, max_age):
+        """
+        Deletes the published events older than ``max_age``
+        seconds, returns the number of deleted events
+        """
+        cutoff = timezone.now() - timedelta(seconds=max_age)
+        count, _ = cls.objects.filter(created__lt=cutoff, published=True).delete()
+        return count
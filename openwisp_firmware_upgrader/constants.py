@@ -6,3 +6,22 @@ DEACTIVATED_DEVICE_FIRMWARE_ERROR = _(
 DEACTIVATED_DEVICE_UPGRADE_OPERATION_ERROR = _(
     "Upgrade operations are not allowed for deactivated devices."
 )
+
+ROLLOUT_PLAN_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "properties": {
+        "canary": {
+            "type": "number",
+            "minimum": 0,
+            "exclusiveMinimum": True,
+            "maximum": 100,
+        },
+        "waves": {
+            "type": "array",
+            "items": {"type": "integer", "minimum": 1},
+        },
+        "soak_time": {"type": "integer", "minimum": 0},
+        "success_threshold": {"type": "number", "minimum": 0, "maximum": 100},
+    },
+}
@@ -0,0 +1,63 @@
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from .utils import compress_log, decompress_log
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """
+    Decompresses the value loaded from the database only
+    the first time it's accessed, then caches the text
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, (bytes, memoryview)):
+            value = decompress_log(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    # being a data descriptor, ``__get__`` is called
+    # even when the value is in the instance dictionary
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    Text field stored compressed in a binary column,
+    see ``openwisp_firmware_upgrader.utils.compress_log``
+    """
+
+    descriptor_class = CompressedTextDescriptor
+
+    def db_type(self, connection):
+        return models.BinaryField().db_type(connection)
+
+    def from_db_value(self, value, expression, connection):
+        # decompressed lazily by ``CompressedTextDescriptor``
+        if isinstance(value, memoryview):
+            return bytes(value)
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return decompress_log(value)
+        return super().to_python(value)
+
+    def pre_save(self, model_instance, add):
+        # values which have never been accessed are
+        # saved as they are, without compressing them again
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, bytes):
+            return value
+        return super().pre_save(model_instance, add)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = compress_log(value)
+        return connection.Database.Binary(value)
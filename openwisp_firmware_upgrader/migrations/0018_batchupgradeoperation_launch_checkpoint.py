@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:40
+
+from django.db import migrations, models
+
+from . import mark_batch_upgrade_operations_launched
+
+
+def mark_batch_upgrade_operations_launched_helper(apps, schema_editor):
+    mark_batch_upgrade_operations_launched(apps, schema_editor, "firmware_upgrader")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firmware_upgrader", "0017_alter_batchupgradeoperation_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="firmwareless",
+            field=models.BooleanField(
+                default=False,
+                help_text="whether devices which do not have a related firmware image yet are upgraded too",
+                verbose_name="upgrade firmwareless devices",
+            ),
+        ),
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="launch_cursor",
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="launch_phase",
+            field=models.CharField(
+                choices=[
+                    ("pending", "target devices not determined yet"),
+                    ("launching", "launching upgrades of the target devices"),
+                    ("completed", "all the devices have been reached"),
+                ],
+                default="pending",
+                editable=False,
+                max_length=12,
+            ),
+        ),
+        migrations.RunPython(
+            mark_batch_upgrade_operations_launched_helper,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
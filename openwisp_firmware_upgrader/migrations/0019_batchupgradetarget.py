@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:46
+
+import django.db.models.deletion
+import swapper
+from django.conf import settings
+from django.db import migrations, models
+
+from . import create_batch_upgrade_targets
+
+
+def create_batch_upgrade_targets_helper(apps, schema_editor):
+    create_batch_upgrade_targets(apps, schema_editor, "firmware_upgrader")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firmware_upgrader", "0018_batchupgradeoperation_launch_checkpoint"),
+        migrations.swappable_dependency(settings.CONFIG_DEVICE_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BatchUpgradeTarget",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "batch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=swapper.get_model_name(
+                            "firmware_upgrader", "BatchUpgradeOperation"
+                        ),
+                    ),
+                ),
+                (
+                    "device",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.CONFIG_DEVICE_MODEL,
+                    ),
+                ),
+                (
+                    "image",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=swapper.get_model_name("firmware_upgrader", "FirmwareImage"),
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Mass upgrade target",
+                "verbose_name_plural": "Mass upgrade targets",
+                "abstract": False,
+                "swappable": swapper.swappable_setting(
+                    "firmware_upgrader", "BatchUpgradeTarget"
+                ),
+                "unique_together": {("batch", "device")},
+            },
+        ),
+        migrations.RunPython(
+            create_batch_upgrade_targets_helper,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
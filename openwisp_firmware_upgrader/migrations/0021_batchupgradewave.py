@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:57
+
+import django.db.models.deletion
+import swapper
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firmware_upgrader", "0020_batchupgradeoperation_circuit_breaker"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="rollout_plan",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="upgrades the target devices in waves, each wave is launched only if the previous one was successful",
+                verbose_name="rollout plan",
+            ),
+        ),
+        migrations.AddField(
+            model_name="batchupgradetarget",
+            name="wave",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="BatchUpgradeWave",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("number", models.PositiveSmallIntegerField()),
+                ("size", models.PositiveIntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "pending"),
+                            ("launching", "launching"),
+                            ("launched", "waiting for the upgrade results"),
+                            ("completed", "completed"),
+                            ("halted", "halted because of too many failures"),
+                        ],
+                        default="pending",
+                        max_length=12,
+                    ),
+                ),
+                ("success", models.PositiveIntegerField(default=0)),
+                ("failed", models.PositiveIntegerField(default=0)),
+                ("aborted", models.PositiveIntegerField(default=0)),
+                ("cancelled", models.PositiveIntegerField(default=0)),
+                ("launched", models.DateTimeField(blank=True, null=True)),
+                ("completed", models.DateTimeField(blank=True, null=True)),
+                (
+                    "batch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=swapper.get_model_name(
+                            "firmware_upgrader", "BatchUpgradeOperation"
+                        ),
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Mass upgrade wave",
+                "verbose_name_plural": "Mass upgrade waves",
+                "ordering": ("batch", "number"),
+                "abstract": False,
+                "swappable": swapper.swappable_setting(
+                    "firmware_upgrader", "BatchUpgradeWave"
+                ),
+                "unique_together": {("batch", "number")},
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firmware_upgrader", "0021_batchupgradewave"),
+        migrations.swappable_dependency(settings.CONFIG_DEVICE_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="devicefirmware",
+            index=models.Index(
+                fields=["image", "installed"], name="devicefw_image_installed_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="upgradeoperation",
+            index=models.Index(
+                condition=models.Q(("status", "in-progress")),
+                fields=["device"],
+                name="upgradeop_device_running_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="upgradeoperation",
+            index=models.Index(
+                fields=["batch", "status"], name="upgradeop_batch_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="upgradeoperation",
+            index=models.Index(
+                fields=["device", "-modified"], name="upgradeop_device_modified_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="upgradeoperation",
+            index=models.Index(
+                fields=["device", "-created"], name="upgradeop_device_created_idx"
+            ),
+        ),
+    ]
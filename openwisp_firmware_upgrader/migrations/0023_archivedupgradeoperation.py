@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:01
+
+import django.db.models.deletion
+import swapper
+from django.conf import settings
+from django.db import migrations, models
+
+import openwisp_firmware_upgrader.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firmware_upgrader", "0022_upgradeoperation_indexes"),
+        migrations.swappable_dependency(settings.CONFIG_DEVICE_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="archived_operations",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.CreateModel(
+            name="ArchivedUpgradeOperation",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("in-progress", "in progress"),
+                            ("success", "success"),
+                            ("failed", "failed"),
+                            ("cancelled", "cancelled"),
+                            ("aborted", "aborted"),
+                        ],
+                        max_length=12,
+                    ),
+                ),
+                (
+                    "log",
+                    openwisp_firmware_upgrader.fields.CompressedTextField(blank=True),
+                ),
+                ("created", models.DateTimeField()),
+                ("modified", models.DateTimeField()),
+                (
+                    "batch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=swapper.get_model_name(
+                            "firmware_upgrader", "BatchUpgradeOperation"
+                        ),
+                    ),
+                ),
+                (
+                    "device",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.CONFIG_DEVICE_MODEL,
+                    ),
+                ),
+                (
+                    "image",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=swapper.get_model_name("firmware_upgrader", "FirmwareImage"),
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived upgrade operation",
+                "verbose_name_plural": "Archived upgrade operations",
+                "abstract": False,
+                "swappable": swapper.swappable_setting(
+                    "firmware_upgrader", "ArchivedUpgradeOperation"
+                ),
+            },
+        ),
+    ]
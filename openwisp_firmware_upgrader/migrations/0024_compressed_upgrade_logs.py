@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:03
+
+from django.db import migrations
+
+import openwisp_firmware_upgrader.fields
+
+from . import compress_upgrade_operation_logs
+
+
+def compress_upgrade_operation_logs_helper(apps, schema_editor):
+    compress_upgrade_operation_logs(apps, schema_editor, "firmware_upgrader")
+
+
+class Migration(migrations.Migration):
+    # the logs are compressed in chunks, each one in its own transaction
+    atomic = False
+
+    dependencies = [
+        ("firmware_upgrader", "0023_archivedupgradeoperation"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="upgradeoperation",
+            old_name="log",
+            new_name="plain_log",
+        ),
+        migrations.AddField(
+            model_name="upgradeoperation",
+            name="log",
+            field=openwisp_firmware_upgrader.fields.CompressedTextField(
+                blank=True, default=""
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(
+            compress_upgrade_operation_logs_helper,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.RemoveField(
+            model_name="upgradeoperation",
+            name="plain_log",
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firmware_upgrader", "0024_compressed_upgrade_logs"),
+        migrations.swappable_dependency(settings.CONFIG_DEVICE_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="upgradeoperation",
+            index=models.Index(
+                fields=["batch", "-created", "-id"], name="upgradeop_batch_created_idx"
+            ),
+        ),
+    ]
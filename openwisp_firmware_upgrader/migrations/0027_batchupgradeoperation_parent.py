@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:15
+
+import django.db.models.deletion
+import swapper
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firmware_upgrader", "0026_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="retries",
+                to=swapper.get_model_name("firmware_upgrader", "BatchUpgradeOperation"),
+                verbose_name="retry of",
+            ),
+        ),
+    ]
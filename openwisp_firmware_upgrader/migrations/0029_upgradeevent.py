@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firmware_upgrader", "0028_upgradeoperation_batch_modified_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UpgradeEvent",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("device_id", models.UUIDField(blank=True, null=True)),
+                ("operation_id", models.UUIDField(blank=True, null=True)),
+                ("batch_id", models.UUIDField(blank=True, null=True)),
+                ("payload", models.TextField()),
+                (
+                    "created",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Upgrade event",
+                "verbose_name_plural": "Upgrade events",
+                "abstract": False,
+                "swappable": "FIRMWARE_UPGRADER_UPGRADEEVENT_MODEL",
+                "indexes": [
+                    models.Index(
+                        fields=["device_id", "id"], name="upgradeevent_device_idx"
+                    ),
+                    models.Index(
+                        fields=["operation_id", "id"], name="upgradeevent_operation_idx"
+                    ),
+                    models.Index(
+                        fields=["batch_id", "id"], name="upgradeevent_batch_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firmware_upgrader", "0029_upgradeevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="upgradeevent",
+            name="organization_id",
+            field=models.UUIDField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="upgradeevent",
+            name="published",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name="upgradeevent",
+            index=models.Index(
+                condition=models.Q(("published", False)),
+                fields=["id"],
+                name="upgradeevent_outbox_idx",
+            ),
+        ),
+    ]
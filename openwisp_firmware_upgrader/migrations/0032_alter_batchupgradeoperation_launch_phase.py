@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firmware_upgrader", "0031_upgradeoperation_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="batchupgradeoperation",
+            name="launch_phase",
+            field=models.CharField(
+                choices=[
+                    ("pending", "target devices not determined yet"),
+                    ("launching", "launching upgrades of the target devices"),
+                    ("completed", "all the devices have been reached"),
+                    ("cancelled", "launch cancelled by the user"),
+                ],
+                default="pending",
+                editable=False,
+                max_length=12,
+            ),
+        ),
+    ]
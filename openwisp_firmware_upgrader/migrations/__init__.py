@@ -1,11 +1,18 @@
+import logging
+from itertools import islice
+
 from django.conf import settings
 from django.contrib.auth.management import create_permissions
 from django.contrib.auth.models import Permission
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Q
 from swapper import load_model, split
 
 DeviceConnection = load_model("connection", "DeviceConnection")
 DeviceFirmware = load_model("firmware_upgrader", "DeviceFirmware")
 
+logger = logging.getLogger(__name__)
+
 
 def create_default_permissions(apps, schema_editor):
     for app_config in apps.get_app_configs():
@@ -95,3 +102,166 @@ def update_image_types_reverse(apps, schema_editor, app_label):
     FirmwareImage = apps.get_model(app_label, "FirmwareImage")
     for new_type, old_type in REVERSE_IMAGE_TYPE_MAPPING.items():
         FirmwareImage.objects.filter(type=new_type).update(type=old_type)
+
+
+def mark_batch_upgrade_operations_launched(apps, schema_editor, app_label):
+    """
+    Pre-existing mass upgrade operations have already
+    reached their devices, flags them as launched so
+    that they cannot be resumed.
+    """
+    BatchUpgradeOperation = apps.get_model(app_label, "BatchUpgradeOperation")
+    BatchUpgradeOperation.objects.update(launch_phase="completed")
+
+
+def create_batch_upgrade_targets(apps, schema_editor, app_label):
+    """
+    Populates the snapshot of the target devices of pre-existing
+    mass upgrade operations from their upgrade operations.
+    """
+    BatchUpgradeOperation = apps.get_model(app_label, "BatchUpgradeOperation")
+    BatchUpgradeTarget = apps.get_model(app_label, "BatchUpgradeTarget")
+    UpgradeOperation = apps.get_model(app_label, "UpgradeOperation")
+    # launches interrupted before the introduction of the snapshot
+    # are resumed by determining the target devices again
+    BatchUpgradeOperation.objects.exclude(launch_phase="completed").update(
+        launch_phase="pending", launch_cursor=None
+    )
+    operations = (
+        UpgradeOperation.objects.filter(
+            batch__launch_phase="completed", image__isnull=False
+        )
+        .order_by()
+        .values_list("batch_id", "device_id", "image_id")
+        .iterator(chunk_size=1000)
+    )
+    while True:
+        chunk = [
+            BatchUpgradeTarget(
+                batch_id=batch_id, device_id=device_id, image_id=image_id
+            )
+            for batch_id, device_id, image_id in islice(operations, 1000)
+        ]
+        if not chunk:
+            break
+        BatchUpgradeTarget.objects.bulk_create(chunk, ignore_conflicts=True)
+
+
+def _update_in_chunks(queryset, fields, update, chunk_size=1000):
+    """
+    Walks ``queryset`` in chunks ordered by primary key, calls
+    ``update`` on each object and saves ``fields`` of the chunk
+    in a short transaction
+    """
+    queryset = queryset.order_by("pk")
+    last = None
+    while True:
+        qs = queryset if last is None else queryset.filter(pk__gt=last)
+        chunk = list(qs[:chunk_size])
+        if not chunk:
+            return
+        for obj in chunk:
+            update(obj)
+        with transaction.atomic():
+            queryset.model.objects.bulk_update(chunk, fields)
+        last = chunk[-1].pk
+
+
+def compress_upgrade_operation_logs(apps, schema_editor, app_label):
+    """
+    Copies the logs of the upgrade operations to the compressed column
+    """
+    UpgradeOperation = apps.get_model(app_label, "UpgradeOperation")
+
+    def compress(operation):
+        operation.log = operation.plain_log
+
+    _update_in_chunks(
+        UpgradeOperation.objects.exclude(plain_log="").only("pk", "plain_log"),
+        ["log"],
+        compress,
+    )
+
+
+def populate_operation_counters(apps, schema_editor, app_label):
+    """
+    Populates the counters of the running mass upgrade
+    operations and the failure reasons of their failed
+    upgrade operations, which are shown in the dashboard
+    """
+    BatchUpgradeOperation = apps.get_model(app_label, "BatchUpgradeOperation")
+    BatchUpgradeTarget = apps.get_model(app_label, "BatchUpgradeTarget")
+    UpgradeOperation = apps.get_model(app_label, "UpgradeOperation")
+    running = ["in-progress", "paused"]
+    failure = Q(status__in=["failed", "aborted"])
+    for batch_id in BatchUpgradeOperation.objects.filter(
+        status__in=running
+    ).values_list("pk", flat=True):
+        counters = UpgradeOperation.objects.filter(batch_id=batch_id).aggregate(
+            launched_operations=Count("pk"),
+            completed_operations=Count("pk", filter=~Q(status="in-progress")),
+            failed_operations=Count("pk", filter=failure),
+        )
+        with transaction.atomic():
+            BatchUpgradeOperation.objects.filter(pk=batch_id).update(
+                total_targets=BatchUpgradeTarget.objects.filter(
+                    batch_id=batch_id
+                ).count(),
+                **counters,
+            )
+
+    def set_failure_reason(operation):
+        lines = [line.strip() for line in operation.log.splitlines() if line.strip()]
+        operation.failure_reason = lines[-1][:200] if lines else ""
+
+    _update_in_chunks(
+        UpgradeOperation.objects.filter(failure, batch__status__in=running).only(
+            "pk", "log"
+        ),
+        ["failure_reason"],
+        set_failure_reason,
+    )
+
+
+DEVICE_NAME_TRIGRAM_INDEX = "firmware_upgrader_device_name_trgm"
+
+
+def create_device_name_trigram_index(apps, schema_editor):
+    """
+    Creates a trigram index on the names of the devices, used by the
+    search of the upgrade operations of mass upgrade operations in the
+    admin. Only PostgreSQL is supported, the ``icontains`` lookup
+    compares the uppercase names, hence the index is created on them;
+    other databases keep searching without the index.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        logger.warning(
+            "The pg_trgm extension could not be installed, the search of "
+            "the upgrade operations will not use a trigram index"
+        )
+        return
+    Device = apps.get_model(*split(settings.CONFIG_DEVICE_MODEL))
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS {index} ON {table} "
+        "USING gin ((UPPER({column}::text)) gin_trgm_ops)".format(
+            index=schema_editor.quote_name(DEVICE_NAME_TRIGRAM_INDEX),
+            table=schema_editor.quote_name(Device._meta.db_table),
+            column=schema_editor.quote_name(Device._meta.get_field("name").column),
+        )
+    )
+
+
+def drop_device_name_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "DROP INDEX IF EXISTS {}".format(
+            schema_editor.quote_name(DEVICE_NAME_TRIGRAM_INDEX)
+        )
+    )
@@ -1,11 +1,15 @@
 from swapper import swappable_setting
 
 from .base.models import (
+    AbstractArchivedUpgradeOperation,
     AbstractBatchUpgradeOperation,
+    AbstractBatchUpgradeTarget,
+    AbstractBatchUpgradeWave,
     AbstractBuild,
     AbstractCategory,
     AbstractDeviceFirmware,
     AbstractFirmwareImage,
+    AbstractUpgradeEvent,
     AbstractUpgradeOperation,
 )
 
@@ -40,7 +44,31 @@ class BatchUpgradeOperation(AbstractBatchUpgradeOperation):
         swappable = swappable_setting("firmware_upgrader", "BatchUpgradeOperation")
 
 
+class BatchUpgradeTarget(AbstractBatchUpgradeTarget):
+    class Meta(AbstractBatchUpgradeTarget.Meta):
+        abstract = False
+        swappable = swappable_setting("firmware_upgrader", "BatchUpgradeTarget")
+
+
+class BatchUpgradeWave(AbstractBatchUpgradeWave):
+    class Meta(AbstractBatchUpgradeWave.Meta):
+        abstract = False
+        swappable = swappable_setting("firmware_upgrader", "BatchUpgradeWave")
+
+
 class UpgradeOperation(AbstractUpgradeOperation):
     class Meta(AbstractUpgradeOperation.Meta):
         abstract = False
         swappable = swappable_setting("firmware_upgrader", "UpgradeOperation")
+
+
+class ArchivedUpgradeOperation(AbstractArchivedUpgradeOperation):
+    class Meta(AbstractArchivedUpgradeOperation.Meta):
+        abstract = False
+        swappable = swappable_setting("firmware_upgrader", "ArchivedUpgradeOperation")
+
+
+class UpgradeEvent(AbstractUpgradeEvent):
+    class Meta(AbstractUpgradeEvent.Meta):
+        abstract = False
+        swappable = swappable_setting("firmware_upgrader", "UpgradeEvent")
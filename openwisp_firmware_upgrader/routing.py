@@ -3,6 +3,7 @@ from django.urls import path
 from .websockets import (
     BatchUpgradeProgressConsumer,
     DeviceUpgradeProgressConsumer,
+    MultiplexedUpgradeProgressConsumer,
     UpgradeProgressConsumer,
 )
 
@@ -19,6 +20,10 @@ websocket_urlpatterns = [
         "ws/firmware-upgrader/device/<uuid:device_id>/",
         DeviceUpgradeProgressConsumer.as_asgi(),
     ),
+    path(
+        "ws/firmware-upgrader/",
+        MultiplexedUpgradeProgressConsumer.as_asgi(),
+    ),
 ]
 
 
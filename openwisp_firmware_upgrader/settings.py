@@ -23,6 +23,107 @@ RETRY_OPTIONS = getattr(
 )
 
 TASK_TIMEOUT = getattr(settings, "OPENWISP_FIRMWARE_UPGRADER_TASK_TIMEOUT", 1500)
+# must outlive the upgrade task, otherwise the lock
+# could expire while the device is still being flashed
+UPGRADE_LOCK_TIMEOUT = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_UPGRADE_LOCK_TIMEOUT", TASK_TIMEOUT + 60
+)
+# amount of devices processed (and checkpointed)
+# at once when launching a mass upgrade operation
+BATCH_LAUNCH_CHUNK_SIZE = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_BATCH_LAUNCH_CHUNK_SIZE", 100
+)
+# circuit breaker of mass upgrade operations: amount of most recently
+# completed upgrade operations evaluated and percentage of failed or
+# aborted ones in that window above which the batch is paused,
+# disabled unless the window and at least one threshold are set
+BATCH_FAILURE_WINDOW = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_BATCH_FAILURE_WINDOW", None
+)
+BATCH_FAILURE_THRESHOLD = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_BATCH_FAILURE_THRESHOLD", None
+)
+BATCH_ABORT_THRESHOLD = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_BATCH_ABORT_THRESHOLD", None
+)
+# minimum percentage of successful upgrade operations
+# a wave of a staged rollout needs to be promoted
+ROLLOUT_SUCCESS_THRESHOLD = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_ROLLOUT_SUCCESS_THRESHOLD", 95
+)
+# completed upgrade operations older than this amount of days
+# are moved to the archive, ``None`` keeps them forever
+RETENTION_DAYS = getattr(settings, "OPENWISP_FIRMWARE_UPGRADER_RETENTION_DAYS", None)
+RETENTION_CHUNK_SIZE = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_RETENTION_CHUNK_SIZE", 1000
+)
+# algorithm used to compress the logs of the upgrade operations
+LOG_COMPRESSION = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_LOG_COMPRESSION", "zlib"
+)
+if LOG_COMPRESSION not in [None, "zlib", "zstd"]:
+    raise ImproperlyConfigured(
+        "OPENWISP_FIRMWARE_UPGRADER_LOG_COMPRESSION must be one of: "
+        'None, "zlib", "zstd"'
+    )
+
+# number of rows fetched from the database at once by the exports
+EXPORT_CHUNK_SIZE = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_EXPORT_CHUNK_SIZE", 2000
+)
+
+# number of upgrade operations sent in each chunk of
+# the snapshot of the state of a mass upgrade operation
+SNAPSHOT_CHUNK_SIZE = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_SNAPSHOT_CHUNK_SIZE", 500
+)
+
+# seconds for which the authorization decisions
+# of the websocket consumers are cached
+WEBSOCKET_AUTH_CACHE_TIMEOUT = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_WEBSOCKET_AUTH_CACHE_TIMEOUT", 60
+)
+
+# seconds between the updates of the live upgrade dashboards
+DASHBOARD_TICK = getattr(settings, "OPENWISP_FIRMWARE_UPGRADER_DASHBOARD_TICK", 5)
+
+# maximum number of websocket messages waiting to be
+# sent by the background publisher of celery workers
+PUBLISHER_QUEUE_SIZE = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_PUBLISHER_QUEUE_SIZE", 10000
+)
+
+# library used to serialize the JSON of the
+# websocket messages and of the API responses
+JSON_BACKEND = getattr(settings, "OPENWISP_FIRMWARE_UPGRADER_JSON_BACKEND", "json")
+if JSON_BACKEND not in ["json", "orjson"]:
+    raise ImproperlyConfigured(
+        'OPENWISP_FIRMWARE_UPGRADER_JSON_BACKEND must be one of: "json", "orjson"'
+    )
+
+# seconds for which the events are kept in the event log
+# used by the server-sent events and long-polling endpoints
+EVENT_LOG_MAX_AGE = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_EVENT_LOG_MAX_AGE", 3600
+)
+# seconds between the reads of the event log while waiting for new events
+EVENT_STREAM_POLL_INTERVAL = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_EVENT_STREAM_POLL_INTERVAL", 1
+)
+# seconds after which event streams are closed, clients reconnect
+# automatically and resume from the last event they received
+EVENT_STREAM_TIMEOUT = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_EVENT_STREAM_TIMEOUT", 300
+)
+# maximum number of events of the outbox published at once by the relay
+EVENT_RELAY_BATCH_SIZE = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_EVENT_RELAY_BATCH_SIZE", 500
+)
+# seconds after which a run of the relay stops and the lock
+# which prevents concurrent runs of the relay expires
+EVENT_RELAY_TIMEOUT = getattr(
+    settings, "OPENWISP_FIRMWARE_UPGRADER_EVENT_RELAY_TIMEOUT", 60
+)
 
 FIRMWARE_UPGRADER_API = getattr(settings, "OPENWISP_FIRMWARE_UPGRADER_API", True)
 FIRMWARE_API_BASEURL = getattr(settings, "OPENWISP_FIRMWARE_API_BASEURL", "/")
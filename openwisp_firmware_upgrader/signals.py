@@ -1,3 +1,7 @@
 from django.dispatch import Signal
 
 firmware_upgrader_log_updated = Signal()
+device_upgrade_lock_contended = Signal()
+batch_upgrade_paused = Signal()
+batch_upgrade_operations_cancelled = Signal()
+upgrade_events_relayed = Signal()
@@ -29,6 +29,48 @@ django.jQuery(function ($) {
 });
 
 let batchUpgradeOperationsInitialized = false;
+// highest sequence number received, sent when reconnecting
+// in order to receive only the operations changed since then
+let batchUpgradeLastSequence = null;
+// whether the last state requested has been received entirely,
+// the sequence number is not advanced until then
+let batchUpgradeStateLoaded = false;
+// last status of the batch received, rendered again once
+// all the upgrade operations of the batch have been received
+let batchUpgradeLastStatus = null;
+
+// Upgrade operations of the batch received from the server. Once the
+// whole batch has been received, the list is virtualized: only the rows
+// visible in the results container are rendered and the status filter
+// is applied on the client, which keeps the page responsive with
+// batches of tens of thousands of upgrade operations.
+const batchOperationList = {
+  operations: new Map(),
+  // IDs ordered like the list rendered by the server
+  ids: [],
+  filteredIds: [],
+  statusCounts: {},
+  statusFilter: "",
+  loaded: false,
+  virtualized: false,
+  needsSorting: false,
+  needsFiltering: false,
+  countsChanged: false,
+  changedIds: new Set(),
+  renderScheduled: false,
+  renderedRange: null,
+  renderedRows: new Map(),
+  rowHeight: 45,
+  // IDs of the operations whose detailed updates have been requested,
+  // "null" means that the server sends the updates of all of them
+  subscriptionKey: null,
+  subscriptionTimer: null,
+};
+// rows rendered above and below the visible ones
+const VIRTUAL_LIST_OVERSCAN = 10;
+// milliseconds waited before changing the subscribed operations,
+// which avoids sending a subscription for each scrolled row
+const OPERATIONS_SUBSCRIPTION_DELAY = 300;
 
 function requestCurrentBatchState(websocket) {
   if (websocket.readyState === WebSocket.OPEN) {
@@ -37,6 +79,10 @@ function requestCurrentBatchState(websocket) {
         type: "request_current_state",
         batch_id: window.batchUpgradeId,
       };
+      if (batchUpgradeLastSequence !== null) {
+        requestMessage.since = batchUpgradeLastSequence;
+      }
+      batchUpgradeStateLoaded = false;
       websocket.send(JSON.stringify(requestMessage));
     } catch (error) {
       console.error("Error requesting current batch state:", error);
@@ -64,6 +110,7 @@ function initializeExistingBatchUpgradeOperations($, isRetry = false) {
         progress: null,
       };
       renderOperationProgressBarInCell(statusCell, operation);
+      storeListedOperation(statusCell, operation);
       processedCount++;
     }
   });
@@ -77,6 +124,19 @@ function initializeExistingBatchUpgradeOperations($, isRetry = false) {
   }
 }
 
+function storeListedOperation(statusCell, operation) {
+  // the rows rendered by the server are updated
+  // before the state of the batch is received
+  let row = statusCell.closest("tr");
+  storeBatchOperation({
+    operation_id: operation.id,
+    status: operation.status,
+    progress: operation.progress,
+    device_name: row.find(".device-link").text().trim(),
+    image_name: row.find("td:nth-child(3)").text().trim(),
+  });
+}
+
 function initBatchUpgradeProgressWebSockets($, batchUpgradeProgressWebSocket) {
   batchUpgradeProgressWebSocket.addEventListener("open", function (e) {
     let existingContainers = $(
@@ -90,6 +150,9 @@ function initBatchUpgradeProgressWebSockets($, batchUpgradeProgressWebSocket) {
       // Just request current state without reinitializing
       requestCurrentBatchState(batchUpgradeProgressWebSocket);
     }
+    // new connections send the updates of all the operations
+    batchOperationList.subscriptionKey = null;
+    updateOperationsSubscription();
   });
 
   batchUpgradeProgressWebSocket.addEventListener("close", function (e) {
@@ -107,23 +170,40 @@ function initBatchUpgradeProgressWebSockets($, batchUpgradeProgressWebSocket) {
     try {
       let data = JSON.parse(e.data);
       if (data.type === "batch_state") {
-        updateBatchProgress(data.batch_status);
-        if (data.operations && Array.isArray(data.operations)) {
-          data.operations.forEach(function (operation) {
-            updateBatchOperationProgress({
-              operation_id: operation.id,
-              status: operation.status,
-              progress: operation.progress,
-              modified: operation.modified,
-            });
-          });
+        updateBatchStateChunk(data);
+        if (data.batch_status) {
+          batchUpgradeLastStatus = data.batch_status;
+          updateBatchProgress(data.batch_status);
+        }
+        if (data.last) {
+          // an interrupted state is requested again after reconnecting
+          batchUpgradeStateLoaded = true;
+          updateLastSequence(data.seq);
+          onBatchOperationsLoaded();
         }
+      } else if (data.type === "operations_summary") {
+        updateBatchStateChunk(data);
+        updateLastSequence(data.seq);
       } else if (data.type === "batch_status") {
+        batchUpgradeLastStatus = data;
         updateBatchProgress(data);
       } else if (data.type === "operation_progress") {
-        updateBatchOperationProgress(data);
+        storeBatchOperation(data);
+        updateLiveSequence(data.seq);
+      } else if (data.type === "operations_cancelled") {
+        data.operation_ids.forEach(function (operationId) {
+          storeBatchOperation({
+            operation_id: operationId,
+            status: FW_UPGRADE_STATUS.CANCELLED,
+            progress: 0,
+            modified: data.modified,
+            seq: data.seq,
+          });
+        });
+        updateBatchProgress(data);
+        updateLiveSequence(data.seq);
       } else if (data.type === "operation_update") {
-        updateBatchOperationProgress({
+        storeBatchOperation({
           operation_id: data.operation.id,
           status: data.operation.status,
           progress: data.operation.progress,
@@ -136,6 +216,374 @@ function initBatchUpgradeProgressWebSockets($, batchUpgradeProgressWebSocket) {
   });
   batchUpgradeProgressWebSocket.open();
 }
+
+function storeBatchOperation(data) {
+  // Stores the state of an upgrade operation and schedules the rendering,
+  // updates older than the state already received are ignored
+  let list = batchOperationList;
+  let operation = list.operations.get(data.operation_id);
+  if (!operation) {
+    if (!data.device_name) {
+      return;
+    }
+    operation = {
+      id: data.operation_id,
+      device_name: data.device_name,
+      image_name: null,
+      status: null,
+      progress: null,
+      modified: null,
+      seq: null,
+    };
+    list.operations.set(operation.id, operation);
+    list.ids.push(operation.id);
+    list.needsSorting = true;
+  } else if (
+    typeof data.seq === "number" &&
+    typeof operation.seq === "number" &&
+    data.seq < operation.seq
+  ) {
+    return;
+  }
+  if (data.status !== operation.status) {
+    if (operation.status !== null) {
+      list.statusCounts[operation.status]--;
+    }
+    list.statusCounts[data.status] = (list.statusCounts[data.status] || 0) + 1;
+    list.countsChanged = true;
+    if (list.statusFilter) {
+      list.needsFiltering = true;
+    }
+    operation.status = data.status;
+  }
+  operation.progress = data.progress;
+  if (data.device_name) {
+    operation.device_name = data.device_name;
+  }
+  if (data.image_name) {
+    operation.image_name = data.image_name;
+  }
+  if (data.modified) {
+    operation.modified = data.modified;
+  }
+  if (typeof data.seq === "number") {
+    operation.seq = data.seq;
+  }
+  list.changedIds.add(operation.id);
+  scheduleBatchOperationsRender();
+}
+
+function countBatchOperations(status) {
+  return batchOperationList.statusCounts[status] || 0;
+}
+
+function onBatchOperationsLoaded() {
+  let list = batchOperationList;
+  if (list.loaded) {
+    return;
+  }
+  list.loaded = true;
+  let params = new URLSearchParams(window.location.search);
+  // the search and the organization filter are applied by the server
+  if (!params.get("q") && !params.get("organization")) {
+    enableVirtualizedList(params.get("status") || "");
+  }
+  if (batchUpgradeLastStatus) {
+    updateBatchProgress(batchUpgradeLastStatus);
+  }
+}
+
+function enableVirtualizedList(statusFilter) {
+  let $ = django.jQuery;
+  let list = batchOperationList;
+  list.virtualized = true;
+  list.statusFilter = statusFilter;
+  list.needsFiltering = true;
+  list.countsChanged = true;
+  $(".pagination").hide();
+  $(".results-container").addClass("virtualized");
+  $(".results-viewport").on("scroll", scheduleBatchOperationsRender);
+  $(window).on("resize", scheduleBatchOperationsRender);
+  initClientSideStatusFilter($);
+  scheduleBatchOperationsRender();
+}
+
+function initClientSideStatusFilter($) {
+  $(".ow-filter.status .filter-options a").each(function () {
+    $(this).attr("data-display", $(this).text().trim());
+  });
+  $(".ow-filter.status .filter-options").each(function () {
+    // captured before the handler of the filters, which reloads the page
+    this.addEventListener(
+      "click",
+      function (e) {
+        let link = e.target.closest("a");
+        if (!link) {
+          return;
+        }
+        e.preventDefault();
+        e.stopPropagation();
+        applyClientSideStatusFilter(link);
+      },
+      true,
+    );
+  });
+}
+
+function applyClientSideStatusFilter(link) {
+  let list = batchOperationList;
+  let filter = link.closest(".ow-filter");
+  filter.querySelectorAll(".filter-options a.selected").forEach(function (option) {
+    option.classList.remove("selected");
+  });
+  link.classList.add("selected");
+  let display = link.getAttribute("data-display");
+  let selectedOption = filter.querySelector(".selected-option");
+  selectedOption.textContent = display;
+  selectedOption.setAttribute("title", display);
+  if (typeof hideFilterOptions === "function") {
+    hideFilterOptions(filter);
+  }
+  let params = new URLSearchParams(link.getAttribute("href") || "");
+  let queryString = params.toString();
+  window.history.replaceState(
+    null,
+    "",
+    window.location.pathname + (queryString ? `?${queryString}` : ""),
+  );
+  list.statusFilter = params.get("status") || "";
+  list.needsFiltering = true;
+  django.jQuery(".results-viewport").scrollTop(0);
+  scheduleBatchOperationsRender();
+}
+
+function scheduleBatchOperationsRender() {
+  // updates are rendered at most once per frame
+  if (batchOperationList.renderScheduled) {
+    return;
+  }
+  batchOperationList.renderScheduled = true;
+  window.requestAnimationFrame(renderBatchOperations);
+}
+
+function renderBatchOperations() {
+  let list = batchOperationList;
+  list.renderScheduled = false;
+  if (list.virtualized) {
+    renderVirtualizedRows();
+    if (list.countsChanged) {
+      updateStatusFilterCounts();
+    }
+  } else {
+    renderListedRows();
+  }
+  list.changedIds.clear();
+  list.countsChanged = false;
+  updateOperationsSubscription();
+}
+
+function renderListedRows() {
+  // only the rows rendered by the server are updated
+  let $ = django.jQuery;
+  batchOperationList.changedIds.forEach(function (operationId) {
+    let statusCell = $(
+      `#result_list tbody td.status-cell[data-operation-id="${operationId}"]`,
+    );
+    if (statusCell.length === 0) {
+      return;
+    }
+    let operation = batchOperationList.operations.get(operationId);
+    statusCell.attr("data-operation-status", operation.status);
+    renderOperationProgressBarInCell(statusCell, operation);
+    if (operation.modified) {
+      statusCell
+        .closest("tr")
+        .find("td:nth-child(4)")
+        .text(getFormattedDateTimeString(operation.modified));
+    }
+  });
+}
+
+function getVisibleRange(container, total, rowHeight) {
+  let start = Math.floor(container.scrollTop / rowHeight) - VIRTUAL_LIST_OVERSCAN;
+  let end =
+    Math.ceil((container.scrollTop + container.clientHeight) / rowHeight) +
+    VIRTUAL_LIST_OVERSCAN;
+  return [Math.max(0, start), Math.min(total, end)];
+}
+
+function renderVirtualizedRows() {
+  let $ = django.jQuery;
+  let list = batchOperationList;
+  if (list.needsSorting) {
+    list.ids.sort();
+    list.needsSorting = false;
+    list.needsFiltering = true;
+  }
+  if (list.needsFiltering) {
+    list.filteredIds = list.statusFilter
+      ? list.ids.filter(function (operationId) {
+          return list.operations.get(operationId).status === list.statusFilter;
+        })
+      : list.ids;
+    list.needsFiltering = false;
+    list.renderedRange = null;
+    updatePaginatorCount(list.filteredIds.length);
+  }
+  let container = $(".results-viewport")[0];
+  let range = getVisibleRange(container, list.filteredIds.length, list.rowHeight);
+  if (
+    list.renderedRange &&
+    list.renderedRange[0] === range[0] &&
+    list.renderedRange[1] === range[1]
+  ) {
+    // the same rows are visible, only the changed ones are updated
+    list.changedIds.forEach(function (operationId) {
+      let row = list.renderedRows.get(operationId);
+      if (row) {
+        fillOperationRow(row, list.operations.get(operationId));
+      }
+    });
+    return;
+  }
+  let tbody = $("#result_list tbody");
+  let rows = [];
+  list.renderedRows = new Map();
+  if (range[0] > 0) {
+    rows.push(createSpacerRow(range[0] * list.rowHeight));
+  }
+  for (let index = range[0]; index < range[1]; index++) {
+    let operationId = list.filteredIds[index];
+    let row = $("<tr>").addClass(index % 2 === 0 ? "row1" : "row2");
+    fillOperationRow(row, list.operations.get(operationId));
+    list.renderedRows.set(operationId, row);
+    rows.push(row);
+  }
+  if (range[1] < list.filteredIds.length) {
+    rows.push(createSpacerRow((list.filteredIds.length - range[1]) * list.rowHeight));
+  }
+  if (list.filteredIds.length === 0) {
+    rows.push(
+      $("<tr>").append(
+        $("<td>")
+          .attr("colspan", 4)
+          .addClass("empty-results")
+          .text(gettext("No device upgrades found.")),
+      ),
+    );
+  }
+  tbody.empty().append(rows);
+  list.renderedRange = range;
+  // the height of the spacers depends on the height of the rows
+  let firstRow = list.renderedRows.values().next().value;
+  if (firstRow && firstRow[0].offsetHeight) {
+    let rowHeight = firstRow[0].offsetHeight;
+    if (rowHeight !== list.rowHeight) {
+      list.rowHeight = rowHeight;
+      list.renderedRange = null;
+      scheduleBatchOperationsRender();
+    }
+  }
+}
+
+function createSpacerRow(height) {
+  let $ = django.jQuery;
+  return $("<tr>")
+    .addClass("virtual-spacer")
+    .attr("aria-hidden", "true")
+    .append($("<td>").attr("colspan", 4).css("height", `${height}px`));
+}
+
+function fillOperationRow(row, operation) {
+  // Build row using DOM attributes to prevent XSS vulnerability due to string interpolation
+  let $ = django.jQuery;
+  let operationUrl = owDeviceUpgradeOperationUrl.replace(
+    "00000000-0000-0000-0000-000000000000",
+    operation.id,
+  );
+  let $deviceTd = $("<td>").append(
+    $("<a>")
+      .addClass("device-link")
+      .attr("href", operationUrl)
+      .attr("aria-label", gettext("View device") + " " + operation.device_name)
+      .text(operation.device_name),
+  );
+  let $statusTd = $("<td>")
+    .addClass("status-cell")
+    .attr("data-operation-id", operation.id)
+    .attr("data-operation-status", operation.status);
+  renderOperationProgressBarInCell($statusTd, operation);
+  let $imageTd = $("<td>").text(operation.image_name || gettext("None"));
+  let $modifiedTd = $("<td>").text(
+    operation.modified ? getFormattedDateTimeString(operation.modified) : "",
+  );
+  row.empty().append($deviceTd, $statusTd, $imageTd, $modifiedTd);
+}
+
+function updatePaginatorCount(count) {
+  let text = interpolate(
+    ngettext("%s upgrade operation", "%s upgrade operations", count),
+    [count],
+  );
+  django.jQuery(".results-container .paginator").text(text);
+}
+
+function updateStatusFilterCounts() {
+  let $ = django.jQuery;
+  $(".ow-filter.status .filter-options a").each(function () {
+    let link = $(this);
+    let status = new URLSearchParams(link.attr("href") || "").get("status");
+    let count = status
+      ? countBatchOperations(status)
+      : batchOperationList.operations.size;
+    link.text(`${link.attr("data-display")} (${count})`);
+  });
+}
+
+function getSubscribedOperationIds() {
+  let list = batchOperationList;
+  if (list.virtualized) {
+    if (!list.renderedRange) {
+      return null;
+    }
+    return list.filteredIds.slice(list.renderedRange[0], list.renderedRange[1]);
+  }
+  return django
+    .jQuery("#result_list tbody td.status-cell")
+    .map(function () {
+      return this.getAttribute("data-operation-id");
+    })
+    .get();
+}
+
+function updateOperationsSubscription() {
+  // Requests the detailed updates of the visible operations only, the
+  // updates of the other ones are received periodically in summaries
+  let list = batchOperationList;
+  let operationIds = getSubscribedOperationIds();
+  if (operationIds === null) {
+    return;
+  }
+  let subscriptionKey = operationIds.join(",");
+  clearTimeout(list.subscriptionTimer);
+  if (subscriptionKey === list.subscriptionKey) {
+    return;
+  }
+  list.subscriptionTimer = setTimeout(function () {
+    let websocket = window.batchUpgradeProgressWebSocket;
+    if (!websocket || websocket.readyState !== WebSocket.OPEN) {
+      return;
+    }
+    websocket.send(
+      JSON.stringify({
+        type: "subscribe_operations",
+        operation_ids: operationIds,
+      }),
+    );
+    list.subscriptionKey = subscriptionKey;
+  }, OPERATIONS_SUBSCRIPTION_DELAY);
+}
+
 function updateBatchProgress(data) {
   let $ = django.jQuery;
   let mainProgressElement = $(".batch-main-progress");
@@ -154,22 +602,7 @@ function updateBatchProgress(data) {
       statusClass = FW_UPGRADE_CSS_CLASSES.CANCELLED;
       showPercentageText = false;
     } else if (data.status === FW_UPGRADE_STATUS.FAILED) {
-      let successfulOpsCount = $("#result_list tbody tr").filter(function () {
-        let statusText = $(this).find(".status-cell .status-content").text().trim();
-        return FW_STATUS_GROUPS.SUCCESS.has(statusText);
-      }).length;
-      // Also check individual operation containers for success
-      if (successfulOpsCount === 0) {
-        $("#result_list tbody tr").each(function () {
-          let statusContainer = $(this).find(".upgrade-status-container");
-          if (
-            statusContainer.length &&
-            statusContainer.find(".upgrade-progress-fill.success").length
-          ) {
-            successfulOpsCount++;
-          }
-        });
-      }
+      let successfulOpsCount = countBatchOperations(FW_UPGRADE_STATUS.SUCCESS);
       if (successfulOpsCount > 0) {
         // Some operations succeeded - partial success (orange)
         progressPercentage = 100;
@@ -232,75 +665,40 @@ function updateBatchProgress(data) {
   }
 }
 
-function updateBatchOperationProgress(data) {
-  let $ = django.jQuery;
-  let found = false;
-  $("#result_list tbody tr").each(function () {
-    let row = $(this);
-    let statusCell = row.find("td.status-cell");
-    let operationId = statusCell.attr("data-operation-id");
-
-    if (operationId === data.operation_id) {
-      found = true;
-      let operation = {
-        status: data.status,
-        id: data.operation_id,
-        progress: data.progress,
-      };
-      renderOperationProgressBarInCell(statusCell, operation);
-      if (data.modified) {
-        let modifiedCell = row.find("td:nth-child(4)");
-        modifiedCell.text(getFormattedDateTimeString(data.modified));
-      }
-    }
-  });
-  if (!found) {
-    addNewOperationRow(data);
+function updateLastSequence(sequence) {
+  if (!batchUpgradeStateLoaded || typeof sequence !== "number") {
+    return;
+  }
+  if (batchUpgradeLastSequence === null || sequence > batchUpgradeLastSequence) {
+    batchUpgradeLastSequence = sequence;
   }
 }
 
-function addNewOperationRow(data) {
-  let $ = django.jQuery;
-  if (!data.device_name || !data.device_id) {
-    return;
+function updateLiveSequence(sequence) {
+  // While subscribed to a subset of the operations, the updates of the
+  // other ones are delayed in summaries: the sequence is advanced only by
+  // snapshots and summaries, otherwise the changes of a summary which has
+  // not been received would not be requested again after reconnecting
+  if (batchOperationList.subscriptionKey === null) {
+    updateLastSequence(sequence);
+  }
+}
+
+function updateBatchStateChunk(data) {
+  // operations are sent in columns, statuses are
+  // sent as indexes of the "statuses" array
+  let operations = data.operations;
+  for (let i = 0; i < operations.id.length; i++) {
+    storeBatchOperation({
+      operation_id: operations.id[i],
+      device_name: operations.device_name[i],
+      image_name: operations.image_name[i],
+      status: data.statuses[operations.status[i]],
+      progress: operations.progress[i],
+      modified: operations.modified[i],
+      seq: operations.seq[i],
+    });
   }
-  let tbody = $("#result_list tbody");
-  tbody.find("tr td[colspan]").parent().remove();
-  let existingRows = tbody.find("tr").length;
-  let rowClass = existingRows % 2 === 0 ? "row1" : "row2";
-  let deviceUrl = owDeviceUpgradeOperationUrl.replace(
-    "00000000-0000-0000-0000-000000000000",
-    data.operation_id,
-  );
-  let imageDisplay = data.image_name || gettext("None");
-  let modifiedTime = data.modified
-    ? getFormattedDateTimeString(data.modified)
-    : gettext("Just now");
-  // Build row using DOM attributes to prevent XSS vulnerability due to string interpolation
-  let $row = $("<tr>").addClass(rowClass);
-  let $deviceTd = $("<td>");
-  let $link = $("<a>")
-    .addClass("device-link")
-    .attr("href", deviceUrl)
-    .attr("aria-label", gettext("View upgrade operation for") + " " + data.device_name)
-    .text(data.device_name);
-  $deviceTd.append($link);
-  let $statusTd = $("<td>")
-    .addClass("status-cell")
-    .attr("data-operation-id", data.operation_id);
-  let $statusContent = $("<div>").addClass("status-content").text(data.status); // SAFE
-  $statusTd.append($statusContent);
-  let $imageTd = $("<td>").text(imageDisplay);
-  let $modifiedTd = $("<td>").text(modifiedTime);
-  $row.append($deviceTd, $statusTd, $imageTd, $modifiedTd);
-  tbody.append($row);
-
-  let operation = {
-    status: data.status,
-    id: data.operation_id,
-    progress: data.progress,
-  };
-  renderOperationProgressBarInCell($statusTd, operation);
 }
 
 function renderOperationProgressBarInCell(statusCell, operation) {
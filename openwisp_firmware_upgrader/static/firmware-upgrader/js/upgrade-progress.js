@@ -43,6 +43,13 @@ let upgradeOperationsInitialized = false;
 
 // Store accumulated log content to preserve across WebSocket reconnections
 let accumulatedLogContent = new Map();
+// Length of the log which has been received for each operation
+let logOffsets = new Map();
+// Most recent length of the log received in the updates
+let latestLogLengths = new Map();
+let pendingLogRequests = new Set();
+// whether the new lines of the log are received from the event stream
+let logsStreamed = false;
 
 function formatLogForDisplay(logContent) {
   return logContent ? escapeHtml(logContent).replace(/\n/g, "<br>") : "";
@@ -165,8 +172,16 @@ function initializeExistingSingleUpgrade($, isRetry = false) {
   }
 }
 
+// Failed connection attempts after which the server-sent events
+// endpoint is used, e.g. when a proxy blocks websockets
+const WEBSOCKET_FAILURES_BEFORE_FALLBACK = 2;
+
 function initUpgradeProgressWebSockets($, upgradeProgressWebSocket) {
+  let websocketOpened = false,
+    websocketFailures = 0;
+
   upgradeProgressWebSocket.addEventListener("open", function (e) {
+    websocketOpened = true;
     upgradeOperationsInitialized = false;
     requestCurrentOperationState(upgradeProgressWebSocket);
   });
@@ -179,25 +194,81 @@ function initUpgradeProgressWebSockets($, upgradeProgressWebSocket) {
     }
   });
 
+  // Dispatched before each reconnection attempt,
+  // with the close code of the failed connection
+  upgradeProgressWebSocket.addEventListener("connecting", function (e) {
+    if (websocketOpened || e.code === undefined) {
+      return;
+    }
+    websocketFailures += 1;
+    if (websocketFailures < WEBSOCKET_FAILURES_BEFORE_FALLBACK) {
+      return;
+    }
+    let eventStreamUrl = getEventStreamUrl(window.upgradePageType, window.upgradePageId);
+    if (eventStreamUrl) {
+      // stops the reconnection attempts
+      upgradeProgressWebSocket.close();
+      initUpgradeProgressEventStream(eventStreamUrl);
+    }
+  });
+
   upgradeProgressWebSocket.addEventListener("error", function (e) {
     console.error("WebSocket error occurred", e);
   });
 
   upgradeProgressWebSocket.addEventListener("message", function (e) {
+    handleUpgradeProgressMessage(e.data);
+  });
+  upgradeProgressWebSocket.open();
+}
+
+function initUpgradeProgressEventStream(eventStreamUrl) {
+  if (window.upgradeProgressEventSource || typeof EventSource === "undefined") {
+    return;
+  }
+  let operationId = window.upgradePageType === "operation" ? window.upgradePageId : null;
+  if (operationId) {
+    // the stream of an upgrade operation sends the new lines of the log
+    let logSince = logOffsets.has(operationId)
+      ? logOffsets.get(operationId)
+      : getLogLength(accumulatedLogContent.get(operationId) || "");
+    eventStreamUrl += `?log_since=${logSince}`;
+    logsStreamed = true;
+  }
+  // The browser reconnects automatically, sending the ID of
+  // the last event received in the "Last-Event-ID" header
+  const eventSource = new EventSource(eventStreamUrl, {withCredentials: true});
+  window.upgradeProgressEventSource = eventSource;
+  eventSource.addEventListener("message", function (e) {
+    handleUpgradeProgressMessage(e.data);
+  });
+  eventSource.addEventListener("log", function (e) {
     try {
-      let data = JSON.parse(e.data);
-      // Both device & operation pages receive "operation_update" events.
-      if (data.type === "operation_update") {
-        let op = data.operation;
-        if (op) {
-          updateUpgradeOperationDisplay(op);
-        }
-      }
+      appendStreamedLog(operationId, JSON.parse(e.data));
     } catch (error) {
-      console.error("Error parsing WebSocket message:", error);
+      console.error("Error parsing upgrade log message:", error);
+    }
+  });
+  eventSource.addEventListener("error", function (e) {
+    if (eventSource.readyState === EventSource.CLOSED) {
+      console.error("Upgrade progress event stream closed", e);
     }
   });
-  upgradeProgressWebSocket.open();
+}
+
+function handleUpgradeProgressMessage(message) {
+  try {
+    let data = JSON.parse(message);
+    // Both device & operation pages receive "operation_update" events.
+    if (data.type === "operation_update") {
+      let op = data.operation;
+      if (op) {
+        updateUpgradeOperationDisplay(op);
+      }
+    }
+  } catch (error) {
+    console.error("Error parsing upgrade progress message:", error);
+  }
 }
 
 function updateUpgradeOperationDisplay(operation) {
@@ -215,21 +286,22 @@ function updateUpgradeOperationDisplay(operation) {
   }
 
   let statusField = operationFieldset.find(".field-status .readonly");
-  if (operation.log && operation.id) {
+  let logElement = operationFieldset.find(".field-log .readonly");
+  if (typeof operation.log === "string") {
+    // the current state contains the whole log
     accumulatedLogContent.set(operation.id, operation.log);
+    logOffsets.set(operation.id, getLogLength(operation.log));
+  } else {
+    // the updates contain only the length of the log,
+    // the new lines are read from the log endpoint
+    operation.log = accumulatedLogContent.get(operation.id) || "";
+    if (operation.log_length !== undefined && !logsStreamed) {
+      fetchNewLogLines(operation.id, operation.log_length, logElement);
+    }
   }
   // Update status with progress bar
   updateStatusWithProgressBar(statusField, operation);
-  let logElement = operationFieldset.find(".field-log .readonly");
-  let shouldScroll = isScrolledToBottom(logElement);
-  logElement.html(formatLogForDisplay(operation.log));
-  if (FW_STATUS_HELPERS.isCompleted(operation.status)) {
-    accumulatedLogContent.delete(operation.id);
-  }
-  // Auto-scroll to bottom if user was already at bottom
-  if (shouldScroll) {
-    scrollToBottom(logElement);
-  }
+  renderLog(logElement, operation.log);
   // Update modified timestamp
   if (operation.modified) {
     operationFieldset
@@ -238,6 +310,95 @@ function updateUpgradeOperationDisplay(operation) {
   }
 }
 
+function renderLog(logElement, logContent) {
+  let shouldScroll = isScrolledToBottom(logElement);
+  logElement.html(formatLogForDisplay(logContent));
+  // Auto-scroll to bottom if user was already at bottom
+  if (shouldScroll) {
+    scrollToBottom(logElement);
+  }
+}
+
+// length of the log as counted by the server (in code points)
+function getLogLength(logContent) {
+  return Array.from(logContent).length;
+}
+
+function fetchNewLogLines(operationId, logLength, logElement) {
+  const $ = django.jQuery;
+  latestLogLengths.set(operationId, logLength);
+  if (typeof owUpgradeOperationLogUrl === "undefined" || !owUpgradeOperationLogUrl) {
+    return;
+  }
+  if (!logOffsets.has(operationId)) {
+    logOffsets.set(
+      operationId,
+      getLogLength(accumulatedLogContent.get(operationId) || ""),
+    );
+  }
+  let offset = logOffsets.get(operationId);
+  // one request at a time, the lines added meanwhile are read afterwards
+  if (logLength <= offset || pendingLogRequests.has(operationId)) {
+    return;
+  }
+  pendingLogRequests.add(operationId);
+  $.ajax({
+    url: owUpgradeOperationLogUrl.replace(
+      "00000000-0000-0000-0000-000000000000",
+      operationId,
+    ),
+    data: { since: offset },
+    xhrFields: {
+      withCredentials: true,
+    },
+    crossDomain: true,
+    success: function (response) {
+      // the log may have been replaced meanwhile by the current state
+      if (logOffsets.get(operationId) !== offset) {
+        return;
+      }
+      let logContent = (accumulatedLogContent.get(operationId) || "") + response.log;
+      accumulatedLogContent.set(operationId, logContent);
+      logOffsets.set(operationId, response.offset);
+      renderLog(logElement, logContent);
+    },
+    error: function (xhr, status, error) {
+      console.error("Error fetching the log of the upgrade operation:", error);
+    },
+    complete: function (xhr, status) {
+      pendingLogRequests.delete(operationId);
+      if (status === "success") {
+        fetchNewLogLines(operationId, latestLogLengths.get(operationId), logElement);
+      }
+    },
+  });
+}
+
+function appendStreamedLog(operationId, response) {
+  const $ = django.jQuery;
+  let logElement = $("#upgradeoperation_form fieldset .field-log .readonly");
+  let logContent = accumulatedLogContent.get(operationId) || "";
+  let offset = logOffsets.has(operationId)
+    ? logOffsets.get(operationId)
+    : getLogLength(logContent);
+  if (response.offset <= offset) {
+    return;
+  }
+  if (response.since > offset) {
+    // some lines have been missed, they're read from the log endpoint
+    fetchNewLogLines(operationId, response.offset, logElement);
+    return;
+  }
+  // the stream resumes from the initial offset after reconnecting,
+  // the lines which have already been received are skipped
+  logContent += Array.from(response.log)
+    .slice(offset - response.since)
+    .join("");
+  accumulatedLogContent.set(operationId, logContent);
+  logOffsets.set(operationId, response.offset);
+  renderLog(logElement, logContent);
+}
+
 function updateStatusWithProgressBar(statusField, operation) {
   let $ = django.jQuery;
   let status = operation.status;
@@ -361,6 +522,16 @@ function getWebSocketUrl(pageType, pageId, wsHost) {
   return null;
 }
 
+function getEventStreamUrl(pageType, pageId) {
+  if (typeof owUpgradeEventsUrl === "undefined" || !owUpgradeEventsUrl) {
+    return null;
+  }
+  if (pageType !== "operation" && pageType !== "device") {
+    return null;
+  }
+  return owUpgradeEventsUrl.replace("00000000-0000-0000-0000-000000000000", pageId);
+}
+
 function getOperationIdFromUrl() {
   try {
     let matches = window.location.pathname.match(/\/upgradeoperation\/([^\/]+)\//);
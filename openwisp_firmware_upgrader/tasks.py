@@ -1,4 +1,6 @@
 import logging
+import time
+from uuid import uuid4
 
 import swapper
 from celery import shared_task
@@ -11,9 +13,13 @@ from openwisp_utils.tasks import OpenwispCeleryTask
 from . import settings as app_settings
 from .exceptions import RecoverableFailure
 from .swapper import load_model
+from .utils import acquire_lock, release_lock
 
 logger = logging.getLogger(__name__)
 
+DASHBOARD_LOCK_KEY = "firmware_upgrader.dashboard_lock"
+EVENT_RELAY_LOCK_KEY = "firmware_upgrader.event_relay_lock"
+
 
 @shared_task(
     bind=True,
@@ -41,18 +47,22 @@ def upgrade_firmware(self, operation_id):
 
 
 @shared_task(bind=True, soft_time_limit=app_settings.TASK_TIMEOUT)
-def batch_upgrade_operation(self, batch_id, firmwareless):
+def batch_upgrade_operation(self, batch_id, firmwareless=None):
     """
-    Calls the ``batch_upgrade()`` method of a
-    ``Build`` instance in the background
+    Calls the ``upgrade()`` method of a
+    ``BatchUpgradeOperation`` instance in the background,
+    running it again resumes an interrupted launch
     """
     try:
         batch_operation = load_model("BatchUpgradeOperation").objects.get(pk=batch_id)
         batch_operation.upgrade(firmwareless=firmwareless)
     except SoftTimeLimitExceeded:
         batch_operation.status = "failed"
-        batch_operation.save()
-        logger.warning("SoftTimeLimitExceeded raised in batch_upgrade_operation task")
+        batch_operation.save(update_fields=["status"])
+        logger.warning(
+            "SoftTimeLimitExceeded raised in batch_upgrade_operation task, "
+            f"the launch of BatchUpgradeOperation {batch_id} can be resumed"
+        )
     except ObjectDoesNotExist:
         logger.warning(
             f"The BatchUpgradeOperation object with id {batch_id} has been deleted"
@@ -97,3 +107,71 @@ def delete_firmware_files(files_to_delete):
     FirmwareImage = load_model("FirmwareImage")
     for file_path in files_to_delete:
         FirmwareImage._remove_file(file_path)
+
+
+@shared_task(base=OpenwispCeleryTask)
+def archive_upgrade_operations():
+    """
+    Moves the completed upgrade operations older than
+    ``OPENWISP_FIRMWARE_UPGRADER_RETENTION_DAYS`` to the archive
+    """
+    if not app_settings.RETENTION_DAYS:
+        return
+    count = load_model("UpgradeOperation").archive(app_settings.RETENTION_DAYS)
+    logger.info(f"{count} upgrade operations have been archived")
+
+
+@shared_task(base=OpenwispCeleryTask)
+def delete_old_upgrade_events():
+    """
+    Deletes the events older than
+    ``OPENWISP_FIRMWARE_UPGRADER_EVENT_LOG_MAX_AGE`` from the event log
+    """
+    count = load_model("UpgradeEvent").purge(app_settings.EVENT_LOG_MAX_AGE)
+    logger.info(f"{count} upgrade events have been deleted")
+
+
+@shared_task(base=OpenwispCeleryTask)
+def publish_upgrade_dashboards():
+    """
+    Publishes the aggregated state of the running mass upgrade
+    operations to the live dashboards of the organizations,
+    runs are skipped while a previous run is still in progress
+    """
+    from .websockets import OrganizationDashboardPublisher
+
+    owner = uuid4()
+    acquired, _ = acquire_lock(
+        DASHBOARD_LOCK_KEY, owner, timeout=app_settings.DASHBOARD_TICK * 10
+    )
+    if not acquired:
+        return
+    try:
+        OrganizationDashboardPublisher().publish()
+    finally:
+        release_lock(DASHBOARD_LOCK_KEY, owner)
+
+
+@shared_task(base=OpenwispCeleryTask)
+def relay_upgrade_events():
+    """
+    Publishes the events of the outbox, runs are skipped while a
+    previous run is still in progress, which keeps the events in order
+    """
+    from .websockets import UpgradeEventRelay
+
+    owner = uuid4()
+    timeout = app_settings.EVENT_RELAY_TIMEOUT
+    while True:
+        acquired, _ = acquire_lock(EVENT_RELAY_LOCK_KEY, owner, timeout=timeout)
+        if not acquired:
+            return
+        try:
+            # stops well before the expiration of the lock
+            UpgradeEventRelay().relay(deadline=time.monotonic() + timeout / 2)
+        finally:
+            release_lock(EVENT_RELAY_LOCK_KEY, owner)
+        # events may have been added after the last read
+        # of the outbox by runs which have been skipped
+        if not UpgradeEventRelay.is_scheduled():
+            return
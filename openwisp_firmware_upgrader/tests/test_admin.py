@@ -16,6 +16,7 @@ from openwisp_controller.config.tests.test_admin import TestAdmin as TestConfigA
 from openwisp_controller.connection import settings as conn_settings
 from openwisp_firmware_upgrader.admin import (
     BatchUpgradeConfirmationForm,
+    BatchUpgradeOperationAdmin,
     BuildAdmin,
     DeviceAdmin,
     DeviceFirmwareForm,
@@ -792,6 +793,70 @@ class TestAdmin(BaseTestAdmin, TestCase):
                 html=True,
             )
 
+    @mock.patch.object(BatchUpgradeOperationAdmin, "device_upgrades_per_page", 1)
+    def test_batch_upgrade_operation_pagination(self):
+        env = self._create_upgrade_env()
+        batch = env["build2"].batch_upgrade(firmwareless=True)
+        operations = list(batch.upgradeoperation_set.order_by("created", "id"))
+        self.assertEqual(len(operations), 2)
+        self._login()
+        url = reverse(
+            f"admin:{self.app_label}_batchupgradeoperation_change", args=[batch.pk]
+        )
+
+        def _operation_row(operation):
+            return f'data-operation-id="{operation.pk}"'
+
+        with self.subTest("First page"):
+            response = self.client.get(url)
+            self.assertContains(response, _operation_row(operations[0]))
+            self.assertNotContains(response, _operation_row(operations[1]))
+            self.assertContains(response, f'href="?after={operations[0].pk}"')
+            self.assertNotContains(response, "?before=")
+
+        with self.subTest("Next page"):
+            response = self.client.get(url, {"after": operations[0].pk})
+            self.assertNotContains(response, _operation_row(operations[0]))
+            self.assertContains(response, _operation_row(operations[1]))
+            self.assertContains(response, f'href="?before={operations[1].pk}"')
+            self.assertNotContains(response, "?after=")
+
+        with self.subTest("Previous page"):
+            response = self.client.get(url, {"before": operations[1].pk})
+            self.assertContains(response, _operation_row(operations[0]))
+            self.assertNotContains(response, _operation_row(operations[1]))
+            self.assertNotContains(response, "?before=")
+
+        with self.subTest("Invalid cursor shows the first page"):
+            response = self.client.get(url, {"after": "invalid"})
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, _operation_row(operations[0]))
+
+        batch.upgradeoperation_set.update(status="failed")
+        BatchUpgradeOperation.objects.filter(pk=batch.pk).update(
+            status="in-progress", launched_operations=12, completed_operations=9
+        )
+
+        with self.subTest("Counts of running mass upgrades are read from counters"):
+            response = self.client.get(url)
+            self.assertContains(response, "12 upgrade operations")
+            response = self.client.get(url, {"status": "in-progress"})
+            self.assertContains(response, "3 upgrade operations")
+
+        with self.subTest("Other statuses are counted"):
+            response = self.client.get(url, {"status": "failed"})
+            self.assertContains(response, "2 upgrade operations")
+
+        with self.subTest("Searches are counted"):
+            response = self.client.get(url, {"q": env["d1"].name})
+            self.assertContains(response, "1 upgrade operation")
+            self.assertNotContains(response, "12 upgrade operations")
+
+        with self.subTest("Finished mass upgrades are counted"):
+            BatchUpgradeOperation.objects.filter(pk=batch.pk).update(status="failed")
+            response = self.client.get(url)
+            self.assertContains(response, "2 upgrade operations")
+
     def _get_device_upgrade_operation_delete_params(
         self, device, device_conn, device_fw, operation
     ):
@@ -924,6 +989,79 @@ class TestAdmin(BaseTestAdmin, TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, '<option value="delete_selected">')
 
+    def test_batch_upgrade_operation_admin_actions_present(self):
+        model_admin = BatchUpgradeOperationAdmin(BatchUpgradeOperation, admin.site)
+        request = RequestFactory().get("/")
+
+        with self.subTest("Superuser"):
+            request.user = self._get_admin()
+            self.assertEqual(
+                list(model_admin.get_actions(request)),
+                ["delete_selected", "resume_selected", "retry_failed_selected"],
+            )
+
+        with self.subTest("User without add permission cannot retry"):
+            user = self._create_user(is_staff=True)
+            user.user_permissions.add(
+                Permission.objects.get(
+                    codename=f"change_{BatchUpgradeOperation._meta.model_name}"
+                )
+            )
+            request.user = User.objects.get(pk=user.pk)
+            self.assertEqual(
+                list(model_admin.get_actions(request)), ["resume_selected"]
+            )
+
+    @mock.patch("openwisp_firmware_upgrader.base.models.batch_upgrade_operation.delay")
+    def test_batch_upgrade_operation_admin_resume_selected_action(self, delay):
+        self._login()
+        env = self._create_upgrade_env()
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], status="paused"
+        )
+        url = reverse(f"admin:{self.app_label}_batchupgradeoperation_changelist")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                url,
+                {"action": "resume_selected", ACTION_CHECKBOX_NAME: [str(batch.pk)]},
+                follow=True,
+            )
+        self.assertContains(response, "1 mass upgrade operation(s) resumed")
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, "in-progress")
+        delay.assert_called_once_with(batch.pk, False)
+
+    @mock.patch("openwisp_firmware_upgrader.base.models.batch_upgrade_operation.delay")
+    def test_batch_upgrade_operation_admin_retry_failed_selected_action(self, delay):
+        self._login()
+        env = self._create_upgrade_env()
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], status="failed"
+        )
+        UpgradeOperation.objects.create(
+            device=env["d1"], image=env["image2a"], batch=batch, status="failed"
+        )
+        url = reverse(f"admin:{self.app_label}_batchupgradeoperation_changelist")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                url,
+                {
+                    "action": "retry_failed_selected",
+                    ACTION_CHECKBOX_NAME: [str(batch.pk)],
+                },
+                follow=True,
+            )
+        self.assertContains(
+            response,
+            "1 mass upgrade operation(s) created to retry failed upgrades",
+        )
+        retry = batch.retries.get()
+        self.assertEqual(
+            list(retry.batchupgradetarget_set.values_list("device", "image")),
+            [(env["d1"].pk, env["image2a"].pk)],
+        )
+        delay.assert_called_once_with(retry.pk, False)
+
     def test_batch_upgrade_operation_admin_delete_by_status(self):
         self._login()
         build = self._create_build()
@@ -1788,7 +1926,7 @@ class TestAdminTransaction(
                 f"admin:{self.app_label}_batchupgradeoperation_change", args=[batch.pk]
             )
             with self.subTest("Test search + status filter"):
-                with self.assertNumQueries(25 if django.VERSION < (5, 2) else 23):
+                with self.assertNumQueries(21 if django.VERSION < (5, 2) else 19):
                     response = self.client.get(url + "?q=unique-test&status=success")
                 self.assertEqual(response.status_code, 200)
                 self.assertContains(response, "unique-test-device")
@@ -1,10 +1,14 @@
+import json
 import uuid
+from datetime import timedelta
 from unittest import mock
 
 import swapper
+from asgiref.sync import async_to_sync
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import AsyncClient, Client, TestCase
 from django.urls import reverse
+from django.utils.timezone import now
 from packaging.version import parse as parse_version
 from rest_framework import VERSION as REST_FRAMEWORK_VERSION
 
@@ -18,6 +22,7 @@ from openwisp_firmware_upgrader.api.serializers import (
     FirmwareImageSerializer,
     UpgradeOperationSerializer,
 )
+from openwisp_firmware_upgrader.tasks import delete_old_upgrade_events
 from openwisp_firmware_upgrader.tests.base import (
     FirmwareDownloadPermissionTestMixin,
     TestUpgraderMixin,
@@ -25,7 +30,9 @@ from openwisp_firmware_upgrader.tests.base import (
 from openwisp_users.tests.utils import TestMultitenantAdminMixin
 from openwisp_utils.tests import AssertNumQueriesSubTestMixin
 
+from .. import settings as app_settings
 from ..swapper import load_model
+from ..websockets import UpgradeProgressPublisher
 
 BatchUpgradeOperation = load_model("BatchUpgradeOperation")
 Build = load_model("Build")
@@ -34,6 +41,7 @@ DeviceFirmware = load_model("DeviceFirmware")
 Device = swapper.load_model("config", "Device")
 FirmwareImage = load_model("FirmwareImage")
 UpgradeOperation = load_model("UpgradeOperation")
+UpgradeEvent = load_model("UpgradeEvent")
 OrganizationUser = swapper.load_model("openwisp_users", "OrganizationUser")
 Location = swapper.load_model("geo", "Location")
 DeviceLocation = swapper.load_model("geo", "DeviceLocation")
@@ -326,13 +334,23 @@ class TestBuildViews(TestAPIUpgraderMixin, TestCase):
         self.assertEqual(BatchUpgradeOperation.objects.count(), 0)
         with self.subTest("Existing build"):
             url = reverse("upgrader:api_build_batch_upgrade", args=[build.pk])
-            with self.assertNumQueries(10):
+            with self.assertNumQueries(12):
                 r = self.client.post(url)
             self.assertEqual(BatchUpgradeOperation.objects.count(), 1)
             batch = BatchUpgradeOperation.objects.first()
             self.assertEqual(r.status_code, 201)
             self.assertEqual(r.data, {"batch": str(batch.pk)})
 
+        with self.subTest("Invalid rollout plan"):
+            r = self.client.post(
+                url,
+                {"rollout_plan": {"waves": [0]}},
+                content_type="application/json",
+            )
+            self.assertEqual(r.status_code, 400)
+            self.assertIn("The rollout plan is invalid", r.data["error"])
+            self.assertEqual(BatchUpgradeOperation.objects.count(), 1)
+
         with self.subTest("Non existing build"):
             url = reverse("upgrader:api_build_batch_upgrade", args=[uuid.uuid4()])
             with self.assertNumQueries(4):
@@ -442,7 +460,7 @@ class TestBuildViews(TestAPIUpgraderMixin, TestCase):
         with self.subTest(
             "Test superuser can mass upgrade shared build with upgrade_all"
         ):
-            with self.assertNumQueries(8):
+            with self.assertNumQueries(10):
                 response = self.client.post(path, {"upgrade_all": True})
             self.assertEqual(response.status_code, 201)
             batch = BatchUpgradeOperation.objects.first()
@@ -937,6 +955,25 @@ class TestBatchUpgradeOperationViews(TestAPIUpgraderMixin, TestCase):
             r = self.client.get(url)
         self.assertEqual(r.data["results"], serialized_list)
 
+    def test_batchupgradeoperation_list_keyset_pagination(self):
+        env = self._create_upgrade_env()
+        env["build1"].batch_upgrade(firmwareless=False)
+        env["build2"].batch_upgrade(firmwareless=False)
+        operations = list(BatchUpgradeOperation.objects.order_by("-created", "-id"))
+        url = reverse("upgrader:api_batchupgradeoperation_list")
+        r = self.client.get(url, {"page_size": 1, "cursor": ""})
+        self.assertEqual(r.status_code, 200)
+        self.assertNotIn("count", r.data)
+        self.assertEqual(
+            r.data["results"], [self._serialize_upgrade_env(operations[0])]
+        )
+        r = self.client.get(r.data["next"])
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(
+            r.data["results"], [self._serialize_upgrade_env(operations[1])]
+        )
+        self.assertIsNone(r.data["next"])
+
     def test_batchupgradeoperation_list_django_filters(self):
         env = self._create_upgrade_env(organization=self.org)
         env["build1"].batch_upgrade(firmwareless=False)
@@ -1042,6 +1079,51 @@ class TestBatchUpgradeOperationViews(TestAPIUpgraderMixin, TestCase):
         with self.assertNumQueries(7):
             r = self.client.get(url)
         self.assertEqual(r.data, serialized)
+        self.assertNotIn("upgradeoperations", r.data)
+
+    def test_batchupgradeoperation_upgradeoperation_list(self):
+        env = self._create_upgrade_env()
+        env["build2"].batch_upgrade(firmwareless=False)
+        batch = BatchUpgradeOperation.objects.get(build=env["build2"])
+        operations = list(batch.upgradeoperation_set.order_by("-created", "-id"))
+        self.assertEqual(len(operations), 2)
+        url = reverse(
+            "upgrader:api_batchupgradeoperation_upgradeoperation_list",
+            args=[batch.pk],
+        )
+
+        with self.subTest("Test keyset pagination"):
+            r = self.client.get(url, {"page_size": 1})
+            self.assertEqual(r.status_code, 200)
+            self.assertIsNone(r.data["previous"])
+            self.assertEqual(r.data["results"][0]["id"], str(operations[0].pk))
+            self.assertNotIn("log", r.data["results"][0])
+            r = self.client.get(r.data["next"])
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.data["results"][0]["id"], str(operations[1].pk))
+            self.assertIsNone(r.data["next"])
+
+        with self.subTest("Test invalid cursor"):
+            r = self.client.get(url, {"cursor": "invalid"})
+            self.assertEqual(r.status_code, 404)
+
+        with self.subTest("Test filtering using status"):
+            operations[0].status = "failed"
+            operations[0].save()
+            r = self.client.get(url, {"status": "failed", "fields": "id,status,log"})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(len(r.data["results"]), 1)
+            self.assertEqual(r.data["results"][0]["id"], str(operations[0].pk))
+            self.assertIn("log", r.data["results"][0])
+
+        with self.subTest("Test mass upgrade of another organization"):
+            org2 = self._create_org(name="org2", slug="org2")
+            self._create_operator(
+                organizations=[org2], username="operator2", email="operator2@test.com"
+            )
+            self._login("operator2", "tester")
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 404)
 
 
 class TestFirmwareImageViews(TestAPIUpgraderMixin, TestCase):
@@ -1682,7 +1764,8 @@ class TestDeviceFirmwareImageViews(TestAPIUpgraderMixin, TestCase):
 
 class TestDeviceUpgradeOperationViews(TestAPIUpgraderMixin, TestCase):
     def _serialize_device_upgrade_operation(self, device_uo):
-        serializer = DeviceUpgradeOperationSerializer()
+        fields = [f for f in DeviceUpgradeOperationSerializer.Meta.fields if f != "log"]
+        serializer = DeviceUpgradeOperationSerializer(context={"sparse_fields": fields})
         return dict(serializer.to_representation(device_uo))
 
     def _create_device_uo_multi_env(self):
@@ -1840,11 +1923,16 @@ class TestDeviceUpgradeOperationViews(TestAPIUpgraderMixin, TestCase):
 
 
 class TestUpgradeOperationViews(TestAPIUpgraderMixin, TestCase):
-    def _serialize_upgrade_operation(self, uo, many=False):
+    def _serialize_upgrade_operation(self, uo, many=False, action="list"):
+        context = {}
+        if action == "list":
+            context["sparse_fields"] = [
+                f for f in UpgradeOperationSerializer.Meta.fields if f != "log"
+            ]
         if many:
-            serializer = UpgradeOperationSerializer(uo, many=many)
+            serializer = UpgradeOperationSerializer(uo, many=many, context=context)
             return serializer.data
-        serializer = UpgradeOperationSerializer()
+        serializer = UpgradeOperationSerializer(context=context)
         return dict(serializer.to_representation(uo))
 
     def _create_upgrade_operation_multi_env(self):
@@ -1963,7 +2051,7 @@ class TestUpgradeOperationViews(TestAPIUpgraderMixin, TestCase):
             with self.assertNumQueries(5):
                 r = self.client.get(url)
             self.assertEqual(r.status_code, 200)
-            serializer_list = self._serialize_upgrade_operation(uo1)
+            serializer_list = self._serialize_upgrade_operation(uo1, action="detail")
             self.assertEqual(r.data, serializer_list)
 
     def test_uo_list_django_filters(self):
@@ -2020,7 +2108,7 @@ class TestUpgradeOperationViews(TestAPIUpgraderMixin, TestCase):
             with self.assertNumQueries(5):
                 r = self.client.get(url)
             self.assertEqual(r.status_code, 200)
-            serializer_detail = self._serialize_upgrade_operation(uo1)
+            serializer_detail = self._serialize_upgrade_operation(uo1, action="detail")
             self.assertEqual(r.data, serializer_detail)
             url = reverse("upgrader:api_upgradeoperation_detail", args=[uo2.pk])
             with self.assertNumQueries(4):
@@ -2068,6 +2156,180 @@ class TestUpgradeOperationViews(TestAPIUpgraderMixin, TestCase):
             serializer_list = self._serialize_upgrade_operation(uo_qs, many=True)
             self.assertEqual(r.data["results"], serializer_list)
 
+    def test_uo_list_sparse_fieldsets(self):
+        self._create_upgrade_env(upgrade_operation=True)
+        url = reverse("upgrader:api_upgradeoperation_list")
+
+        with self.subTest("Test log is excluded by default"):
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            self.assertNotIn("log", r.data["results"][0])
+
+        with self.subTest("Test fields parameter"):
+            r = self.client.get(url, {"fields": "id,status,log"})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(list(r.data["results"][0]), ["id", "status", "log"])
+
+        with self.subTest("Test exclude parameter"):
+            r = self.client.get(url, {"exclude": "log,progress,image"})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(
+                list(r.data["results"][0]),
+                ["id", "device", "status", "modified", "created"],
+            )
+
+        with self.subTest("Test unknown fields"):
+            r = self.client.get(url, {"fields": "id,password"})
+            self.assertEqual(r.status_code, 400)
+            self.assertIn("password", str(r.data["fields"]))
+
+        with self.subTest("Test fields and exclude together"):
+            r = self.client.get(url, {"fields": "id", "exclude": "log"})
+            self.assertEqual(r.status_code, 400)
+
+        with self.subTest("Test device upgrade operation list"):
+            device = UpgradeOperation.objects.first().device
+            url = reverse("upgrader:api_deviceupgradeoperation_list", args=[device.pk])
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            self.assertNotIn("log", r.data["results"][0])
+            r = self.client.get(url, {"fields": "id,log"})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(list(r.data["results"][0]), ["id", "log"])
+
+    def test_uo_list_keyset_pagination(self):
+        self._create_upgrade_env(upgrade_operation=True)
+        operations = list(UpgradeOperation.objects.order_by("-created", "-id"))
+        url = reverse("upgrader:api_upgradeoperation_list")
+
+        with self.subTest("Test offset pagination is used by default"):
+            r = self.client.get(url, {"page_size": 1})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.data["count"], 2)
+
+        with self.subTest("Test keyset pagination"):
+            with self.assertNumQueries(4):
+                r = self.client.get(url, {"page_size": 1, "cursor": ""})
+            self.assertEqual(r.status_code, 200)
+            self.assertNotIn("count", r.data)
+            self.assertEqual(r.data["results"][0]["id"], str(operations[0].pk))
+            # operations created in the meantime do not shift the pages
+            UpgradeOperation.objects.create(
+                device=operations[0].device, image=operations[0].image
+            )
+            r = self.client.get(r.data["next"])
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.data["results"][0]["id"], str(operations[1].pk))
+            self.assertIsNone(r.data["next"])
+
+    def test_uo_export(self):
+        d1, _, image1, _, uo1, uo2 = self._create_upgrade_operation_multi_env()
+        UpgradeOperation.objects.filter(pk=uo1.pk).update(log="line1\nline2")
+        self._login("org1_manager", "tester")
+
+        with self.subTest("Test CSV export"):
+            url = reverse("upgrader:api_upgradeoperation_export", args=["csv"])
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r["Content-Type"], "text/csv")
+            lines = b"".join(r.streaming_content).decode().splitlines()
+            self.assertEqual(
+                lines[0],
+                "id,device,device_name,image,image_type,batch,"
+                "status,progress,created,modified",
+            )
+            # operations of other organizations are not exported
+            self.assertEqual(len(lines), 2)
+            self.assertTrue(lines[1].startswith(f"{uo1.pk},{d1.pk},device1,"))
+
+        with self.subTest("Test NDJSON export with log"):
+            url = reverse("upgrader:api_upgradeoperation_export", args=["ndjson"])
+            r = self.client.get(url, {"log": "true"})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r["Content-Type"], "application/x-ndjson")
+            rows = [
+                json.loads(line)
+                for line in b"".join(r.streaming_content).decode().splitlines()
+            ]
+            self.assertEqual(len(rows), 1)
+            self.assertEqual(rows[0]["id"], str(uo1.pk))
+            self.assertEqual(rows[0]["image"], str(image1.pk))
+            self.assertEqual(rows[0]["status"], "in-progress")
+            self.assertEqual(rows[0]["log"], "line1\nline2")
+
+        with self.subTest("Test filters"):
+            r = self.client.get(url, {"status": "success"})
+            self.assertEqual(b"".join(r.streaming_content), b"")
+            r = self.client.get(
+                url, {"created_after": (uo1.created - timedelta(days=1)).isoformat()}
+            )
+            self.assertEqual(len(b"".join(r.streaming_content).splitlines()), 1)
+
+        with self.subTest("Test streaming through the ASGI handler"):
+            token = self._obtain_auth_token("org1_manager", "tester")
+            client = AsyncClient(headers={"authorization": f"Bearer {token}"})
+            url = reverse("upgrader:api_upgradeoperation_export", args=["csv"])
+
+            async def get_export():
+                response = await client.get(url)
+                # the rows are read by an asynchronous iterator
+                self.assertTrue(response.is_async)
+                return b"".join([chunk async for chunk in response.streaming_content])
+
+            lines = async_to_sync(get_export)().decode().splitlines()
+            self.assertEqual(len(lines), 2)
+            self.assertTrue(lines[0].startswith("id,device,device_name,"))
+            self.assertTrue(lines[1].startswith(f"{uo1.pk},{d1.pk},device1,"))
+
+        with self.subTest("Test unsupported format"):
+            url = reverse("upgrader:api_upgradeoperation_export", args=["xml"])
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 404)
+
+        with self.subTest("Test superuser"):
+            self._login("org_admin", "tester")
+            url = reverse("upgrader:api_upgradeoperation_export", args=["ndjson"])
+            r = self.client.get(url)
+            self.assertEqual(len(b"".join(r.streaming_content).splitlines()), 2)
+
+    def test_uo_log(self):
+        d1, _, _, _, uo1, uo2 = self._create_upgrade_operation_multi_env()
+        UpgradeOperation.objects.filter(pk=uo1.pk).update(log="line1\nline2")
+        self._login("org1_manager", "tester")
+        url = reverse("upgrader:api_upgradeoperation_log", args=[uo1.pk])
+
+        with self.subTest("Test whole log"):
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(
+                r.data,
+                {
+                    "id": str(uo1.pk),
+                    "status": "in-progress",
+                    "log": "line1\nline2",
+                    "offset": 11,
+                },
+            )
+
+        with self.subTest("Test since parameter"):
+            r = self.client.get(url, {"since": 6})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.data["log"], "line2")
+            self.assertEqual(r.data["offset"], 11)
+            r = self.client.get(url, {"since": 11})
+            self.assertEqual(r.data["log"], "")
+
+        with self.subTest("Test invalid since parameter"):
+            for since in ["-1", "invalid"]:
+                r = self.client.get(url, {"since": since})
+                self.assertEqual(r.status_code, 400)
+                self.assertIn("since", r.data)
+
+        with self.subTest("Test multitenancy"):
+            url = reverse("upgrader:api_upgradeoperation_log", args=[uo2.pk])
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 404)
+
 
 class TestOrgAPIMixin(TestAPIUpgraderMixin, TestCase):
     def _serialize_build(self, build):
@@ -2159,6 +2421,257 @@ class TestApiMisc(TestAPIUpgraderMixin, TestCase):
         self.assertEqual(response.status_code, 404)
         self.assertIn("not found", response.data["error"])
 
+    def test_batch_upgrade_operation_cancel(self):
+        env = self._create_upgrade_env(organization=self.org)
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], status="in-progress", launch_phase="completed"
+        )
+        for device, image in (("d1", "image2a"), ("d2", "image2b")):
+            UpgradeOperation.objects.create(
+                device=env[device], image=env[image], batch=batch
+            )
+        url = reverse("upgrader:api_batchupgradeoperation_cancel", args=[batch.pk])
+
+        with self.subTest("Test as operator"):
+            self._login("operator", "tester")
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 403)
+
+        self._login()
+
+        with self.subTest("Cancel mass upgrade operation"):
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["cancelled"], 2)
+            self.assertEqual(
+                batch.upgradeoperation_set.filter(status="cancelled").count(), 2
+            )
+            batch.refresh_from_db()
+            self.assertEqual(batch.status, "cancelled")
+
+        with self.subTest("Nothing left to cancel"):
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["cancelled"], 0)
+
+        with self.subTest("Mass upgrade operation not found"):
+            url = reverse(
+                "upgrader:api_batchupgradeoperation_cancel", args=[uuid.uuid4()]
+            )
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 404)
+
+    @mock.patch("openwisp_firmware_upgrader.base.models.batch_upgrade_operation.delay")
+    def test_batch_upgrade_operation_retry(self, delay):
+        env = self._create_upgrade_env(organization=self.org)
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], status="failed"
+        )
+        UpgradeOperation.objects.create(
+            device=env["d1"], image=env["image2a"], batch=batch, status="failed"
+        )
+        url = reverse("upgrader:api_batchupgradeoperation_retry", args=[batch.pk])
+
+        with self.subTest("Test as operator"):
+            self._login("operator", "tester")
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 403)
+            delay.assert_not_called()
+
+        self._login()
+
+        with self.subTest("Retry failed upgrades"):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url)
+            self.assertEqual(response.status_code, 201)
+            retry = BatchUpgradeOperation.objects.get(pk=response.data["batch"])
+            self.assertEqual(retry.parent, batch)
+            self.assertEqual(retry.batchupgradetarget_set.count(), 1)
+            delay.assert_called_once_with(retry.pk, False)
+
+        with self.subTest("Nothing left to retry"):
+            batch.upgradeoperation_set.update(status="success")
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 409)
+            self.assertIn("error", response.data)
+
+        with self.subTest("Mass upgrade operation not found"):
+            url = reverse(
+                "upgrader:api_batchupgradeoperation_retry", args=[uuid.uuid4()]
+            )
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 404)
+
+    @mock.patch("openwisp_firmware_upgrader.base.models.batch_upgrade_operation.delay")
+    def test_batch_upgrade_operation_resume(self, delay):
+        env = self._create_upgrade_env(organization=self.org)
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], firmwareless=True
+        )
+        url = reverse("upgrader:api_batchupgradeoperation_resume", args=[batch.pk])
+
+        with self.subTest("Test as operator"):
+            self._login("operator", "tester")
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 403)
+            delay.assert_not_called()
+
+        self._login()
+
+        with self.subTest("Resume interrupted launch"):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("message", response.data)
+            delay.assert_called_once_with(batch.pk, True)
+
+        with self.subTest("Launch already completed"):
+            delay.reset_mock()
+            batch.launch_phase = "completed"
+            batch.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url)
+            self.assertEqual(response.status_code, 409)
+            self.assertIn("have been reached", response.data["error"])
+            delay.assert_not_called()
+
+        with self.subTest("Resume paused mass upgrade operation"):
+            batch.status = "paused"
+            batch.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url)
+            self.assertEqual(response.status_code, 200)
+            batch.refresh_from_db()
+            self.assertEqual(batch.status, "in-progress")
+            self.assertIsNotNone(batch.resumed)
+            delay.assert_not_called()
+
+        with self.subTest("Mass upgrade operation not found"):
+            url = reverse(
+                "upgrader:api_batchupgradeoperation_resume", args=[uuid.uuid4()]
+            )
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 404)
+            self.assertIn("not found", response.data["error"])
+
+    @mock.patch("openwisp_firmware_upgrader.websockets._group_send")
+    def test_upgrade_operation_events(self, *args):
+        env = self._create_upgrade_env(organization=self.org)
+        operation = UpgradeOperation.objects.create(
+            device=env["d1"], image=env["image2a"]
+        )
+        publisher = UpgradeProgressPublisher(env["d1"].pk, operation.pk)
+        for status in ["in-progress", "success"]:
+            publisher.publish_operation_update(
+                {"id": str(operation.pk), "status": status}
+            )
+        event_ids = list(
+            UpgradeEvent.objects.filter(operation_id=operation.pk)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        self.assertEqual(len(event_ids), 2)
+        url = reverse("upgrader:api_upgradeoperation_events", args=[operation.pk])
+
+        with self.subTest("Unauthenticated"):
+            response = Client().get(url)
+            self.assertEqual(response.status_code, 401)
+
+        with self.subTest("Object not found"):
+            response = self.client.get(
+                reverse("upgrader:api_upgradeoperation_events", args=[uuid.uuid4()])
+            )
+            self.assertEqual(response.status_code, 403)
+
+        with self.subTest("Long-polling from the beginning of the log"):
+            response = self.client.get(url, {"last_event_id": 0})
+            self.assertEqual(response.status_code, 200)
+            content = response.json()
+            self.assertEqual(content["last_event_id"], event_ids[-1])
+            self.assertEqual([event["id"] for event in content["events"]], event_ids)
+            self.assertEqual(
+                content["events"][1]["data"]["operation"]["status"], "success"
+            )
+
+        with self.subTest("Resume with Last-Event-ID"):
+            response = self.client.get(url, headers={"last-event-id": event_ids[0]})
+            content = response.json()
+            self.assertEqual(
+                [event["id"] for event in content["events"]], event_ids[1:]
+            )
+
+        with self.subTest("Invalid event ID"):
+            response = self.client.get(url, {"last_event_id": "invalid"})
+            self.assertEqual(response.status_code, 400)
+
+        with mock.patch.object(app_settings, "EVENT_STREAM_TIMEOUT", 0):
+            with self.subTest("Long-polling without new events"):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response.json(), {"last_event_id": event_ids[-1], "events": []}
+                )
+
+            with self.subTest("Server-sent events"):
+                response = self.client.get(
+                    url, {"last_event_id": 0}, headers={"accept": "text/event-stream"}
+                )
+                self.assertEqual(response["Content-Type"], "text/event-stream")
+                self.assertEqual(b"".join(response).decode(), "retry: 1000\nid: 0\n\n")
+
+        with self.subTest("Server-sent events from the event log"):
+            with mock.patch.object(app_settings, "EVENT_STREAM_TIMEOUT", 0.1):
+                response = self.client.get(
+                    url, {"last_event_id": 0}, headers={"accept": "text/event-stream"}
+                )
+                content = b"".join(response).decode()
+            self.assertIn(f"id: {event_ids[0]}\ndata: {{", content)
+            self.assertIn(f"id: {event_ids[1]}\ndata: {{", content)
+
+        with self.subTest("Old events are deleted"):
+            UpgradeEvent.objects.filter(pk=event_ids[0]).update(
+                created=now() - timedelta(hours=2)
+            )
+            delete_old_upgrade_events.delay()
+            self.assertEqual(
+                list(
+                    UpgradeEvent.objects.filter(operation_id=operation.pk).values_list(
+                        "id", flat=True
+                    )
+                ),
+                event_ids[1:],
+            )
+
+        with self.subTest("Lines added to the log"):
+            UpgradeOperation.objects.filter(pk=operation.pk).update(
+                log="line 1\nline 2"
+            )
+            operation.refresh_from_db()
+            publisher.publish_operation_update(
+                UpgradeProgressPublisher.get_operation_state(operation)
+            )
+            response = self.client.get(
+                url, {"last_event_id": event_ids[-1], "log_since": 7}
+            )
+            self.assertEqual(
+                response.json()["log"], {"since": 7, "offset": 13, "log": "line 2"}
+            )
+            with mock.patch.object(app_settings, "EVENT_STREAM_TIMEOUT", 0.1):
+                response = self.client.get(
+                    url,
+                    {"last_event_id": event_ids[-1]},
+                    headers={"accept": "text/event-stream"},
+                )
+                content = b"".join(response).decode()
+            self.assertIn(
+                'event: log\ndata: {"since": 0, "offset": 13, '
+                '"log": "line 1\\nline 2"}\n\n',
+                content,
+            )
+
+        with self.subTest("Invalid log offset"):
+            response = self.client.get(url, {"log_since": -1})
+            self.assertEqual(response.status_code, 400)
+
 
 class TestFirmwareDownloadPermissions(
     FirmwareDownloadPermissionTestMixin, TestAPIUpgraderMixin, TestCase
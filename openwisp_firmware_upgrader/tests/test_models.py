@@ -1,12 +1,15 @@
 import io
 import uuid
 from contextlib import redirect_stdout
-from unittest import mock
+from datetime import timedelta
+from unittest import mock, skipUnless
 from unittest.mock import MagicMock, patch
 
 import swapper
-from celery.exceptions import Retry
+from celery.exceptions import Retry, SoftTimeLimitExceeded
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
 
@@ -14,12 +17,29 @@ from openwisp_utils.tests import capture_any_output
 
 from .. import settings as app_settings
 from ..hardware import FIRMWARE_IMAGE_MAP, REVERSE_FIRMWARE_IMAGE_MAP
+from ..signals import (
+    batch_upgrade_operations_cancelled,
+    batch_upgrade_paused,
+    device_upgrade_lock_contended,
+)
 from ..swapper import load_model
-from ..tasks import upgrade_firmware
+from ..tasks import (
+    archive_upgrade_operations,
+    batch_upgrade_operation,
+    upgrade_firmware,
+)
+from ..utils import (
+    UpgradeProgress,
+    acquire_device_upgrade_lock,
+    get_device_upgrade_lock_key,
+    release_device_upgrade_lock,
+)
 from .base import TestUpgraderMixin
 
 Group = swapper.load_model("openwisp_users", "Group")
+ArchivedUpgradeOperation = load_model("ArchivedUpgradeOperation")
 BatchUpgradeOperation = load_model("BatchUpgradeOperation")
+BatchUpgradeTarget = load_model("BatchUpgradeTarget")
 Build = load_model("Build")
 Category = load_model("Category")
 DeviceFirmware = load_model("DeviceFirmware")
@@ -355,6 +375,83 @@ class TestModels(TestUpgraderMixin, TestCase):
         self.assertEqual(operation.status, "aborted")
         self.assertIn("deactivated", operation.log)
 
+    def _create_pending_upgrade_operation(self):
+        device_fw = self._create_device_firmware()
+        operation = UpgradeOperation(device=device_fw.device, image=device_fw.image)
+        operation.full_clean()
+        operation.save()
+        return operation
+
+    def test_upgrade_operation_lock_contention(self):
+        operation = self._create_pending_upgrade_operation()
+        other_operation_id = uuid.uuid4()
+        acquire_device_upgrade_lock(operation.device_id, other_operation_id)
+        self.addCleanup(
+            release_device_upgrade_lock, operation.device_id, other_operation_id
+        )
+        handler = mock.Mock()
+        device_upgrade_lock_contended.connect(handler)
+        self.addCleanup(device_upgrade_lock_contended.disconnect, handler)
+        with mock.patch.object(DeviceConnection, "get_working_connection") as mocked:
+            operation.upgrade()
+        mocked.assert_not_called()
+        operation.refresh_from_db()
+        self.assertEqual(operation.status, "aborted")
+        self.assertIn("Another upgrade operation is in progress", operation.log)
+        handler.assert_called_once()
+        self.assertEqual(handler.call_args.kwargs["holder"], str(other_operation_id))
+        self.assertFalse(handler.call_args.kwargs["duplicate"])
+        # the lock is still owned by the other operation
+        self.assertEqual(
+            cache.get(get_device_upgrade_lock_key(operation.device_id)),
+            str(other_operation_id),
+        )
+
+    def test_upgrade_operation_lock_duplicate_delivery(self):
+        operation = self._create_pending_upgrade_operation()
+        acquire_device_upgrade_lock(operation.device_id, operation.pk)
+        self.addCleanup(release_device_upgrade_lock, operation.device_id, operation.pk)
+        handler = mock.Mock()
+        device_upgrade_lock_contended.connect(handler)
+        self.addCleanup(device_upgrade_lock_contended.disconnect, handler)
+        with mock.patch.object(DeviceConnection, "get_working_connection") as mocked:
+            with self.assertNumQueries(0):
+                operation.upgrade()
+        mocked.assert_not_called()
+        operation.refresh_from_db()
+        self.assertEqual(operation.status, "in-progress")
+        self.assertEqual(operation.log, "")
+        handler.assert_called_once()
+        self.assertTrue(handler.call_args.kwargs["duplicate"])
+
+    def test_upgrade_operation_lock_released(self):
+        operation = self._create_pending_upgrade_operation()
+        lock_key = get_device_upgrade_lock_key(operation.device_id)
+
+        def _upgrade(recoverable):
+            self.assertEqual(cache.get(lock_key), str(operation.pk))
+
+        with self.subTest("Lock released after upgrade"):
+            with mock.patch.object(operation, "_upgrade", side_effect=_upgrade):
+                operation.upgrade()
+            self.assertIsNone(cache.get(lock_key))
+
+        with self.subTest("Lock released after unexpected error"):
+            with mock.patch.object(
+                operation, "_upgrade", side_effect=RuntimeError("error")
+            ):
+                with self.assertRaises(RuntimeError):
+                    operation.upgrade()
+            self.assertIsNone(cache.get(lock_key))
+
+        with self.subTest("Lock of other operations is not released"):
+            other_operation_id = uuid.uuid4()
+            acquire_device_upgrade_lock(operation.device_id, other_operation_id)
+            release_device_upgrade_lock(operation.device_id, operation.pk)
+            self.assertEqual(cache.get(lock_key), str(other_operation_id))
+            release_device_upgrade_lock(operation.device_id, other_operation_id)
+            self.assertIsNone(cache.get(lock_key))
+
     def test_concurrent_cancellation_race_condition(self):
         """Test that concurrent cancellation attempts don't cause errors."""
         self._create_device_firmware(upgrade=True)
@@ -587,6 +684,519 @@ class TestModels(TestUpgraderMixin, TestCase):
             "Deleted firmware file: %s", "firmware.bin"
         )
 
+    def test_find_firmwareless_device_images(self):
+        env = self._create_upgrade_env(device_firmware=False)
+        build = env["build2"]
+        images = list(build.firmwareimage_set.all())
+        with self.assertNumQueries(1):
+            devices = build._find_firmwareless_device_images(images).values_list(
+                "pk", "firmware_image_id"
+            )
+            self.assertEqual(
+                set(devices),
+                {
+                    (env["d1"].pk, env["image2a"].pk),
+                    (env["d2"].pk, env["image2b"].pk),
+                },
+            )
+
+        with self.subTest("Build without images"):
+            build3 = self._create_build(category=env["category"], version="0.3")
+            with self.assertNumQueries(1):
+                self.assertEqual(list(build3._find_firmwareless_device_images()), [])
+
+    @mock.patch.object(app_settings, "BATCH_FAILURE_WINDOW", 2)
+    @mock.patch.object(app_settings, "BATCH_FAILURE_THRESHOLD", 100)
+    def test_batch_upgrade_circuit_breaker(self):
+        env = self._create_upgrade_env()
+        d3 = self._create_device(
+            name="device3",
+            organization=env["d1"].organization,
+            mac_address="00:11:bb:22:cc:44",
+            model=env["image2a"].boards[0],
+        )
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], status="in-progress"
+        )
+        pending = UpgradeOperation.objects.create(
+            device=d3, image=env["image2a"], batch=batch, progress=20
+        )
+        handler = mock.Mock()
+        batch_upgrade_paused.connect(handler)
+        self.addCleanup(batch_upgrade_paused.disconnect, handler)
+        operations = [
+            UpgradeOperation.objects.create(
+                device=env[device], image=env[image], batch=batch
+            )
+            for device, image in (("d1", "image2a"), ("d2", "image2b"))
+        ]
+
+        with self.subTest("Window not full yet"):
+            operations[0].status = "failed"
+            operations[0].save()
+            batch.refresh_from_db()
+            self.assertEqual(batch.status, "in-progress")
+            handler.assert_not_called()
+
+        with self.subTest("Failure spike pauses the batch"):
+            operations[1].status = "failed"
+            operations[1].save()
+            batch.refresh_from_db()
+            self.assertEqual(batch.status, "paused")
+            handler.assert_called_once()
+            self.assertIn("100%", handler.call_args.kwargs["reason"])
+            pending.refresh_from_db()
+            self.assertEqual(pending.status, "cancelled")
+
+        with self.subTest("Paused batch is not launched"):
+            with mock.patch.object(
+                BatchUpgradeOperation, "create_targets"
+            ) as create_targets:
+                batch.upgrade()
+            create_targets.assert_not_called()
+
+        with self.subTest("Failures before resume are ignored"):
+            batch.resume()
+            batch.refresh_from_db()
+            self.assertEqual(batch.status, "in-progress")
+            self.assertFalse(batch.check_failure_thresholds())
+            self.assertEqual(handler.call_count, 1)
+
+        with self.subTest("Circuit breaker disabled without thresholds"):
+            batch.upgradeoperation_set.update(status="failed", modified=timezone.now())
+            with mock.patch.object(app_settings, "BATCH_FAILURE_THRESHOLD", None):
+                self.assertFalse(batch.check_failure_thresholds())
+            self.assertEqual(handler.call_count, 1)
+
+    def test_batch_upgrade_cancel(self):
+        env = self._create_upgrade_env()
+        d3 = self._create_device(
+            name="device3",
+            organization=env["d1"].organization,
+            mac_address="00:11:bb:22:cc:44",
+            model=env["image2a"].boards[0],
+        )
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], status="in-progress", launch_phase="completed"
+        )
+        cancellable = [
+            UpgradeOperation.objects.create(
+                device=env[device], image=env[image], batch=batch, log=log
+            )
+            for device, image, log in (
+                ("d1", "image2a", "Connecting to device"),
+                ("d2", "image2b", ""),
+            )
+        ]
+        reflashing = UpgradeOperation.objects.create(
+            device=d3,
+            image=env["image2a"],
+            batch=batch,
+            progress=UpgradeProgress.CANCELLATION_THRESHOLD,
+        )
+        handler = mock.Mock()
+        batch_upgrade_operations_cancelled.connect(handler)
+        self.addCleanup(batch_upgrade_operations_cancelled.disconnect, handler)
+
+        with self.subTest("Cancellable operations are cancelled in bulk"):
+            with mock.patch.object(UpgradeOperation, "save") as save:
+                self.assertEqual(batch.cancel(), 2)
+            save.assert_not_called()
+            for operation in cancellable:
+                operation.refresh_from_db()
+                self.assertEqual(operation.status, "cancelled")
+            self.assertEqual(
+                cancellable[0].log,
+                "Connecting to device\nUpgrade operation has been cancelled by user",
+            )
+            self.assertEqual(
+                cancellable[1].log, "Upgrade operation has been cancelled by user"
+            )
+            reflashing.refresh_from_db()
+            self.assertEqual(reflashing.status, "in-progress")
+            handler.assert_called_once()
+            self.assertEqual(
+                set(handler.call_args.kwargs["operation_ids"]),
+                {operation.pk for operation in cancellable},
+            )
+            self.assertEqual(handler.call_args.kwargs["stats"]["cancelled"], 2)
+            batch.refresh_from_db()
+            self.assertEqual(batch.status, "in-progress")
+
+        with self.subTest("Nothing left to cancel"):
+            handler.reset_mock()
+            self.assertEqual(batch.cancel(), 0)
+            handler.assert_not_called()
+
+        with self.subTest("Launch not completed is cancelled"):
+            batch.launch_phase = "launching"
+            batch.launch_cursor = env["d1"].pk
+            batch.status = "in-progress"
+            batch.save()
+            self.assertEqual(batch.cancel(), 0)
+            batch.refresh_from_db()
+            self.assertEqual(batch.status, "cancelled")
+            self.assertEqual(batch.launch_phase, "cancelled")
+            self.assertIsNone(batch.launch_cursor)
+            # the upgrade operation which was flashing the firmware completes
+            reflashing.status = "success"
+            reflashing.save()
+            batch.refresh_from_db()
+            self.assertEqual(batch.status, "cancelled")
+            # the devices which have not been reached are not upgraded
+            with self.assertRaises(ValueError):
+                batch.resume()
+            batch.upgrade()
+            self.assertEqual(batch.upgradeoperation_set.count(), 3)
+            batch.refresh_from_db()
+            self.assertEqual(batch.status, "cancelled")
+
+    @mock.patch("openwisp_firmware_upgrader.base.models.batch_upgrade_operation.delay")
+    def test_batch_upgrade_retry_failed(self, delay):
+        env = self._create_upgrade_env()
+        d3 = self._create_device(
+            name="device3",
+            organization=env["d1"].organization,
+            mac_address="00:11:bb:22:cc:44",
+            model=env["image2a"].boards[0],
+        )
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], upgrade_options={"c": False}, status="in-progress"
+        )
+        for device, image, status in (
+            (env["d1"], env["image2a"], "failed"),
+            (env["d2"], env["image2b"], "aborted"),
+            (d3, env["image2a"], "success"),
+        ):
+            UpgradeOperation.objects.create(
+                device=device, image=image, batch=batch, status=status
+            )
+
+        with self.subTest("Mass upgrade operation not completed"):
+            with self.assertRaises(ValueError):
+                batch.retry_failed()
+            self.assertEqual(batch.retries.count(), 0)
+
+        batch.status = "failed"
+        batch.save()
+
+        with self.subTest("Failed and aborted upgrades are retried"):
+            with self.captureOnCommitCallbacks(execute=True):
+                retry = batch.retry_failed()
+            self.assertEqual(retry.parent, batch)
+            self.assertEqual(retry.upgrade_options, batch.upgrade_options)
+            self.assertEqual(retry.launch_phase, "launching")
+            self.assertEqual(
+                set(retry.batchupgradetarget_set.values_list("device", "image")),
+                {
+                    (env["d1"].pk, env["image2a"].pk),
+                    (env["d2"].pk, env["image2b"].pk),
+                },
+            )
+            delay.assert_called_once_with(retry.pk, False)
+            self.assertEqual(list(batch.retries.all()), [retry])
+
+        with self.subTest("No failed upgrade operations"):
+            batch.upgradeoperation_set.update(status="success")
+            with self.assertRaises(ValueError):
+                batch.retry_failed()
+            self.assertEqual(batch.retries.count(), 1)
+
+    @mock.patch.object(upgrade_firmware, "delay")
+    def test_batch_upgrade_staged_rollout(self, *args):
+        env = self._create_upgrade_env()
+
+        with self.subTest("Invalid rollout plan"):
+            with self.assertRaises(ValidationError) as context:
+                env["build2"].batch_upgrade(
+                    firmwareless=False, rollout_plan={"canary": 0}
+                )
+            self.assertIn("rollout_plan", context.exception.message_dict)
+            self.assertEqual(BatchUpgradeOperation.objects.count(), 0)
+
+        batch = env["build2"].batch_upgrade(
+            firmwareless=False, rollout_plan={"canary": 50, "soak_time": 60}
+        )
+        canary, last = batch.batchupgradewave_set.all()
+        self.assertEqual((canary.size, last.size), (1, 1))
+        self.assertEqual(batch.batchupgradetarget_set.filter(wave=0).count(), 1)
+
+        with self.subTest("Only the canary wave is launched"):
+            batch.upgrade()
+            self.assertEqual(batch.upgradeoperation_set.count(), 1)
+            operation = batch.upgradeoperation_set.get()
+            self.assertEqual(
+                operation.device_id,
+                BatchUpgradeTarget.objects.get(batch=batch, wave=0).device_id,
+            )
+            batch.refresh_from_db()
+            self.assertEqual(batch.launch_phase, "launching")
+            self.assertEqual(batch.status, "in-progress")
+
+        with self.subTest("Successful wave is promoted after the soak time"):
+            with mock.patch.object(batch_upgrade_operation, "apply_async") as mocked:
+                with self.captureOnCommitCallbacks(execute=True):
+                    operation.status = "success"
+                    operation.save()
+            mocked.assert_called_once_with((batch.pk, False), countdown=60)
+            canary.refresh_from_db()
+            self.assertEqual(canary.status, "completed")
+            self.assertEqual((canary.success, canary.success_rate), (1, 100))
+            # further saves do not increment the counters
+            operation.save()
+            canary.refresh_from_db()
+            self.assertEqual(canary.success, 1)
+            batch.refresh_from_db()
+            self.assertEqual(batch.status, "in-progress")
+
+        with self.subTest("Last wave is launched"):
+            batch.upgrade()
+            batch.refresh_from_db()
+            self.assertTrue(batch.is_launched)
+            self.assertEqual(batch.upgradeoperation_set.count(), 2)
+
+        with self.subTest("Unsuccessful wave pauses the batch"):
+            operation = batch.upgradeoperation_set.exclude(pk=operation.pk).get()
+            operation.status = "failed"
+            operation.save()
+            last.refresh_from_db()
+            self.assertEqual(last.status, "halted")
+            self.assertEqual(last.failed, 1)
+            batch.refresh_from_db()
+            self.assertEqual(batch.status, "paused")
+
+    def test_upgrade_operation_log_compression(self):
+        log = "\n".join(
+            f"Writing from <stdin> to /dev/mtdblock3 ... [{i}%]" for i in range(100)
+        )
+        device_fw = self._create_device_firmware()
+        operation = UpgradeOperation.objects.create(
+            device=device_fw.device, image=device_fw.image, log=log
+        )
+        stored = (
+            UpgradeOperation.objects.filter(pk=operation.pk)
+            .values_list("log", flat=True)
+            .get()
+        )
+        self.assertIsInstance(stored, bytes)
+        self.assertLess(len(stored), len(log) / 5)
+
+        with self.subTest("Log is decompressed only when accessed"):
+            operation = UpgradeOperation.objects.get(pk=operation.pk)
+            self.assertIsInstance(operation.__dict__["log"], bytes)
+            self.assertEqual(operation.log, log)
+            self.assertIsInstance(operation.__dict__["log"], str)
+
+        with self.subTest("Log is not compressed again if not accessed"):
+            operation = UpgradeOperation.objects.get(pk=operation.pk)
+            with mock.patch(
+                "openwisp_firmware_upgrader.fields.compress_log"
+            ) as compress:
+                operation.save()
+            compress.assert_not_called()
+
+        with self.subTest("Lines are appended to the compressed log"):
+            operation.log_line("Upgrade completed successfully.")
+            operation = UpgradeOperation.objects.get(pk=operation.pk)
+            self.assertEqual(operation.log, f"{log}\nUpgrade completed successfully.")
+
+    def test_batch_upgrade_operation_counters(self):
+        env = self._create_upgrade_env()
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], status="in-progress"
+        )
+        batch.create_targets(
+            [
+                (env["d1"].pk, env["image2a"].pk),
+                (env["d2"].pk, env["image2b"].pk),
+            ]
+        )
+        operation = UpgradeOperation.objects.create(
+            device=env["d1"], image=env["image2a"], batch=batch
+        )
+
+        def assert_counters(**counters):
+            values = BatchUpgradeOperation.objects.values(*counters).get(pk=batch.pk)
+            self.assertEqual(values, counters)
+
+        assert_counters(
+            total_targets=2,
+            launched_operations=1,
+            completed_operations=0,
+            failed_operations=0,
+        )
+
+        with self.subTest("Failed upgrade operation"):
+            operation.log_line("Connecting to device", save=False)
+            operation.log_line("Connection refused  ", save=False)
+            operation.status = "failed"
+            operation.save()
+            self.assertEqual(operation.failure_reason, "Connection refused")
+            assert_counters(launched_operations=1, completed_operations=1)
+            assert_counters(failed_operations=1)
+
+        with self.subTest("Saving again does not increment the counters"):
+            operation.save()
+            assert_counters(completed_operations=1, failed_operations=1)
+
+        with self.subTest("Stale counters are not saved"):
+            batch.status = "failed"
+            batch.save()
+            assert_counters(total_targets=2, completed_operations=1)
+
+        with self.subTest("Cancelled upgrade operations"):
+            worker_operation = UpgradeOperation.objects.create(
+                device=env["d2"], image=env["image2b"], batch=batch
+            )
+            stale_operation = UpgradeOperation.objects.get(pk=worker_operation.pk)
+            self.assertEqual(batch.cancel_operations(), 1)
+            assert_counters(
+                launched_operations=2, completed_operations=2, failed_operations=1
+            )
+
+        with self.subTest("Upgrade workers of the cancelled upgrade operations"):
+            # the worker checks the cancellation and saves the status
+            worker_operation.refresh_from_db()
+            self.assertEqual(worker_operation.status, "cancelled")
+            worker_operation.log_line("Upgrade cancelled")
+            worker_operation.status = "cancelled"
+            worker_operation.save()
+            # a worker which has not checked the cancellation yet
+            stale_operation.status = "failed"
+            stale_operation.save()
+            assert_counters(
+                launched_operations=2, completed_operations=2, failed_operations=1
+            )
+
+    @mock.patch.object(upgrade_firmware, "delay")
+    def test_cancelled_upgrade_operation_counted_once(self, *args):
+        env = self._create_upgrade_env()
+        batch = env["build2"].batch_upgrade(
+            firmwareless=False, rollout_plan={"canary": 50}
+        )
+        batch.upgrade()
+        operation = batch.upgradeoperation_set.get()
+        canary = batch.batchupgradewave_set.get(number=0)
+        # instances of the upgrade worker, loaded before the cancellation
+        worker_operation = UpgradeOperation.objects.get(pk=operation.pk)
+        stale_operation = UpgradeOperation.objects.get(pk=operation.pk)
+
+        def assert_counters():
+            batch.refresh_from_db()
+            canary.refresh_from_db()
+            self.assertEqual(
+                (batch.launched_operations, batch.completed_operations), (1, 1)
+            )
+            self.assertEqual(batch.failed_operations, 0)
+            self.assertEqual(canary.cancelled, 1)
+
+        operation.cancel()
+        assert_counters()
+
+        with self.subTest("Upgrade worker which checks the cancellation"):
+            worker_operation.refresh_from_db()
+            self.assertEqual(worker_operation.status, "cancelled")
+            worker_operation.log_line("Upgrade cancelled")
+            worker_operation.status = "cancelled"
+            worker_operation.save()
+            assert_counters()
+
+        with self.subTest("Upgrade worker with a stale status"):
+            stale_operation.status = "failed"
+            stale_operation.save()
+            assert_counters()
+
+    @mock.patch.object(app_settings, "RETENTION_CHUNK_SIZE", 1)
+    def test_archive_upgrade_operations(self):
+        env = self._create_upgrade_env()
+        batch = BatchUpgradeOperation.objects.create(build=env["build2"])
+        archived = [
+            UpgradeOperation.objects.create(
+                device=env["d1"],
+                image=env["image2a"],
+                batch=batch,
+                status="success",
+                log="Upgrade completed successfully",
+            ),
+            UpgradeOperation.objects.create(
+                device=env["d2"], image=env["image2b"], batch=batch, status="failed"
+            ),
+        ]
+        running = UpgradeOperation.objects.create(
+            device=env["d2"], image=env["image2b"]
+        )
+        UpgradeOperation.objects.filter(
+            pk__in=[archived[0].pk, archived[1].pk, running.pk]
+        ).update(modified=timezone.now() - timedelta(days=400))
+        recent = UpgradeOperation.objects.create(
+            device=env["d1"], image=env["image2a"], status="success"
+        )
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, "failed")
+        rates = (batch.success_rate, batch.failed_rate, batch.progress_report)
+
+        with self.subTest("Retention disabled"):
+            archive_upgrade_operations.delay()
+            self.assertEqual(ArchivedUpgradeOperation.objects.count(), 0)
+
+        with self.subTest("Old completed operations are archived"):
+            with mock.patch.object(app_settings, "RETENTION_DAYS", 365):
+                archive_upgrade_operations.delay()
+            self.assertEqual(
+                set(UpgradeOperation.objects.values_list("pk", flat=True)),
+                {running.pk, recent.pk},
+            )
+            self.assertEqual(ArchivedUpgradeOperation.objects.count(), 2)
+            operation = ArchivedUpgradeOperation.objects.get(pk=archived[0].pk)
+            self.assertEqual(operation.batch_id, batch.pk)
+            self.assertEqual(operation.status, "success")
+            self.assertEqual(operation.log, "Upgrade completed successfully")
+            self.assertEqual(operation.created, archived[0].created)
+
+        with self.subTest("Statistics of the mass upgrade are preserved"):
+            batch = BatchUpgradeOperation.objects.get(pk=batch.pk)
+            self.assertEqual(batch.archived_operations, {"success": 1, "failed": 1})
+            self.assertEqual(
+                (batch.success_rate, batch.failed_rate, batch.progress_report), rates
+            )
+            status, stats = batch.calculate_and_update_status()
+            self.assertEqual(status, "failed")
+            self.assertEqual(stats["total_operations"], 2)
+            self.assertEqual(stats["successful"], 1)
+
+        with self.subTest("Nothing else to archive"):
+            self.assertEqual(UpgradeOperation.archive(365), 0)
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_query_plans_use_indexes(self):
+        env = self._create_upgrade_env()
+        device = env["d1"]
+        batch = BatchUpgradeOperation.objects.create(build=env["build2"])
+        # the tables of the test database are too small
+        # for the planner to prefer indexes otherwise
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        queries = {
+            "upgradeop_device_running_idx": UpgradeOperation.objects.filter(
+                device=device, status="in-progress"
+            ),
+            "upgradeop_batch_status_idx": UpgradeOperation.objects.filter(
+                batch=batch, status="failed"
+            ).order_by("-created", "-id")[:20],
+            "upgradeop_batch_created_idx": UpgradeOperation.objects.filter(
+                batch=batch
+            ).order_by("created", "id")[:20],
+            "upgradeop_device_created_idx": UpgradeOperation.objects.filter(
+                device_id=device.pk, created__gte=timezone.now() - timedelta(days=7)
+            ).order_by("-created"),
+            "devicefw_image_installed_idx": DeviceFirmware.objects.filter(
+                image=env["image1a"], installed=False
+            ),
+        }
+        for index, queryset in queries.items():
+            with self.subTest(index=index):
+                self.assertIn(index, queryset.explain())
+
     def test_batch_upgrade_operation_str(self):
         build = self._create_build()
         batch = BatchUpgradeOperation.objects.create(build=build)
@@ -674,6 +1284,170 @@ class TestModelsTransaction(TestUpgraderMixin, TransactionTestCase):
             self.assertEqual(batch.build, env["build2"])
             self.assertEqual(batch.status, "success")
 
+    @mock.patch("openwisp_firmware_upgrader.base.models.upgrade_firmware.delay")
+    def test_upgrade_related_and_firmwareless_devices_methods(self, *args):
+        env = self._create_upgrade_env(device_firmware=False)
+        self._create_device_firmware(
+            device=env["d1"],
+            image=env["image1a"],
+            upgrade=False,
+            device_connection=False,
+        )
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], firmwareless=True
+        )
+
+        with self.subTest("upgrade_related_devices"):
+            batch.upgrade_related_devices()
+            self.assertEqual(batch.launch_phase, "launching")
+            self.assertEqual(batch.batchupgradetarget_set.count(), 2)
+            self.assertEqual(
+                list(batch.upgradeoperation_set.values_list("device", flat=True)),
+                [env["d1"].pk],
+            )
+
+        with self.subTest("upgrade_firmwareless_devices"):
+            batch.upgrade_firmwareless_devices()
+            self.assertEqual(
+                set(batch.upgradeoperation_set.values_list("device", flat=True)),
+                {env["d1"].pk, env["d2"].pk},
+            )
+            env["d2"].refresh_from_db()
+            self.assertEqual(env["d2"].devicefirmware.image, env["image2b"])
+
+    def _patch_interrupted_launch(self):
+        """
+        Interrupts the launch of a mass upgrade
+        operation after the first upgrade operation
+        """
+        create_upgrade_operation = DeviceFirmware.create_upgrade_operation
+
+        def side_effect(device_fw, *args, **kwargs):
+            if UpgradeOperation.objects.exists():
+                raise SoftTimeLimitExceeded()
+            return create_upgrade_operation(device_fw, *args, **kwargs)
+
+        return mock.patch.object(
+            DeviceFirmware,
+            "create_upgrade_operation",
+            autospec=True,
+            side_effect=side_effect,
+        )
+
+    @mock.patch(_mock_updrade, return_value=True)
+    @mock.patch.object(app_settings, "BATCH_LAUNCH_CHUNK_SIZE", 1)
+    def test_batch_upgrade_resume(self, *args):
+        with mock.patch(self._mock_connect, return_value=True):
+            env = self._create_upgrade_env(device_firmware=False)
+            self._create_device_firmware(
+                device=env["d1"],
+                image=env["image1a"],
+                upgrade=False,
+                device_connection=False,
+            )
+            batch = BatchUpgradeOperation.objects.create(build=env["build2"])
+
+            with self.subTest("Launch interrupted"):
+                with self._patch_interrupted_launch():
+                    batch_upgrade_operation.delay(batch.pk, True)
+                batch.refresh_from_db()
+                self.assertTrue(batch.firmwareless)
+                self.assertFalse(batch.is_launched)
+                self.assertEqual(batch.launch_phase, "launching")
+                self.assertEqual(batch.batchupgradetarget_set.count(), 2)
+                self.assertEqual(
+                    batch.launch_cursor, UpgradeOperation.objects.get().device_id
+                )
+
+            with self.subTest("Resumed launch reaches remaining devices"):
+                batch.resume()
+                batch.refresh_from_db()
+                self.assertTrue(batch.is_launched)
+                self.assertEqual(UpgradeOperation.objects.count(), 2)
+                self.assertEqual(
+                    set(batch.upgradeoperation_set.values_list("device", flat=True)),
+                    {env["d1"].pk, env["d2"].pk},
+                )
+                self.assertEqual(batch.status, "success")
+
+            with self.subTest("Launched batch cannot be resumed"):
+                with self.assertRaises(ValueError):
+                    batch.resume()
+                # duplicate deliveries of the task are no-op
+                batch_upgrade_operation.delay(batch.pk, True)
+                self.assertEqual(UpgradeOperation.objects.count(), 2)
+
+    @mock.patch.object(app_settings, "BATCH_LAUNCH_CHUNK_SIZE", 1)
+    @mock.patch("openwisp_firmware_upgrader.base.models.upgrade_firmware.delay")
+    def test_batch_upgrade_resume_from_checkpoint(self, *args):
+        env = self._create_upgrade_env()
+        batch = BatchUpgradeOperation.objects.create(build=env["build2"])
+        with self._patch_interrupted_launch():
+            batch_upgrade_operation.delay(batch.pk, False)
+        batch.refresh_from_db()
+        first_operation = UpgradeOperation.objects.get()
+        self.assertEqual(batch.launch_phase, "launching")
+        self.assertEqual(batch.launch_cursor, first_operation.device_id)
+        # the device which has been already reached is still pending,
+        # the checkpoint prevents creating a duplicate upgrade operation
+        batch_upgrade_operation.delay(batch.pk, False)
+        batch.refresh_from_db()
+        self.assertTrue(batch.is_launched)
+        self.assertEqual(UpgradeOperation.objects.count(), 2)
+        self.assertEqual(
+            set(batch.upgradeoperation_set.values_list("device", flat=True)),
+            {env["d1"].pk, env["d2"].pk},
+        )
+
+    @mock.patch(_mock_updrade, return_value=True)
+    def test_batch_upgrade_target_snapshot(self, *args):
+        with mock.patch(self._mock_connect, return_value=True):
+            env = self._create_upgrade_env(device_firmware=False)
+            self._create_device_firmware(
+                device=env["d1"],
+                image=env["image1a"],
+                upgrade=False,
+                device_connection=False,
+            )
+            with mock.patch(
+                "openwisp_firmware_upgrader.base.models.batch_upgrade_operation.delay"
+            ) as delay:
+                batch = env["build2"].batch_upgrade(firmwareless=True)
+            delay.assert_called_once_with(batch.pk, True)
+            self.assertEqual(batch.launch_phase, "launching")
+            self.assertEqual(
+                set(batch.batchupgradetarget_set.values_list("device", "image")),
+                {
+                    (env["d1"].pk, env["image2a"].pk),
+                    (env["d2"].pk, env["image2b"].pk),
+                },
+            )
+
+            with self.subTest("Changes to the fleet do not alter the targets"):
+                device = self._create_firmwareless_device(
+                    organization=env["d1"].organization
+                )
+                device.model = env["image2a"].boards[0]
+                device.save()
+                env["d2"].deactivate()
+                batch_upgrade_operation.delay(batch.pk)
+                batch = BatchUpgradeOperation.objects.get(pk=batch.pk)
+                self.assertTrue(batch.is_launched)
+                self.assertEqual(
+                    list(batch.upgradeoperation_set.values_list("device", flat=True)),
+                    [env["d1"].pk],
+                )
+                # deactivated devices are removed from the targets
+                self.assertEqual(batch.batchupgradetarget_set.count(), 1)
+                self.assertEqual(batch.total_targets, 1)
+                self.assertEqual(batch.total_operations, 1)
+                self.assertEqual(batch.status, "success")
+
+            with self.subTest("No targets"):
+                with self.assertRaises(ValidationError):
+                    env["build2"].batch_upgrade(firmwareless=False)
+                self.assertEqual(BatchUpgradeOperation.objects.count(), 1)
+
     @mock.patch.object(upgrade_firmware, "max_retries", 0)
     def test_batch_upgrade_failure(self):
         env = self._create_upgrade_env()
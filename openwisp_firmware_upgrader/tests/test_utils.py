@@ -1,9 +1,28 @@
-from unittest.mock import patch
+import json
+from decimal import Decimal
+from unittest.mock import Mock, patch
+from uuid import uuid4
 
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
 from django.test import TestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 
 from .. import settings as app_settings
-from ..utils import get_upgrader_class_from_device_connection
+from .. import utils
+from ..utils import (
+    RELEASE_LOCK_SCRIPT,
+    acquire_lock,
+    compress_log,
+    decompress_log,
+    dumps_json,
+    dumps_msgpack,
+    get_upgrader_class_from_device_connection,
+    loads_msgpack,
+    release_lock,
+)
 from .base import TestUpgraderMixin
 
 
@@ -31,3 +50,90 @@ class TestUtils(TestUpgraderMixin, TestCase):
                 upgrader_class = get_upgrader_class_from_device_connection(device_conn)
                 self.assertEqual(upgrader_class, None)
                 mocked_logger.assert_called()
+
+    def test_release_lock(self):
+        key = "firmware_upgrader.test_lock"
+        owner = uuid4()
+        self.addCleanup(cache.delete, key)
+
+        with self.subTest("Lock held by another owner is not released"):
+            acquire_lock(key, owner)
+            release_lock(key, uuid4())
+            self.assertEqual(cache.get(key), str(owner))
+
+        with self.subTest("Lock released by its owner"):
+            release_lock(key, owner)
+            self.assertIsNone(cache.get(key))
+
+        with self.subTest("Redis compares and deletes atomically"):
+            client = Mock()
+            client.encode.return_value = b"encoded"
+            redis_cache = Mock(client=client)
+            redis_cache.make_key.return_value = ":1:lock"
+            with patch.object(utils, "cache", redis_cache):
+                release_lock(key, owner)
+            client.encode.assert_called_once_with(str(owner))
+            client.get_client.return_value.eval.assert_called_once_with(
+                RELEASE_LOCK_SCRIPT, 1, ":1:lock", b"encoded"
+            )
+            redis_cache.get.assert_not_called()
+            redis_cache.delete.assert_not_called()
+
+    def test_compress_log(self):
+        log = "Writing from <stdin> to /dev/mtdblock3 ...\n" * 200
+
+        with self.subTest("zlib"):
+            compressed = compress_log(log)
+            self.assertTrue(compressed.startswith(b"\x00Z"))
+            self.assertLess(len(compressed), len(log) / 10)
+            self.assertEqual(decompress_log(compressed), log)
+            self.assertEqual(decompress_log(memoryview(compressed)), log)
+
+        with self.subTest("Short logs are not compressed"):
+            self.assertEqual(compress_log("ok"), b"ok")
+            self.assertEqual(decompress_log(b"ok"), "ok")
+
+        with self.subTest("Compression disabled"):
+            with patch.object(app_settings, "LOG_COMPRESSION", None):
+                self.assertEqual(compress_log(log), log.encode())
+            # logs compressed previously can still be read
+            self.assertEqual(decompress_log(compressed), log)
+
+        with self.subTest("zstd without the zstandard package"):
+            with patch.object(app_settings, "LOG_COMPRESSION", "zstd"), patch.object(
+                utils, "zstandard", None
+            ):
+                with self.assertRaises(ImproperlyConfigured):
+                    compress_log(log)
+
+    def test_dumps_json(self):
+        content = {
+            "id": uuid4(),
+            "modified": timezone.now(),
+            "progress": Decimal("50.5"),
+            "status": _("in progress"),
+            "operations": [{"id": uuid4(), "progress": 10}],
+        }
+        expected = json.dumps(content, cls=DjangoJSONEncoder)
+
+        with self.subTest("json"):
+            self.assertEqual(json.loads(dumps_json(content)), json.loads(expected))
+
+        with self.subTest("orjson produces the same output"):
+            with patch.object(app_settings, "JSON_BACKEND", "orjson"):
+                self.assertEqual(json.loads(dumps_json(content)), json.loads(expected))
+
+        with self.subTest("orjson without the orjson package"):
+            with patch.object(app_settings, "JSON_BACKEND", "orjson"), patch.object(
+                utils, "orjson", None
+            ):
+                with self.assertRaises(ImproperlyConfigured):
+                    dumps_json(content)
+
+        with self.subTest("msgpack"):
+            self.assertEqual(
+                loads_msgpack(dumps_msgpack(content)), json.loads(expected)
+            )
+            with patch.object(utils, "msgpack", None):
+                with self.assertRaises(ImproperlyConfigured):
+                    dumps_msgpack(content)
@@ -1,4 +1,5 @@
 import asyncio
+import json
 from unittest.mock import AsyncMock, MagicMock, patch
 from uuid import uuid4
 
@@ -8,14 +9,23 @@ from channels.layers import get_channel_layer
 from channels.testing import WebsocketCommunicator
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
 from django.test import TransactionTestCase, override_settings
 from django.utils import timezone
 from swapper import load_model
 
+from .. import settings as app_settings
+from ..signals import upgrade_events_relayed
 from ..websockets import (
+    BackgroundPublisher,
     BatchUpgradeProgressConsumer,
     BatchUpgradeProgressPublisher,
     DeviceUpgradeProgressConsumer,
+    MultiplexedUpgradeProgressConsumer,
+    OrganizationDashboardPublisher,
+    UpgradeEventRelay,
     UpgradeProgressConsumer,
     UpgradeProgressPublisher,
 )
@@ -24,7 +34,9 @@ from .base import TestUpgraderMixin
 User = get_user_model()
 UpgradeOperation = load_model("firmware_upgrader", "UpgradeOperation")
 BatchUpgradeOperation = load_model("firmware_upgrader", "BatchUpgradeOperation")
+UpgradeEvent = load_model("firmware_upgrader", "UpgradeEvent")
 Device = load_model("config", "Device")
+OrganizationUser = load_model("openwisp_users", "OrganizationUser")
 
 
 @pytest.mark.asyncio
@@ -210,6 +222,191 @@ class TestFirmwareUpgradeSockets(TestUpgraderMixin, TransactionTestCase):
             self.assertEqual(response["progress"], 50)
         await communicator.disconnect()
 
+    @patch.object(app_settings, "SNAPSHOT_CHUNK_SIZE", 2)
+    async def test_batch_upgrade_progress_consumer_current_state(self):
+        env = await sync_to_async(self._create_upgrade_env)()
+        batch = await sync_to_async(BatchUpgradeOperation.objects.create)(
+            build=env["build2"], status="in-progress"
+        )
+        operations = []
+        for device, image, status in (
+            ("d1", "image2a", "success"),
+            ("d2", "image2b", "in-progress"),
+        ):
+            operations.append(
+                await sync_to_async(UpgradeOperation.objects.create)(
+                    device=env[device], image=env[image], batch=batch, status=status
+                )
+            )
+        batch_events = UpgradeEvent.objects.filter(batch_id=batch.pk)
+        sequence = await sync_to_async(
+            batch_events.values_list("id", flat=True).latest
+        )("id")
+        batch_id = str(batch.pk)
+        communicator = await self._get_batch_upgrade_progress_communicator(batch_id)
+
+        with self.subTest("Snapshot is sent in chunks"):
+            await communicator.send_json_to(
+                {"type": "request_current_state", "batch_id": batch_id}
+            )
+            first = await communicator.receive_json_from()
+            self.assertEqual(first["type"], "batch_state")
+            self.assertEqual(first["chunk"], 0)
+            self.assertFalse(first["last"])
+            self.assertEqual(
+                first["batch_status"],
+                {"status": "in-progress", "completed": 1, "total": 2},
+            )
+            self.assertEqual(
+                first["operations"]["id"], [str(op.pk) for op in operations]
+            )
+            self.assertEqual(
+                first["operations"]["device_name"],
+                [env["d1"].name, env["d2"].name],
+            )
+            self.assertEqual(
+                first["operations"]["image_name"],
+                [str(env["image2a"]), str(env["image2b"])],
+            )
+            self.assertEqual(
+                [first["statuses"][code] for code in first["operations"]["status"]],
+                [op.status for op in operations],
+            )
+            self.assertEqual(
+                first["operations"]["modified"],
+                [op.modified.isoformat() for op in operations],
+            )
+            self.assertEqual(first["operations"]["seq"], [sequence, sequence])
+            self.assertEqual(first["seq"], sequence)
+            self.assertIsNone(first["since"])
+            second = await communicator.receive_json_from()
+            self.assertEqual(second["chunk"], 1)
+            self.assertTrue(second["last"])
+            self.assertNotIn("batch_status", second)
+            self.assertEqual(second["operations"]["id"], [])
+            self.assertEqual(second["seq"], first["seq"])
+
+        running = next(op for op in operations if op.status == "in-progress")
+
+        with self.subTest("Only changes since the sequence number are sent"):
+            running.status = "failed"
+            await sync_to_async(running.save)()
+            # discard the real-time updates caused by the change
+            while not await communicator.receive_nothing(timeout=0.1):
+                await communicator.receive_json_from()
+            await communicator.send_json_to(
+                {
+                    "type": "request_current_state",
+                    "batch_id": batch_id,
+                    "since": first["seq"],
+                }
+            )
+            response = await communicator.receive_json_from()
+            self.assertTrue(response["last"])
+            self.assertEqual(response["since"], first["seq"])
+            self.assertGreater(response["seq"], first["seq"])
+            self.assertEqual(response["operations"]["id"], [str(running.pk)])
+            self.assertEqual(
+                response["statuses"][response["operations"]["status"][0]], "failed"
+            )
+
+        with self.subTest("Snapshot is sent if the events have been purged"):
+            await sync_to_async(batch_events.filter(pk__lte=sequence).delete)()
+            await communicator.send_json_to(
+                {
+                    "type": "request_current_state",
+                    "batch_id": batch_id,
+                    "since": first["seq"],
+                }
+            )
+            first = await communicator.receive_json_from()
+            self.assertIsNone(first["since"])
+            self.assertEqual(
+                first["operations"]["id"], [str(op.pk) for op in operations]
+            )
+            await communicator.receive_json_from()
+        await communicator.disconnect()
+
+    @patch.object(BatchUpgradeProgressConsumer, "summary_interval", 0.1)
+    async def test_batch_upgrade_progress_consumer_subscription(self):
+        build = await sync_to_async(self._get_build)()
+        batch = await sync_to_async(BatchUpgradeOperation.objects.create)(build=build)
+        batch_id = str(batch.pk)
+        communicator = await self._get_batch_upgrade_progress_communicator(batch_id)
+        channel_layer = get_channel_layer()
+        group_name = f"batch_upgrade_{batch_id}"
+
+        async def send_progress(operation_id, status, progress, seq):
+            await channel_layer.group_send(
+                group_name,
+                {
+                    "type": "batch_upgrade_progress",
+                    "data": {
+                        "type": "operation_progress",
+                        "operation_id": operation_id,
+                        "status": status,
+                        "progress": progress,
+                        "seq": seq,
+                        "device_id": f"device-{operation_id}",
+                        "device_name": f"name-{operation_id}",
+                        "image_name": "image",
+                    },
+                },
+            )
+
+        await communicator.send_json_to(
+            {"type": "subscribe_operations", "operation_ids": ["op1"]}
+        )
+        # waits for the subscription to be processed
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+
+        with self.subTest("Subscribed operations are sent in detail"):
+            await send_progress("op1", "in-progress", 30, 1)
+            response = await communicator.receive_json_from()
+            self.assertEqual(response["type"], "operation_progress")
+            self.assertEqual(response["operation_id"], "op1")
+
+        with self.subTest("Other operations are collected in summaries"):
+            await send_progress("op2", "in-progress", 10, 2)
+            await send_progress("op3", "in-progress", 10, 3)
+            await send_progress("op2", "failed", 100, 4)
+            await channel_layer.group_send(
+                group_name,
+                {
+                    "type": "batch_upgrade_progress",
+                    "data": {
+                        "type": "batch_status",
+                        "status": "in-progress",
+                        "completed": 1,
+                        "total": 3,
+                    },
+                },
+            )
+            response = await communicator.receive_json_from()
+            self.assertEqual(response["type"], "batch_status")
+            response = await communicator.receive_json_from()
+            self.assertEqual(response["type"], "operations_summary")
+            self.assertEqual(response["seq"], 4)
+            operations = response["operations"]
+            self.assertEqual(operations["id"], ["op2", "op3"])
+            self.assertEqual(
+                [response["statuses"][code] for code in operations["status"]],
+                ["failed", "in-progress"],
+            )
+            self.assertEqual(operations["progress"], [100, 10])
+            self.assertEqual(operations["device_name"], ["name-op2", "name-op3"])
+
+        with self.subTest("Null subscribes to all the operations"):
+            await communicator.send_json_to(
+                {"type": "subscribe_operations", "operation_ids": None}
+            )
+            self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+            await send_progress("op2", "success", 100, 5)
+            response = await communicator.receive_json_from()
+            self.assertEqual(response["type"], "operation_progress")
+            self.assertEqual(response["operation_id"], "op2")
+        await communicator.disconnect()
+
     @patch(_mock_upgrade, return_value=True)
     @patch(_mock_connect, return_value=True)
     async def test_device_upgrade_progress_consumer_connection_authenticated(
@@ -396,6 +593,8 @@ class TestFirmwareUpgradeSockets(TestUpgraderMixin, TransactionTestCase):
             self.assertEqual(call_args[1]["data"]["operation_id"], "op1")
             self.assertEqual(call_args[1]["data"]["status"], "in-progress")
             self.assertEqual(call_args[1]["data"]["progress"], 75)
+            # the identifier of the event is the sequence number
+            self.assertEqual(call_args[1]["data"]["seq"], int(call_args[1]["event_id"]))
         # Test publishing batch status
         with patch.object(
             publisher.channel_layer, "group_send", new_callable=AsyncMock
@@ -407,6 +606,285 @@ class TestFirmwareUpgradeSockets(TestUpgraderMixin, TransactionTestCase):
             self.assertEqual(call_args[1]["data"]["completed"], 5)
             self.assertEqual(call_args[1]["data"]["total"], 10)
 
+    def test_organization_dashboard_publisher(self):
+        env = self._create_upgrade_env()
+        org_id = str(env["d1"].organization_id)
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], status="in-progress"
+        )
+        batch.create_targets(
+            [
+                (env["d1"].pk, env["image2a"].pk),
+                (env["d2"].pk, env["image2b"].pk),
+            ]
+        )
+        operation = UpgradeOperation.objects.create(
+            device=env["d1"],
+            image=env["image2a"],
+            batch=batch,
+            log="Connecting to device\nConnection refused",
+        )
+        publisher = OrganizationDashboardPublisher()
+        cache.delete(publisher.cache_key)
+
+        with self.subTest("State of the running mass upgrades"):
+            dashboards = publisher.aggregate()
+            self.assertEqual(list(dashboards), [org_id])
+            self.assertEqual(
+                dashboards[org_id]["batches"][0],
+                {
+                    "id": str(batch.pk),
+                    "build": f"{env['build2'].category.name} v{env['build2'].version}",
+                    "running": 1,
+                    "completed": 0,
+                    "failed": 0,
+                    "queued": 1,
+                    "total": 2,
+                },
+            )
+            self.assertEqual(dashboards[org_id]["throughput"], 0)
+            self.assertEqual(dashboards[org_id]["failure_reasons"], [])
+
+        with self.subTest("Throughput and failure reasons"):
+            operation.status = "failed"
+            operation.save()
+            self.assertEqual(operation.failure_reason, "Connection refused")
+            # the batch is kept running by the target device not reached yet
+            BatchUpgradeOperation.objects.filter(pk=batch.pk).update(
+                status="in-progress"
+            )
+            dashboards = publisher.aggregate()
+            self.assertEqual(dashboards[org_id]["batches"][0]["running"], 0)
+            self.assertEqual(dashboards[org_id]["batches"][0]["completed"], 1)
+            self.assertEqual(dashboards[org_id]["batches"][0]["failed"], 1)
+            self.assertGreater(dashboards[org_id]["throughput"], 0)
+            self.assertEqual(
+                dashboards[org_id]["failure_reasons"],
+                [{"reason": "Connection refused", "count": 1}],
+            )
+
+        with self.subTest("Counters which disagree are logged"):
+            BatchUpgradeOperation.objects.filter(pk=batch.pk).update(
+                completed_operations=2
+            )
+            with self.assertLogs(
+                "openwisp_firmware_upgrader.websockets", level="WARNING"
+            ) as logs:
+                dashboards = publisher.aggregate()
+            self.assertIn("disagree", logs.output[0])
+            self.assertEqual(dashboards[org_id]["batches"][0]["running"], -1)
+            self.assertEqual(dashboards[org_id]["batches"][0]["completed"], 2)
+            BatchUpgradeOperation.objects.filter(pk=batch.pk).update(
+                completed_operations=1
+            )
+
+        with self.subTest("Completed mass upgrades clear the dashboard"):
+            BatchUpgradeOperation.objects.filter(pk=batch.pk).update(status="failed")
+            dashboards = publisher.aggregate()
+            self.assertEqual(
+                dashboards,
+                {org_id: {"batches": [], "throughput": 0, "failure_reasons": []}},
+            )
+            self.assertEqual(publisher.aggregate(), {})
+
+        with self.subTest("Dashboards are published to the dashboard topic"):
+            with patch.object(
+                publisher.channel_layer, "group_send", new_callable=AsyncMock
+            ) as mock_group_send:
+                BatchUpgradeOperation.objects.filter(pk=batch.pk).update(
+                    status="in-progress"
+                )
+                self.assertEqual(publisher.publish(), 1)
+                call_args = mock_group_send.call_args[0]
+                self.assertEqual(call_args[0], f"firmware_upgrader.dashboard-{org_id}")
+                self.assertEqual(call_args[1]["type"], "upgrade_dashboard")
+                self.assertEqual(call_args[1]["topic"], f"dashboard:{org_id}")
+                self.assertEqual(call_args[1]["data"]["type"], "dashboard")
+
+    def test_background_publisher(self):
+        channel_layer = MagicMock(group_send=AsyncMock())
+
+        def progress(percentage, operation_id="op1"):
+            return (
+                "batch_upgrade_group",
+                {
+                    "type": "batch_upgrade_progress",
+                    "data": {
+                        "type": "operation_progress",
+                        "operation_id": operation_id,
+                        "progress": percentage,
+                    },
+                },
+            )
+
+        with self.subTest("Messages are dropped when the queue is full"):
+            publisher = BackgroundPublisher(maxsize=2)
+            self.assertTrue(publisher.put(channel_layer, [progress(10)]))
+            with patch("openwisp_firmware_upgrader.websockets.logger") as logger:
+                self.assertFalse(
+                    publisher.put(channel_layer, [progress(20), progress(30)])
+                )
+            logger.warning.assert_called_once()
+            self.assertEqual(publisher.dropped, 1)
+
+        with self.subTest("Superseded state updates are coalesced"):
+            log = ("device_group", {"type": "send_update", "data": {"type": "log"}})
+            publisher = BackgroundPublisher()
+            publisher.put(
+                channel_layer,
+                [progress(10), log, progress(50, "op2"), progress(20), log],
+            )
+            publisher.start()
+            publisher.queue.join()
+            self.assertEqual(
+                [call.args for call in channel_layer.group_send.await_args_list],
+                [progress(20), log, progress(50, "op2"), log],
+            )
+
+        with self.subTest("Publishers use the background publisher if enabled"):
+            publisher = BatchUpgradeProgressPublisher(uuid4())
+            with patch(
+                "openwisp_firmware_upgrader.websockets._background_publisher_enabled",
+                True,
+            ), patch.object(BackgroundPublisher, "get_instance") as get_instance:
+                publisher.publish_batch_status("in-progress", 1, 2)
+            get_instance.return_value.put.assert_called_once()
+            group, message = get_instance.return_value.put.call_args[0][1][0]
+            self.assertEqual(group, publisher.group_name)
+            self.assertEqual(message["data"]["type"], "batch_status")
+
+    def test_upgrade_event_relay(self):
+        env = self._create_upgrade_env()
+        batch = BatchUpgradeOperation.objects.create(
+            build=env["build2"], status="in-progress"
+        )
+        batch.create_targets(
+            [
+                (env["d1"].pk, env["image2a"].pk),
+                (env["d2"].pk, env["image2b"].pk),
+            ]
+        )
+        schedule = "openwisp_firmware_upgrader.websockets.UpgradeEventRelay.schedule"
+
+        with self.subTest("Changes are added to the outbox"):
+            with patch(schedule) as mocked_schedule:
+                operation = UpgradeOperation.objects.create(
+                    device=env["d1"], image=env["image2a"], batch=batch
+                )
+            mocked_schedule.assert_called()
+            outbox = UpgradeEvent.objects.filter(published=False)
+            self.assertEqual(
+                list(outbox.values_list("operation_id", "batch_id")),
+                [(operation.pk, None), (None, batch.pk)],
+            )
+
+        with self.subTest("Rolled back changes are not added to the outbox"):
+            with patch(schedule) as mocked_schedule:
+                with self.assertRaises(ValueError):
+                    with transaction.atomic():
+                        operation.log_line("Rolled back")
+                        raise ValueError()
+            mocked_schedule.assert_not_called()
+            self.assertEqual(outbox.count(), 2)
+
+        with self.subTest("Events are published in order"):
+            UpgradeOperation.objects.filter(pk=operation.pk).update(status="success")
+            operation.refresh_from_db()
+            with patch(schedule):
+                operation.log_line("Upgrade completed")
+            handler = MagicMock()
+            upgrade_events_relayed.connect(handler, dispatch_uid="test_relay")
+            relay = UpgradeEventRelay()
+            relay.channel_layer = MagicMock(group_send=AsyncMock())
+            self.assertEqual(relay.relay(), 5)
+            upgrade_events_relayed.disconnect(dispatch_uid="test_relay")
+            self.assertFalse(outbox.exists())
+            self.assertEqual(handler.call_count, 2)
+            calls = [
+                (group, message["data"]["type"], message["event_id"])
+                for group, message in [
+                    call.args for call in relay.channel_layer.group_send.await_args_list
+                ]
+            ]
+            events = list(
+                UpgradeEvent.objects.filter(
+                    Q(operation_id=operation.pk) | Q(batch_id=batch.pk)
+                ).order_by("id")
+            )
+            device_group = f"firmware_upgrader.device-{env['d1'].pk}"
+            batch_group = f"batch_upgrade_{batch.pk}"
+            self.assertEqual(
+                [call for call in calls if call[0] == device_group],
+                [
+                    (device_group, "operation_update", str(events[0].pk)),
+                    (device_group, "operation_update", str(events[2].pk)),
+                ],
+            )
+            self.assertEqual(
+                [call for call in calls if call[0] == batch_group],
+                [
+                    (batch_group, "operation_progress", str(events[1].pk)),
+                    (batch_group, "operation_progress", str(events[3].pk)),
+                    # the status is published once for the completed operations
+                    (batch_group, "batch_status", str(events[4].pk)),
+                ],
+            )
+
+        with self.subTest("Logs are not included in the events"):
+            payload = json.loads(
+                UpgradeEvent.objects.filter(operation_id=operation.pk)
+                .latest("id")
+                .payload
+            )
+            self.assertNotIn("log", payload["operation"])
+            self.assertEqual(payload["operation"]["log_length"], len(operation.log))
+            self.assertEqual(payload["operation"]["status"], "success")
+
+        with self.subTest("Events are not marked as published on failures"):
+            with patch(schedule):
+                operation.log_line("Retried")
+            relay.channel_layer.group_send.side_effect = ConnectionError()
+            with self.assertRaises(ConnectionError):
+                relay.relay()
+            self.assertEqual(outbox.count(), 2)
+
+        with self.subTest("Events are sent through the background publisher"):
+            background_publisher = BackgroundPublisher()
+            background_publisher.start()
+            relay.channel_layer.group_send.reset_mock(side_effect=True)
+            with patch(
+                "openwisp_firmware_upgrader.websockets._background_publisher_enabled",
+                True,
+            ), patch.object(
+                BackgroundPublisher, "get_instance", return_value=background_publisher
+            ):
+                relay.channel_layer.group_send.side_effect = ConnectionError()
+                with self.assertRaises(ConnectionError):
+                    relay.relay()
+                self.assertEqual(outbox.count(), 2)
+                relay.channel_layer.group_send.side_effect = None
+                self.assertEqual(relay.relay(), 2)
+            self.assertFalse(outbox.exists())
+            relay.channel_layer.group_send.assert_awaited()
+
+        with self.subTest("Numbers of the batch status are added by the relay"):
+            with patch(schedule):
+                batch.save()
+            event = outbox.get()
+            payload = json.loads(event.payload)
+            self.assertEqual(payload["type"], "batch_status")
+            self.assertNotIn("total", payload)
+            self.assertEqual(relay.relay(), 1)
+            event.refresh_from_db()
+            payload = json.loads(event.payload)
+            batch.refresh_from_db()
+            self.assertEqual(
+                (payload["status"], payload["completed"], payload["total"]),
+                (batch.status, batch.completed_operations, batch.total_targets),
+            )
+            message = relay.channel_layer.group_send.await_args.args[1]
+            self.assertEqual(message["data"], dict(payload, seq=event.pk))
+
     async def test_websocket_connection_errors(self):
         """Test WebSocket connection error handling."""
         operation_id = str(uuid4())
@@ -615,6 +1093,151 @@ class TestFirmwareUpgradeSockets(TestUpgraderMixin, TransactionTestCase):
         )
         await communicator.disconnect()
 
+    @patch(_mock_upgrade, return_value=True)
+    @patch(_mock_connect, return_value=True)
+    async def test_consumer_lookups_restricted_to_organization(self, *args):
+        operation_id, _ = await self._create_test_device_with_upgrade()
+        operation = await sync_to_async(
+            UpgradeOperation.objects.select_related("device").get
+        )(pk=operation_id)
+        batch = await sync_to_async(BatchUpgradeOperation.objects.create)(
+            build=await sync_to_async(lambda: operation.image.build)()
+        )
+        other_org = await sync_to_async(self._create_org)(name="other", slug="other")
+        operation_consumer = UpgradeProgressConsumer()
+        operation_consumer.operation_id = operation_id
+        batch_consumer = BatchUpgradeProgressConsumer()
+        batch_consumer.batch_id = str(batch.pk)
+
+        with self.subTest("Superusers are not restricted"):
+            operation_consumer.organization_id = None
+            batch_consumer.organization_id = None
+            self.assertIsNotNone(await operation_consumer._get_upgrade_operation())
+            self.assertIsNotNone(await batch_consumer._get_batch_upgrade_operation())
+
+        with self.subTest("Same organization"):
+            operation_consumer.organization_id = str(operation.device.organization_id)
+            batch_consumer.organization_id = str(operation.device.organization_id)
+            self.assertIsNotNone(await operation_consumer._get_upgrade_operation())
+            self.assertIsNotNone(await batch_consumer._get_batch_upgrade_operation())
+
+        with self.subTest("Other organization"):
+            operation_consumer.organization_id = str(other_org.pk)
+            batch_consumer.organization_id = str(other_org.pk)
+            self.assertIsNone(await operation_consumer._get_upgrade_operation())
+            self.assertIsNone(await batch_consumer._get_batch_upgrade_operation())
+            self.assertEqual(await batch_consumer._get_image_names(), {})
+
+    @override_settings(
+        CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    )
+    @patch(_mock_upgrade, return_value=True)
+    @patch(_mock_connect, return_value=True)
+    async def test_multiplexed_consumer(self, *args):
+        operation_id, device_id = await self._create_test_device_with_upgrade()
+        org = await sync_to_async(self._get_org)()
+        other_org = await sync_to_async(self._create_org)(name="other", slug="other")
+        org_manager = await self._create_administrator(organizations=[org])
+        communicator = WebsocketCommunicator(
+            MultiplexedUpgradeProgressConsumer.as_asgi(), "/ws/firmware-upgrader/"
+        )
+        communicator.scope["user"] = org_manager
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        topics = [
+            f"device:{device_id}",
+            f"operation:{operation_id}",
+            f"organization:{org.pk}",
+        ]
+
+        with self.subTest("Subscribe to topics"):
+            await communicator.send_json_to(
+                {
+                    "type": "subscribe",
+                    "topics": topics + [f"organization:{other_org.pk}", "invalid"],
+                }
+            )
+            response = await communicator.receive_json_from()
+            self.assertEqual(response["type"], "subscribed")
+            self.assertEqual(response["topics"], topics)
+            self.assertEqual(
+                response["denied"], [f"organization:{other_org.pk}", "invalid"]
+            )
+
+        with self.subTest("Events are received once"):
+            publisher = UpgradeProgressPublisher(device_id, operation_id, org.pk)
+            await sync_to_async(publisher.publish_progress)(
+                {"type": "log", "content": "Test log message"}
+            )
+            response = await communicator.receive_json_from()
+            self.assertEqual(response["type"], "event")
+            self.assertEqual(response["topic"], f"device:{device_id}")
+            self.assertEqual(response["data"]["content"], "Test log message")
+            self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+
+        with self.subTest("Unsubscribe from topics"):
+            await communicator.send_json_to(
+                {"type": "unsubscribe", "topics": topics[:2]}
+            )
+            response = await communicator.receive_json_from()
+            self.assertEqual(response, {"type": "unsubscribed", "topics": topics[:2]})
+            await sync_to_async(publisher.publish_progress)(
+                {"type": "log", "content": "Another log message"}
+            )
+            response = await communicator.receive_json_from()
+            self.assertEqual(response["topic"], f"organization:{org.pk}")
+            self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+        await communicator.disconnect()
+
+    @patch(_mock_upgrade, return_value=True)
+    @patch(_mock_connect, return_value=True)
+    async def test_websocket_authorization_cache(self, *args):
+        org_manager = await self._create_administrator()
+        _, device_id = await self._create_test_device_with_upgrade()
+
+        async def connect(user):
+            communicator = WebsocketCommunicator(
+                DeviceUpgradeProgressConsumer.as_asgi(),
+                f"/ws/firmware-upgrader/device/{device_id}/",
+            )
+            communicator.scope["url_route"] = {"kwargs": {"device_id": device_id}}
+            # a fresh instance is used to avoid the permission
+            # cache which django stores in the user instance
+            communicator.scope["user"] = await User.objects.aget(pk=user.pk)
+            connected, _ = await communicator.connect()
+            await communicator.disconnect()
+            return connected
+
+        with patch.object(
+            DeviceUpgradeProgressConsumer,
+            "_get_authorization",
+            wraps=DeviceUpgradeProgressConsumer._get_authorization,
+        ) as get_authorization:
+            with self.subTest("Authorization decision is cached"):
+                self.assertTrue(await connect(org_manager))
+                self.assertTrue(await connect(org_manager))
+                get_authorization.assert_called_once()
+
+            with self.subTest("Permission changes invalidate the cache"):
+                await sync_to_async(org_manager.user_permissions.clear)()
+                self.assertFalse(await connect(org_manager))
+                self.assertEqual(get_authorization.call_count, 2)
+
+            with self.subTest("Organization changes invalidate the cache"):
+                await sync_to_async(org_manager.user_permissions.add)(
+                    *await sync_to_async(list)(
+                        Permission.objects.filter(
+                            codename=f"change_{Device._meta.model_name}"
+                        )
+                    )
+                )
+                self.assertTrue(await connect(org_manager))
+                await sync_to_async(
+                    OrganizationUser.objects.filter(user=org_manager).delete
+                )()
+                self.assertFalse(await connect(org_manager))
+                self.assertEqual(get_authorization.call_count, 4)
+
     @override_settings(
         CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
     )
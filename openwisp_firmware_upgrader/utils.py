@@ -1,11 +1,35 @@
+import json
 import logging
+import zlib
 
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.module_loading import import_string
 
 from . import settings as app_settings
 
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
 logger = logging.getLogger(__name__)
 
+# compressed logs are prefixed with a NUL byte, which never
+# appears in text, followed by the identifier of the algorithm
+LOG_COMPRESSION_HEADERS = {"zlib": b"\x00Z", "zstd": b"\x00S"}
+
 
 def get_upgrader_schema_for_device(device):
     upgrader_class = get_upgrader_class_for_device(device)
@@ -43,6 +67,118 @@ def get_upgrader_class_from_device_connection(device_conn):
     return upgrader_class
 
 
+# deletes the lock only if it is still held by the owner,
+# executed atomically by Redis
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def acquire_lock(key, owner, timeout=None):
+    """
+    Atomically acquires a lock stored in the Django cache.
+
+    Returns a ``(acquired, holder)`` tuple, where ``holder``
+    is the owner of the lock.
+
+    The lock is shared across processes only if the cache backend
+    is shared too (e.g.: Redis): with a local memory cache each
+    worker process holds its own locks.
+    """
+    value = str(owner)
+    timeout = timeout or app_settings.UPGRADE_LOCK_TIMEOUT
+    if cache.add(key, value, timeout=timeout):
+        return True, value
+    holder = cache.get(key)
+    # the lock may have expired or may have been
+    # released between the two cache operations
+    if holder is None and cache.add(key, value, timeout=timeout):
+        return True, value
+    return False, holder
+
+
+def release_lock(key, owner):
+    """
+    Releases a lock stored in the Django cache,
+    only if held by the specified owner.
+
+    With django-redis the lock is compared and deleted atomically,
+    otherwise another process could acquire the lock between the
+    two operations and have it deleted; other cache backends
+    fall back to a non atomic comparison.
+    """
+    value = str(owner)
+    client = getattr(cache, "client", None)
+    if hasattr(client, "get_client") and hasattr(client, "encode"):
+        client.get_client(write=True).eval(
+            RELEASE_LOCK_SCRIPT, 1, cache.make_key(key), client.encode(value)
+        )
+        return
+    if cache.get(key) == value:
+        cache.delete(key)
+
+
+def get_device_upgrade_lock_key(device_id):
+    return f"firmware_upgrader.upgrade_lock.device-{device_id}"
+
+
+def acquire_device_upgrade_lock(device_id, operation_id):
+    return acquire_lock(get_device_upgrade_lock_key(device_id), operation_id)
+
+
+def release_device_upgrade_lock(device_id, operation_id):
+    release_lock(get_device_upgrade_lock_key(device_id), operation_id)
+
+
+def get_batch_launch_lock_key(batch_id):
+    return f"firmware_upgrader.launch_lock.batch-{batch_id}"
+
+
+def compress_log(text):
+    """
+    Encodes ``text`` and compresses it with the algorithm set in
+    ``OPENWISP_FIRMWARE_UPGRADER_LOG_COMPRESSION``, the text is
+    stored as is when compressing it does not save space
+    """
+    data = text.encode()
+    algorithm = app_settings.LOG_COMPRESSION
+    if not algorithm:
+        return data
+    if algorithm == "zstd":
+        if zstandard is None:
+            raise ImproperlyConfigured(
+                'The "zstandard" package is required to compress logs with zstd'
+            )
+        compressed = zstandard.ZstdCompressor().compress(data)
+    else:
+        compressed = zlib.compress(data)
+    header = LOG_COMPRESSION_HEADERS[algorithm]
+    if len(header) + len(compressed) >= len(data):
+        return data
+    return header + compressed
+
+
+def decompress_log(data):
+    """
+    Returns the text stored by ``compress_log``, regardless
+    of the algorithm which was used to compress it
+    """
+    data = bytes(data)
+    header, compressed = data[:2], data[2:]
+    if header == LOG_COMPRESSION_HEADERS["zlib"]:
+        data = zlib.decompress(compressed)
+    elif header == LOG_COMPRESSION_HEADERS["zstd"]:
+        if zstandard is None:
+            raise ImproperlyConfigured(
+                'The "zstandard" package is required to read logs compressed with zstd'
+            )
+        data = zstandard.ZstdDecompressor().decompress(compressed)
+    return data.decode()
+
+
 class UpgradeProgress:
     CONNECTION_SUCCESS = 10
     DEVICE_VERIFIED = 15
@@ -52,3 +188,44 @@ class UpgradeProgress:
     COMPLETE = 100
 
     CANCELLATION_THRESHOLD = REFLASHING
+
+
+def _default_encoder(obj):
+    return DjangoJSONEncoder().default(obj)
+
+
+def dumps_json(content, default=_default_encoder):
+    """
+    Serializes ``content`` to JSON bytes with the backend set in
+    ``OPENWISP_FIRMWARE_UPGRADER_JSON_BACKEND``; the objects which
+    are not supported natively, including dates and times (so that
+    their format does not depend on the backend), are converted by
+    ``default``
+    """
+    if app_settings.JSON_BACKEND == "orjson":
+        if orjson is None:
+            raise ImproperlyConfigured(
+                'The "orjson" package is required to use the orjson JSON backend'
+            )
+        return orjson.dumps(
+            content,
+            default=default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(content, default=default).encode()
+
+
+def dumps_msgpack(content, default=_default_encoder):
+    """
+    Serializes ``content`` to MessagePack, the objects which are not
+    supported natively are converted like in ``dumps_json``
+    """
+    if msgpack is None:
+        raise ImproperlyConfigured(
+            'The "msgpack" package is required to encode messages with MessagePack'
+        )
+    return msgpack.packb(content, default=default)
+
+
+def loads_msgpack(data):
+    return msgpack.unpackb(data)
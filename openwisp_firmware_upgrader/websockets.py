@@ -1,19 +1,34 @@
 import asyncio
 import json
 import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from uuid import UUID, uuid4
 
 from asgiref.sync import async_to_sync, sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.layers import get_channel_layer
-from django.contrib.auth import get_permission_codename
-from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.auth import get_permission_codename, get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 from swapper import load_model
 
+from . import settings as app_settings
+from .signals import upgrade_events_relayed
+from .utils import dumps_json, dumps_msgpack, loads_msgpack, msgpack
+
 logger = logging.getLogger(__name__)
 
 # Module-level set to hold background task references
 _background_tasks = set()
+# enabled in celery workers, see BackgroundPublisher
+_background_publisher_enabled = False
 
 
 def _run_coroutine_safely(coro):
@@ -43,14 +58,253 @@ def _run_coroutine_safely(coro):
             async_to_sync(coro)()
 
 
+class BackgroundPublisher:
+    """
+    Sends the messages of the publishers to the channel layer from a
+    long-lived event loop running in a daemon thread, used in celery
+    workers, where no event loop is running and calling ``async_to_sync``
+    for each message would block the upgrade on a round-trip to the
+    channel layer.
+
+    Messages are put in a bounded queue without blocking and sent in
+    batches: state updates which are superseded by a more recent update
+    in the same batch are coalesced and messages which do not fit in the
+    queue are dropped.
+
+    Messages which must not be lost, like the events relayed by the
+    ``UpgradeEventRelay``, are passed to ``send``, which waits until
+    they have been sent from the same event loop.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+    # types of messages which contain the whole state of their subject,
+    # hence only the most recent one of each batch needs to be sent
+    coalesced_types = ["operation_update", "operation_progress", "batch_status"]
+
+    def __init__(self, maxsize=None, batch_size=100):
+        self.queue = queue.Queue(maxsize=maxsize or app_settings.PUBLISHER_QUEUE_SIZE)
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.pid = os.getpid()
+        self.thread = None
+
+    @classmethod
+    def get_instance(cls):
+        """
+        Returns the publisher of the current process, a new one is
+        started after forking because threads do not survive a fork
+        """
+        with cls._instance_lock:
+            instance = cls._instance
+            if not instance or instance.pid != os.getpid():
+                instance = cls._instance = cls()
+                instance.start()
+            return instance
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._run, name="firmware-upgrader-publisher", daemon=True
+        )
+        self.thread.start()
+
+    def put(self, channel_layer, messages):
+        """
+        Enqueues ``(group, message)`` tuples without blocking,
+        returns ``False`` if any of them has been dropped
+        """
+        for group, message in messages:
+            try:
+                self.queue.put_nowait((channel_layer, group, message))
+            except queue.Full:
+                self.dropped += 1
+                # avoids flooding the logs during long congestions
+                if self.dropped % 100 == 1:
+                    logger.warning(
+                        "Websocket publisher queue is full, "
+                        f"{self.dropped} messages dropped so far"
+                    )
+                return False
+        return True
+
+    def send(self, channel_layer, messages, timeout=None):
+        """
+        Sends ``(group, message)`` tuples and waits until they have been
+        sent; unlike ``put``, the messages are neither coalesced nor
+        dropped, the messages of each group are sent in order and
+        the errors of the channel layer are raised
+        """
+        future = Future()
+        self.queue.put((channel_layer, messages, future), timeout=timeout)
+        return future.result(timeout)
+
+    @staticmethod
+    async def send_in_order(channel_layer, messages):
+        """
+        Sends the messages of each group in order,
+        different groups are sent concurrently
+        """
+        groups = {}
+        for group, message in messages:
+            groups.setdefault(group, []).append(message)
+
+        async def send_group(group, group_messages):
+            for message in group_messages:
+                await channel_layer.group_send(group, message)
+
+        await asyncio.gather(
+            *[send_group(group, items) for group, items in groups.items()]
+        )
+
+    def _get_batch(self):
+        items = [self.queue.get()]
+        while len(items) < self.batch_size:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    @classmethod
+    def _coalesce(cls, items):
+        coalesced = {}
+        for index, (channel_layer, group, message) in enumerate(items):
+            data = message.get("data", {})
+            key = index
+            if data.get("type") in cls.coalesced_types:
+                operation = data.get("operation")
+                key = (
+                    group,
+                    message["type"],
+                    data["type"],
+                    data.get("operation_id")
+                    or (operation.get("id") if isinstance(operation, dict) else None),
+                )
+            # the replaced messages keep their position
+            coalesced[key] = (channel_layer, group, message)
+        return list(coalesced.values())
+
+    async def _send(self, items):
+        results = await asyncio.gather(
+            *[
+                channel_layer.group_send(group, message)
+                for channel_layer, group, message in items
+            ],
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Failed to publish websocket message: {result!r}")
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        while True:
+            items = self._get_batch()
+            messages, waiting = [], []
+            for item in items:
+                # items enqueued by ``send``
+                (waiting if isinstance(item[2], Future) else messages).append(item)
+            try:
+                loop.run_until_complete(self._send(self._coalesce(messages)))
+            except Exception:
+                logger.exception("Error in the websocket publisher loop")
+            for channel_layer, group_messages, future in waiting:
+                try:
+                    loop.run_until_complete(
+                        self.send_in_order(channel_layer, group_messages)
+                    )
+                except Exception as error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(None)
+            for _ in items:
+                self.queue.task_done()
+
+
+def enable_background_publisher(**kwargs):
+    """
+    Makes the publishers of this process (and of its forks)
+    send their messages through the ``BackgroundPublisher``
+    """
+    global _background_publisher_enabled
+    _background_publisher_enabled = True
+
+
+def _create_event(data, published=True, schedule=True, **identifiers):
+    """
+    Appends the message to the event log, from which it's read by the
+    server-sent events and long-polling endpoints, returns the event
+    and the message.
+
+    Events which are not ``published`` are added to the outbox and,
+    unless ``schedule`` is ``False``, a run of the ``UpgradeEventRelay``
+    is scheduled when the current transaction is committed.
+    """
+    UpgradeEvent = load_model("firmware_upgrader", "UpgradeEvent")
+    message = {**data, "timestamp": timezone.now().isoformat()}
+    event = UpgradeEvent.objects.create(
+        payload=dumps_json(message).decode(), published=published, **identifiers
+    )
+    if not published and schedule:
+        transaction.on_commit(UpgradeEventRelay.schedule)
+    return event, message
+
+
+def _group_send(channel_layer, messages):
+    """
+    Sends ``(group, message)`` tuples to the channel layer, through
+    the ``BackgroundPublisher`` if enabled and no event loop is running
+    """
+    if _background_publisher_enabled:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            BackgroundPublisher.get_instance().put(channel_layer, messages)
+            return
+
+    async def _send_messages():
+        for group, message in messages:
+            await channel_layer.group_send(group, message)
+
+    # schedule the coroutine safely (handles both sync and async callers)
+    _run_coroutine_safely(_send_messages)
+
+
 class AuthenticatedWebSocketConsumer(AsyncJsonWebsocketConsumer):
     """
     Base websocket consumer with authentication and authorization methods.
     """
 
+    # websocket subprotocol which clients can request to
+    # receive messages as MessagePack encoded binary frames
+    msgpack_subprotocol = "msgpack"
+
+    async def accept(self, subprotocol=None, headers=None):
+        if (
+            subprotocol is None
+            and msgpack is not None
+            and self.msgpack_subprotocol in self.scope.get("subprotocols", [])
+        ):
+            subprotocol = self.msgpack_subprotocol
+        self.use_msgpack = subprotocol == self.msgpack_subprotocol
+        await super().accept(subprotocol, headers)
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        if bytes_data is not None and getattr(self, "use_msgpack", False):
+            await self.receive_json(loads_msgpack(bytes_data), **kwargs)
+            return
+        await super().receive(text_data=text_data, bytes_data=bytes_data, **kwargs)
+
+    async def send_json(self, content, close=False):
+        if getattr(self, "use_msgpack", False):
+            await self.send(bytes_data=dumps_msgpack(content), close=close)
+            return
+        await super().send_json(content, close=close)
+
     @classmethod
     async def encode_json(cls, content):
-        return json.dumps(content, cls=DjangoJSONEncoder)
+        return dumps_json(content).decode()
 
     def _is_user_authenticated(self):
         try:
@@ -64,32 +318,158 @@ class AuthenticatedWebSocketConsumer(AsyncJsonWebsocketConsumer):
         model=None,
         object_id=None,
         organization_field="organization_id",
+        permission_model=None,
+    ):
+        """
+        Returns whether the user is allowed to receive the updates of
+        the object; the decisions are cached for each user and object
+        for ``WEBSOCKET_AUTH_CACHE_TIMEOUT`` seconds and the organization
+        of the object is stored in ``self.organization_id``, so that it
+        does not have to be looked up again by the consumer.
+
+        The permissions are checked on ``permission_model``,
+        which defaults to ``model``.
+        """
+        authorized, self.organization_id = await self.get_authorization(
+            self.scope["user"], model, object_id, organization_field, permission_model
+        )
+        return authorized
+
+    @classmethod
+    async def get_authorization(
+        cls,
+        user,
+        model,
+        object_id,
+        organization_field="organization_id",
+        permission_model=None,
     ):
-        user = self.scope["user"]
+        """
+        Returns a tuple containing the cached authorization decision
+        of the user and the organization of the object, which is
+        ``None`` for superusers
+        """
         if user.is_superuser:
-            return True
-        return await sync_to_async(
-            lambda: (
-                user.is_staff
-                and (
-                    user.has_perm(
-                        f"{model._meta.app_label}.{get_permission_codename('change', model._meta)}"
-                    )
-                    or user.has_perm(
-                        f"{model._meta.app_label}.{get_permission_codename('view', model._meta)}"
-                    )
-                )
-                and user.is_manager(
-                    str(
-                        model.objects.filter(pk=object_id)
-                        .values_list(organization_field, flat=True)
-                        .first()
-                    )
-                )
+            return True, None
+        key = await cls._get_authorization_cache_key(user, model, object_id)
+        decision = await cache.aget(key)
+        if decision is None:
+            decision = await sync_to_async(cls._get_authorization)(
+                user, model, object_id, organization_field, permission_model
+            )
+            await cache.aset(
+                key, decision, timeout=app_settings.WEBSOCKET_AUTH_CACHE_TIMEOUT
+            )
+        return decision
+
+    def filter_by_organization(self, queryset, organization_field):
+        """
+        Restricts the queryset to the organization stored in
+        ``self.organization_id`` by ``is_user_authorized``,
+        superusers are not restricted
+        """
+        if self.organization_id is None:
+            return queryset
+        return queryset.filter(**{organization_field: self.organization_id})
+
+    @staticmethod
+    def _get_authorization(
+        user, model, object_id, organization_field, permission_model=None
+    ):
+        """
+        Returns a tuple containing the authorization
+        decision and the organization of the object
+        """
+        opts = (permission_model or model)._meta
+        if not user.is_staff or not (
+            user.has_perm(f"{opts.app_label}.{get_permission_codename('change', opts)}")
+            or user.has_perm(
+                f"{opts.app_label}.{get_permission_codename('view', opts)}"
+            )
+        ):
+            return False, None
+        organization_id = (
+            model.objects.filter(pk=object_id)
+            .values_list(organization_field, flat=True)
+            .first()
+        )
+        if organization_id is None:
+            return False, None
+        organization_id = str(organization_id)
+        return user.is_manager(organization_id), organization_id
+
+    @staticmethod
+    def _get_authorization_version_key(user_id):
+        return f"firmware_upgrader.websocket_auth_version-{user_id}"
+
+    @classmethod
+    async def _get_authorization_cache_key(cls, user, model, object_id):
+        # the version changes when the permissions or the
+        # organizations of the user change, see
+        # invalidate_authorization_cache()
+        version = await cache.aget(cls._get_authorization_version_key(user.pk))
+        return (
+            f"firmware_upgrader.websocket_auth-{user.pk}-{version}-"
+            f"{model._meta.label_lower}-{object_id}"
+        )
+
+    @classmethod
+    def invalidate_authorization_cache(cls, user_ids):
+        """
+        Invalidates the cached authorization decisions of the users
+        """
+        cache.set_many(
+            {
+                cls._get_authorization_version_key(user_id): uuid4().hex
+                for user_id in user_ids
+            },
+            timeout=None,
+        )
+
+    @classmethod
+    def handle_user_changed(cls, instance, **kwargs):
+        """
+        Invalidates the authorization decisions of a user when it is
+        saved (e.g. ``is_staff`` or ``is_active`` change) and when its
+        organization memberships change.
+        """
+        user_id = getattr(instance, "user_id", instance.pk)
+        cls.invalidate_authorization_cache([user_id])
+
+    @classmethod
+    def handle_permissions_changed(
+        cls, instance, action, reverse, model, pk_set, **kwargs
+    ):
+        """
+        Invalidates the authorization decisions of the users affected
+        by changes of the permissions or the groups of users and by
+        changes of the permissions of groups.
+        """
+        from django.contrib.auth.models import Group
+
+        if action not in ["post_add", "post_remove", "pre_clear"]:
+            return
+        User = get_user_model()
+        if isinstance(instance, User):
+            user_ids = [instance.pk]
+        elif model is User:
+            user_ids = pk_set
+            if action == "pre_clear":
+                user_ids = instance.user_set.values_list("pk", flat=True)
+        else:
+            group_ids = pk_set
+            if isinstance(instance, Group):
+                group_ids = [instance.pk]
+            elif action == "pre_clear":
+                group_ids = instance.group_set.values_list("pk", flat=True)
+            user_ids = (
+                User.objects.filter(groups__in=group_ids)
+                .values_list("pk", flat=True)
+                .distinct()
             )
-        )()
+        cls.invalidate_authorization_cache(list(user_ids))
 
-    async def receive_json(self, content):
+    async def receive_json(self, content, **kwargs):
         """Handle incoming messages from the client"""
         message_type = content.get("type")
         if message_type != "request_current_state":
@@ -156,7 +536,8 @@ class UpgradeProgressConsumer(AuthenticatedWebSocketConsumer):
     @sync_to_async
     def _get_upgrade_operation(self):
         UpgradeOperation = load_model("firmware_upgrader", "UpgradeOperation")
-        return UpgradeOperation.objects.filter(pk=self.operation_id).first()
+        queryset = UpgradeOperation.objects.filter(pk=self.operation_id)
+        return self.filter_by_organization(queryset, "device__organization_id").first()
 
     async def _handle_current_state_request(self, content):
         """Handle request for current state of the operation"""
@@ -191,8 +572,25 @@ class UpgradeProgressConsumer(AuthenticatedWebSocketConsumer):
 class BatchUpgradeProgressConsumer(AuthenticatedWebSocketConsumer):
     """
     WebSocket consumer that streams progress updates for a batch upgrade operation.
+
+    Clients can subscribe to the detailed updates of a subset of the
+    upgrade operations (e.g. the ones which are visible), the updates of
+    the other upgrade operations are collected and sent periodically in
+    ``operations_summary`` messages.
     """
 
+    # maximum number of upgrade operations a client can subscribe to
+    max_subscribed_operations = 1000
+    # seconds between the ``operations_summary`` messages
+    summary_interval = 2
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # ``None`` means that all the upgrade operations are subscribed
+        self.subscribed_operations = None
+        self.pending_summary = {}
+        self.summary_task = None
+
     async def connect(self):
         try:
             auth_result = self._is_user_authenticated()
@@ -229,42 +627,178 @@ class BatchUpgradeProgressConsumer(AuthenticatedWebSocketConsumer):
     @sync_to_async
     def _get_batch_upgrade_operation(self):
         BatchUpgradeOperation = load_model("firmware_upgrader", "BatchUpgradeOperation")
-        return BatchUpgradeOperation.objects.filter(pk=self.batch_id).first()
+        queryset = BatchUpgradeOperation.objects.filter(pk=self.batch_id)
+        return self.filter_by_organization(
+            queryset, "build__category__organization_id"
+        ).first()
+
+    @sync_to_async
+    def _get_batch_status(self, batch_operation):
+        stats = batch_operation.get_operation_stats()
+        return {
+            "status": batch_operation.status,
+            "completed": stats["completed"],
+            "total": stats["total_operations"],
+        }
+
+    @sync_to_async
+    def _get_image_names(self):
+        FirmwareImage = load_model("firmware_upgrader", "FirmwareImage")
+        queryset = FirmwareImage.objects.filter(
+            build__batchupgradeoperation=self.batch_id
+        ).select_related("build__category")
+        queryset = self.filter_by_organization(
+            queryset, "build__category__organization_id"
+        )
+        return {image.pk: str(image) for image in queryset}
+
+    @sync_to_async
+    def _get_sequence(self):
+        """
+        Returns the sequence number of the snapshot, that is the
+        identifier of the latest event of the batch, which must be
+        read before the upgrade operations
+        """
+        UpgradeEvent = load_model("firmware_upgrader", "UpgradeEvent")
+        latest = (
+            UpgradeEvent.objects.filter(batch_id=self.batch_id)
+            .order_by("-id")
+            .values_list("id", flat=True)
+            .first()
+        )
+        return latest or 0
+
+    @sync_to_async
+    def _get_changed_operations(self, since):
+        """
+        Returns the identifiers of the upgrade operations changed by the
+        events of the batch following the event ``since``, or ``None``
+        if that event has been purged from the log, in which case the
+        changes may be incomplete and the whole snapshot must be sent
+        """
+        UpgradeEvent = load_model("firmware_upgrader", "UpgradeEvent")
+        events = UpgradeEvent.objects.filter(batch_id=self.batch_id)
+        # the log is purged from the oldest events
+        if not events.filter(pk=since).exists():
+            return None
+        operation_ids = set()
+        for payload in (
+            events.filter(pk__gt=since).values_list("payload", flat=True).iterator()
+        ):
+            message = json.loads(payload)
+            if message.get("type") == "operation_progress":
+                operation_ids.add(message["operation_id"])
+            elif message.get("type") == "operations_cancelled":
+                operation_ids.update(message["operation_ids"])
+        return operation_ids
+
+    @sync_to_async
+    def _get_operations_chunk(self, operation_ids=None, cursor=None):
+        """
+        Returns the next chunk of upgrade operations of the snapshot
+        as tuples, ordered by creation time and primary key
+        """
+        UpgradeOperation = load_model("firmware_upgrader", "UpgradeOperation")
+        queryset = self.filter_by_organization(
+            UpgradeOperation.objects.filter(batch_id=self.batch_id),
+            "device__organization_id",
+        )
+        if operation_ids is not None:
+            queryset = queryset.filter(pk__in=operation_ids)
+        if cursor:
+            created, pk = cursor
+            queryset = queryset.filter(
+                Q(created__gt=created) | Q(created=created, pk__gt=pk)
+            )
+        return list(
+            queryset.order_by("created", "pk").values_list(
+                "id",
+                "device_id",
+                "device__name",
+                "image_id",
+                "status",
+                "progress",
+                "modified",
+                "created",
+            )[: app_settings.SNAPSHOT_CHUNK_SIZE]
+        )
+
+    def _get_since(self, content):
+        since = content.get("since")
+        if isinstance(since, int) and not isinstance(since, bool) and since >= 0:
+            return since
+        return None
 
     async def _handle_current_state_request(self, content):
-        """Handle request for current state of batch upgrade operations"""
-        # We import serializers here instead globally to prevent NotReady errors.
-        from .api.serializers import UpgradeOperationSerializer
+        """
+        Sends the state of the batch upgrade operation in ``batch_state``
+        messages, each one containing a chunk of its upgrade operations
+        in columnar format; if ``since`` is passed, only the upgrade
+        operations which have changed after that sequence number are sent.
 
+        The sequence numbers are the identifiers of the events of the
+        batch (see ``UpgradeEvent``), hence they grow monotonically;
+        the sequence number of the snapshot is read before the upgrade
+        operations, the changes which happen meanwhile are sent with
+        a higher sequence number in the real-time updates.
+        """
+        UpgradeOperation = load_model("firmware_upgrader", "UpgradeOperation")
+        statuses = [status for status, _ in UpgradeOperation.STATUS_CHOICES]
         try:
-            # Get the batch operation and its upgrade operations
             batch_operation = await self._get_batch_upgrade_operation()
-            if batch_operation:
-                # Get operations list
-                operations_list = await sync_to_async(list)(
-                    batch_operation.upgrade_operations.all()
-                )
-                # Serialize operations using the existing serializer
-                operations_data = await sync_to_async(
-                    lambda: UpgradeOperationSerializer(operations_list, many=True).data
-                )()
-                # Calculate counts
-                total_operations = len(operations_list)
-                completed_operations = sum(
-                    1 for op in operations_list if op.status != "in-progress"
-                )
-                # Send everything in ONE message
-                await self.send_json(
-                    {
-                        "type": "batch_state",
-                        "batch_status": {
-                            "status": batch_operation.status,
-                            "completed": completed_operations,
-                            "total": total_operations,
-                        },
-                        "operations": operations_data,
-                    }
-                )
+            if not batch_operation:
+                return
+            batch_status = await self._get_batch_status(batch_operation)
+            image_names = await self._get_image_names()
+            sequence = await self._get_sequence()
+            since = self._get_since(content)
+            operation_ids = None
+            if since is not None:
+                operation_ids = await self._get_changed_operations(since)
+                if operation_ids is None:
+                    # some changes are missing, the whole snapshot is sent
+                    since = None
+            cursor = None
+            chunk_index = 0
+            while True:
+                rows = await self._get_operations_chunk(operation_ids, cursor)
+                last = len(rows) < app_settings.SNAPSHOT_CHUNK_SIZE
+                operations = self._get_operations_columns()
+                for (
+                    pk,
+                    device_id,
+                    device_name,
+                    image_id,
+                    status,
+                    progress,
+                    modified,
+                    _created,
+                ) in rows:
+                    operations["id"].append(str(pk))
+                    operations["device_id"].append(str(device_id))
+                    operations["device_name"].append(device_name)
+                    operations["image_name"].append(image_names.get(image_id))
+                    operations["status"].append(statuses.index(status))
+                    operations["progress"].append(progress)
+                    operations["modified"].append(modified.isoformat())
+                    operations["seq"].append(sequence)
+                if rows:
+                    cursor = (rows[-1][7], rows[-1][0])
+                message = {
+                    "type": "batch_state",
+                    "seq": sequence,
+                    "since": since,
+                    "chunk": chunk_index,
+                    "last": last,
+                    "statuses": statuses,
+                    "operations": operations,
+                }
+                if chunk_index == 0:
+                    message["batch_status"] = batch_status
+                await self.send_json(message)
+                if last:
+                    break
+                chunk_index += 1
         except (ConnectionError, TimeoutError):
             logger.exception(
                 "Failed to connect to channel layer during batch state request"
@@ -272,8 +806,86 @@ class BatchUpgradeProgressConsumer(AuthenticatedWebSocketConsumer):
         except RuntimeError:
             logger.exception("Runtime error during batch state request")
 
+    def _get_operations_columns(self):
+        return {
+            "id": [],
+            "device_id": [],
+            "device_name": [],
+            "image_name": [],
+            "status": [],
+            "progress": [],
+            "modified": [],
+            "seq": [],
+        }
+
+    async def receive_json(self, content, **kwargs):
+        if content.get("type") == "subscribe_operations":
+            await self._handle_subscribe_operations(content)
+            return
+        await super().receive_json(content, **kwargs)
+
+    async def _handle_subscribe_operations(self, content):
+        """
+        Subscribes to the detailed updates of the upgrade operations
+        listed in ``operation_ids``, ``null`` subscribes to all of them
+        """
+        operation_ids = content.get("operation_ids")
+        if operation_ids is None:
+            self.subscribed_operations = None
+        elif isinstance(operation_ids, list):
+            self.subscribed_operations = {
+                str(operation_id)
+                for operation_id in operation_ids[: self.max_subscribed_operations]
+            }
+        else:
+            logger.warning("Invalid operation_ids received, ignoring subscription")
+
+    def _add_to_summary(self, data):
+        # only the latest update of each upgrade operation is kept
+        self.pending_summary[data["operation_id"]] = data
+        if self.summary_task is None:
+            self.summary_task = asyncio.ensure_future(self._send_summary())
+
+    async def _send_summary(self):
+        await asyncio.sleep(self.summary_interval)
+        pending, self.pending_summary = self.pending_summary, {}
+        self.summary_task = None
+        UpgradeOperation = load_model("firmware_upgrader", "UpgradeOperation")
+        statuses = [status for status, _ in UpgradeOperation.STATUS_CHOICES]
+        operations = self._get_operations_columns()
+        for data in pending.values():
+            operations["id"].append(data["operation_id"])
+            operations["device_id"].append(data.get("device_id"))
+            operations["device_name"].append(data.get("device_name"))
+            operations["image_name"].append(data.get("image_name"))
+            operations["status"].append(statuses.index(data["status"]))
+            operations["progress"].append(data["progress"])
+            operations["modified"].append(data.get("modified"))
+            operations["seq"].append(data["seq"])
+        await self.send_json(
+            {
+                "type": "operations_summary",
+                "seq": max(operations["seq"]),
+                "statuses": statuses,
+                "operations": operations,
+            }
+        )
+
     async def batch_upgrade_progress(self, event):
-        await self.send_json(event["data"])
+        data = event["data"]
+        if (
+            self.subscribed_operations is not None
+            and data.get("type") == "operation_progress"
+            and data.get("operation_id") not in self.subscribed_operations
+        ):
+            self._add_to_summary(data)
+            return
+        await self.send_json(data)
+
+    async def disconnect(self, close_code):
+        if self.summary_task is not None:
+            self.summary_task.cancel()
+        await super().disconnect(close_code)
 
 
 class DeviceUpgradeProgressConsumer(AuthenticatedWebSocketConsumer):
@@ -323,15 +935,18 @@ class DeviceUpgradeProgressConsumer(AuthenticatedWebSocketConsumer):
             # Get recent operations (including recently completed) for this device
             get_operations = sync_to_async(
                 lambda: list(
-                    UpgradeOperation.objects.filter(
-                        device_id=self.pk_,
-                        status__in=[
-                            "in-progress",
-                            "success",
-                            "failed",
-                            "aborted",
-                            "cancelled",
-                        ],
+                    self.filter_by_organization(
+                        UpgradeOperation.objects.filter(
+                            device_id=self.pk_,
+                            status__in=[
+                                "in-progress",
+                                "success",
+                                "failed",
+                                "aborted",
+                                "cancelled",
+                            ],
+                        ),
+                        "device__organization_id",
                     ).order_by("-modified")[:5]
                 )
             )
@@ -361,44 +976,255 @@ class DeviceUpgradeProgressConsumer(AuthenticatedWebSocketConsumer):
         await self.send_json(event["data"])
 
 
+class MultiplexedUpgradeProgressConsumer(AuthenticatedWebSocketConsumer):
+    """
+    WebSocket consumer which streams the progress updates of any
+    number of topics over a single connection, topics are subscribed
+    and unsubscribed with messages sent by the client.
+
+    Topics are in the ``<kind>:<uuid>`` format, where kind is
+    ``device``, ``operation``, ``batch``, ``organization``
+    or ``dashboard``.
+    """
+
+    max_subscriptions = 500
+    # number of event IDs remembered to discard the events
+    # received more than once through different topics
+    max_recent_events = 1000
+
+    def get_topic_config(self, kind):
+        """
+        Returns the model, the organization field, the model used to check
+        the permissions and the channel layer group of each kind of topic
+        """
+        UpgradeOperation = load_model("firmware_upgrader", "UpgradeOperation")
+        return {
+            "device": (
+                load_model("config", "Device"),
+                "organization_id",
+                None,
+                "firmware_upgrader.device-{}",
+            ),
+            "operation": (
+                UpgradeOperation,
+                "device__organization_id",
+                None,
+                "upgrade_{}",
+            ),
+            "batch": (
+                load_model("firmware_upgrader", "BatchUpgradeOperation"),
+                "build__category__organization_id",
+                None,
+                "batch_upgrade_{}",
+            ),
+            "organization": (
+                load_model("openwisp_users", "Organization"),
+                "pk",
+                UpgradeOperation,
+                "firmware_upgrader.organization-{}",
+            ),
+            "dashboard": (
+                load_model("openwisp_users", "Organization"),
+                "pk",
+                UpgradeOperation,
+                OrganizationDashboardPublisher.group_name_format,
+            ),
+        }.get(kind)
+
+    async def connect(self):
+        if not self._is_user_authenticated():
+            await self.close()
+            return
+        self.subscriptions = {}
+        self._recent_events = OrderedDict()
+        await self.accept()
+
+    async def receive_json(self, content, **kwargs):
+        """Handle subscription messages from the client"""
+        message_type = content.get("type")
+        topics = content.get("topics")
+        if message_type not in ["subscribe", "unsubscribe"] or not isinstance(
+            topics, list
+        ):
+            logger.warning(f"Unknown message type received: {message_type}")
+            return
+        if message_type == "subscribe":
+            await self._subscribe(topics)
+        else:
+            await self._unsubscribe(topics)
+
+    async def _get_topic_group(self, topic):
+        """
+        Returns the channel layer group of the topic if
+        the user is authorized to subscribe to it
+        """
+        try:
+            kind, object_id = str(topic).split(":", 1)
+            object_id = str(UUID(object_id))
+        except ValueError:
+            return None
+        config = self.get_topic_config(kind)
+        if not config:
+            return None
+        model, organization_field, permission_model, group = config
+        if not await self.is_user_authorized(
+            model=model,
+            object_id=object_id,
+            organization_field=organization_field,
+            permission_model=permission_model,
+        ):
+            return None
+        return group.format(object_id)
+
+    async def _subscribe(self, topics):
+        subscribed, denied = [], []
+        for topic in topics:
+            if topic in self.subscriptions:
+                subscribed.append(topic)
+                continue
+            group = None
+            if len(self.subscriptions) < self.max_subscriptions:
+                group = await self._get_topic_group(topic)
+            if not group:
+                denied.append(topic)
+                continue
+            try:
+                await self.channel_layer.group_add(group, self.channel_name)
+            except (ConnectionError, TimeoutError, RuntimeError):
+                logger.exception(f"Failed to add channel to group {group}")
+                denied.append(topic)
+                continue
+            self.subscriptions[topic] = group
+            subscribed.append(topic)
+        await self.send_json(
+            {"type": "subscribed", "topics": subscribed, "denied": denied}
+        )
+
+    async def _unsubscribe(self, topics):
+        unsubscribed = []
+        for topic in topics:
+            group = self.subscriptions.pop(topic, None)
+            if not group:
+                continue
+            try:
+                await self.channel_layer.group_discard(group, self.channel_name)
+            except (ConnectionError, TimeoutError, RuntimeError):
+                logger.exception(f"Failed to discard channel from group {group}")
+            unsubscribed.append(topic)
+        await self.send_json({"type": "unsubscribed", "topics": unsubscribed})
+
+    async def disconnect(self, close_code):
+        for group in getattr(self, "subscriptions", {}).values():
+            try:
+                await self.channel_layer.group_discard(group, self.channel_name)
+            except (ConnectionError, TimeoutError, RuntimeError):
+                logger.exception(f"Failed to discard channel from group {group}")
+
+    async def _forward_event(self, event):
+        topic = event.get("topic")
+        if topic not in self.subscriptions:
+            return
+        # the same event is published to the groups of different
+        # topics (e.g. device and operation), it is sent only once
+        event_id = event.get("event_id")
+        if event_id:
+            if event_id in self._recent_events:
+                return
+            self._recent_events[event_id] = None
+            if len(self._recent_events) > self.max_recent_events:
+                self._recent_events.popitem(last=False)
+        await self.send_json({"type": "event", "topic": topic, "data": event["data"]})
+
+    async def send_update(self, event):
+        await self._forward_event(event)
+
+    async def upgrade_progress(self, event):
+        await self._forward_event(event)
+
+    async def batch_upgrade_progress(self, event):
+        await self._forward_event(event)
+
+    async def upgrade_dashboard(self, event):
+        await self._forward_event(event)
+
+
 class UpgradeProgressPublisher:
     """
     Publisher for device-specific upgrade progress that publishes to
     both individual operation channels and device channels
     """
 
-    def __init__(self, device_id, operation_id=None):
+    def __init__(self, device_id, operation_id=None, organization_id=None):
         self.device_id = device_id
         self.operation_id = operation_id
+        self.organization_id = organization_id
         self.channel_layer = get_channel_layer()
         self.device_group_name = f"firmware_upgrader.device-{device_id}"
         if operation_id:
             self.operation_group_name = f"upgrade_{operation_id}"
+        if organization_id:
+            self.organization_group_name = (
+                f"firmware_upgrader.organization-{organization_id}"
+            )
 
-    def publish_progress(self, data):
-        """Publish to device-specific channel"""
-        message = {
-            **data,
-            "timestamp": timezone.now().isoformat(),
-        }
+    def create_event(self, data, published=True, schedule=True):
+        return _create_event(
+            data,
+            published,
+            schedule,
+            device_id=self.device_id,
+            operation_id=self.operation_id,
+            organization_id=self.organization_id,
+        )
 
-        async def _send_messages():
-            # Send to device-specific channel
-            await self.channel_layer.group_send(
-                self.device_group_name, {"type": "send_update", "data": message}
+    def get_messages(self, message, event_id):
+        """
+        Returns the ``(group, message)`` tuples of an event, the event ID
+        allows multiplexed consumers to discard the copies of the event
+        received from other topics
+        """
+        messages = [
+            (
+                self.device_group_name,
+                {
+                    "type": "send_update",
+                    "data": message,
+                    "topic": f"device:{self.device_id}",
+                    "event_id": event_id,
+                },
             )
-            # Also send to operation-specific channel if available
-            if hasattr(self, "operation_group_name"):
-                await self.channel_layer.group_send(
+        ]
+        # Also send to operation-specific channel if available
+        if hasattr(self, "operation_group_name"):
+            messages.append(
+                (
                     self.operation_group_name,
                     {
                         "type": "upgrade_progress",
                         "data": message,
+                        "topic": f"operation:{self.operation_id}",
+                        "event_id": event_id,
                     },
                 )
+            )
+        if hasattr(self, "organization_group_name"):
+            messages.append(
+                (
+                    self.organization_group_name,
+                    {
+                        "type": "upgrade_progress",
+                        "data": message,
+                        "topic": f"organization:{self.organization_id}",
+                        "event_id": event_id,
+                    },
+                )
+            )
+        return messages
 
-        # schedule the coroutine safely (handles both sync and async callers)
-        _run_coroutine_safely(_send_messages)
+    def publish_progress(self, data):
+        """Publish to device-specific channel"""
+        event, message = self.create_event(data)
+        _group_send(self.channel_layer, self.get_messages(message, str(event.pk)))
 
     def publish_operation_update(self, operation_data):
         """Publish complete operation update"""
@@ -407,49 +1233,65 @@ class UpgradeProgressPublisher:
     def publish_error(self, error_message):
         self.publish_progress({"type": "error", "message": error_message})
 
+    @staticmethod
+    def get_operation_state(instance):
+        """
+        Returns the state of the upgrade operation sent in the
+        ``operation_update`` messages; the log is not included,
+        clients read the new lines from the log endpoint starting
+        from the length of the log they have already received
+        """
+        return {
+            "id": str(instance.pk),
+            "device": str(instance.device_id),
+            "image": str(instance.image_id) if instance.image_id else None,
+            "status": instance.status,
+            "progress": instance.progress,
+            "log_length": len(instance.log),
+            "modified": instance.modified,
+            "created": instance.created,
+        }
+
     @classmethod
     def handle_upgrade_operation_post_save(cls, sender, instance, created, **kwargs):
         """
-        Handle UpgradeOperation post_save events by publishing status updates to WebSocket channels.
+        Adds the update of the upgrade operation to the outbox, in the
+        transaction of the change, the update is published to the
+        WebSocket channels by ``UpgradeEventRelay`` after the commit.
         """
         # Only publish updates for existing operations
-        if created and not (hasattr(instance, "batch") and instance.batch):
+        if created and not instance.batch_id:
             return
 
-        # Import serializer here to avoid circular imports and NotReady errors
-        from .api.serializers import UpgradeOperationSerializer
-
-        try:
-            device_publisher = cls(instance.device.pk, instance.pk)
-            device_publisher_data = UpgradeOperationSerializer(instance).data
-            # DRF serializers does not convert ForeignKey fields to string,
-            for field in ["device", "image"]:
-                device_publisher_data[field] = str(device_publisher_data[field])
-            device_publisher.publish_operation_update(device_publisher_data)
-            # Publish to batch upgrade channel if this operation belongs to a batch
-            if hasattr(instance, "batch") and instance.batch:
-                batch_publisher = BatchUpgradeProgressPublisher(instance.batch.pk)
-                # Prepare device information
-                device_info = {
-                    "device_id": instance.device.pk,
-                    "device_name": instance.device.name,
-                    "image_name": str(instance.image) if instance.image else None,
-                }
-                batch_publisher.publish_operation_progress(
+        device_publisher = cls(
+            instance.device.pk, instance.pk, instance.device.organization_id
+        )
+        device_publisher.create_event(
+            {
+                "type": "operation_update",
+                "operation": cls.get_operation_state(instance),
+            },
+            published=False,
+        )
+        # the status of the mass upgrade operation
+        # is published by the relay, see UpgradeEventRelay
+        if instance.batch_id:
+            batch_publisher = BatchUpgradeProgressPublisher(instance.batch_id)
+            # Prepare device information
+            device_info = {
+                "device_id": instance.device.pk,
+                "device_name": instance.device.name,
+                "image_name": str(instance.image) if instance.image else None,
+            }
+            batch_publisher.create_event(
+                batch_publisher.get_operation_progress(
                     str(instance.pk),
                     instance.status,
                     getattr(instance, "progress", 0),
                     instance.modified,
                     device_info,
-                )
-                batch_publisher.update_batch_status(instance.batch)
-        except (ConnectionError, TimeoutError):
-            logger.exception(
-                f"Failed to connect to channel layer for upgrade operation {instance.pk}"
-            )
-        except RuntimeError:
-            logger.exception(
-                f"Runtime error in WebSocket publishing for upgrade operation {instance.pk}"
+                ),
+                published=False,
             )
 
 
@@ -463,19 +1305,29 @@ class BatchUpgradeProgressPublisher:
         self.channel_layer = get_channel_layer()
         self.group_name = f"batch_upgrade_{batch_id}"
 
-    def publish_progress(self, data):
-        async def _send_message():
-            await self.channel_layer.group_send(
+    def create_event(self, data, published=True, schedule=True):
+        return _create_event(data, published, schedule, batch_id=self.batch_id)
+
+    def get_messages(self, message, event_id):
+        # the identifier of the event is the sequence number of the change
+        message = dict(message, seq=int(event_id))
+        return [
+            (
                 self.group_name,
                 {
                     "type": "batch_upgrade_progress",
-                    "data": {**data, "timestamp": timezone.now().isoformat()},
+                    "data": message,
+                    "topic": f"batch:{self.batch_id}",
+                    "event_id": event_id,
                 },
             )
+        ]
 
-        _run_coroutine_safely(_send_message)
+    def publish_progress(self, data):
+        event, message = self.create_event(data)
+        _group_send(self.channel_layer, self.get_messages(message, str(event.pk)))
 
-    def publish_operation_progress(
+    def get_operation_progress(
         self, operation_id, status, progress, modified=None, device_info=None
     ):
         progress_data = {
@@ -494,44 +1346,401 @@ class BatchUpgradeProgressPublisher:
                     "image_name": device_info.get("image_name", ""),
                 }
             )
-        self.publish_progress(progress_data)
+        return progress_data
 
-    def publish_batch_status(self, status, completed, total):
+    def publish_operation_progress(
+        self, operation_id, status, progress, modified=None, device_info=None
+    ):
         self.publish_progress(
-            {
-                "type": "batch_status",
-                "status": status,
-                "completed": completed,
-                "total": total,
-            }
+            self.get_operation_progress(
+                operation_id, status, progress, modified, device_info
+            )
         )
 
-    def update_batch_status(self, batch_instance):
-        """Update and publish batch status based on current operations"""
-        batch_instance.refresh_from_db()
-        batch_status, stats = batch_instance.calculate_and_update_status()
-        self.publish_batch_status(
-            batch_status,
-            stats["completed"],
-            stats["total_operations"],
+    def get_batch_status(self, status, completed, total):
+        return {
+            "type": "batch_status",
+            "status": status,
+            "completed": completed,
+            "total": total,
+        }
+
+    def publish_batch_status(self, status, completed, total):
+        self.publish_progress(self.get_batch_status(status, completed, total))
+
+    def get_operations_cancelled(self, operation_ids, modified, stats, status):
+        return {
+            "type": "operations_cancelled",
+            "operation_ids": [str(pk) for pk in operation_ids],
+            "modified": modified.isoformat(),
+            "status": status,
+            "completed": stats["completed"],
+            "total": stats["total_operations"],
+        }
+
+    def publish_operations_cancelled(self, operation_ids, modified, stats, status):
+        self.publish_progress(
+            self.get_operations_cancelled(operation_ids, modified, stats, status)
         )
 
+    @staticmethod
+    def get_batch_counts(counters):
+        """
+        Returns the number of completed and total upgrade
+        operations, read from the counters of the batch
+        """
+        return {
+            "completed": counters["completed_operations"],
+            "total": counters["total_targets"],
+        }
+
     @classmethod
     def handle_batch_upgrade_operation_saved(cls, sender, instance, created, **kwargs):
         """
-        Handle BatchUpgradeOperation post_save events by publishing status updates to WebSocket channels.
+        Handle BatchUpgradeOperation post_save events by adding
+        the status of the batch to the outbox; the numbers of upgrade
+        operations are added by ``UpgradeEventRelay`` when the event
+        is published, which keeps the save of the batch cheap.
         """
         # Only publish updates for existing operations
         if created:
             return
-        try:
-            batch_publisher = cls(instance.pk)
-            batch_publisher.update_batch_status(instance)
-        except (ConnectionError, TimeoutError):
-            logger.exception(
-                f"Failed to connect to channel layer for batch upgrade operation {instance.pk}"
+        cls(instance.pk).create_event(
+            {"type": "batch_status", "status": instance.status}, published=False
+        )
+
+    @classmethod
+    def handle_operations_cancelled(
+        cls, sender, instance, operation_ids, modified, stats, **kwargs
+    ):
+        """
+        Adds a single message to the outbox for all the upgrade
+        operations cancelled in bulk in a mass upgrade operation.
+        """
+        batch_publisher = cls(instance.pk)
+        batch_publisher.create_event(
+            batch_publisher.get_operations_cancelled(
+                operation_ids, modified, stats, instance.status
+            ),
+            published=False,
+        )
+
+
+class UpgradeEventRelay:
+    """
+    Publishes the events of the outbox to the WebSocket channels in
+    the order in which they have been stored, in batches; the events
+    are marked as published only after being sent to the channel layer,
+    hence each event is delivered at least once.
+
+    Only one relay runs at a time, see the ``relay_upgrade_events``
+    celery task, which keeps the events of each upgrade operation in
+    order; the status of each mass upgrade operation whose upgrade
+    operations have been completed is published once per batch.
+    """
+
+    scheduled_key = "firmware_upgrader.event_relay_scheduled"
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or app_settings.EVENT_RELAY_BATCH_SIZE
+        self.channel_layer = get_channel_layer()
+
+    @classmethod
+    def schedule(cls):
+        """
+        Schedules a run of the relay, unless one has already
+        been scheduled and has not started reading the outbox yet
+        """
+        from .tasks import relay_upgrade_events
+
+        if cache.add(cls.scheduled_key, True, timeout=app_settings.EVENT_RELAY_TIMEOUT):
+            relay_upgrade_events.delay()
+
+    @classmethod
+    def is_scheduled(cls):
+        return bool(cache.get(cls.scheduled_key))
+
+    def get_messages(self, event, message):
+        event_id = str(event.pk)
+        if event.batch_id:
+            return BatchUpgradeProgressPublisher(event.batch_id).get_messages(
+                message, event_id
             )
-        except RuntimeError:
-            logger.exception(
-                f"Runtime error in WebSocket publishing for batch upgrade operation {instance.pk}"
+        return UpgradeProgressPublisher(
+            event.device_id, event.operation_id, event.organization_id
+        ).get_messages(message, event_id)
+
+    def send(self, messages):
+        """
+        Sends the messages through the ``BackgroundPublisher``
+        if enabled, waits until they have been sent
+        """
+        if _background_publisher_enabled:
+            BackgroundPublisher.get_instance().send(
+                self.channel_layer, messages, timeout=app_settings.EVENT_RELAY_TIMEOUT
+            )
+        else:
+            async_to_sync(BackgroundPublisher.send_in_order)(
+                self.channel_layer, messages
+            )
+
+    def relay(self, deadline=None):
+        """
+        Publishes the events of the outbox until it's empty or until the
+        ``deadline`` (monotonic time) has passed, returns the number of
+        published events
+        """
+        UpgradeEvent = load_model("firmware_upgrader", "UpgradeEvent")
+        relayed = 0
+        while deadline is None or time.monotonic() < deadline:
+            # the events added from now on schedule another run
+            cache.delete(self.scheduled_key)
+            events = list(
+                UpgradeEvent.objects.filter(published=False).order_by("id")[
+                    : self.batch_size
+                ]
+            )
+            if not events:
+                break
+            messages = []
+            batch_ids = set()
+            event_messages = [(event, json.loads(event.payload)) for event in events]
+            self.add_batch_counts(event_messages)
+            for event, message in event_messages:
+                messages.extend(self.get_messages(event, message))
+                if (
+                    message.get("type") == "operation_progress"
+                    and message.get("status") != "in-progress"
+                ):
+                    batch_ids.add(event.batch_id)
+            self.send(messages)
+            UpgradeEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+                published=True
+            )
+            upgrade_events_relayed.send(sender=UpgradeEvent, events=events)
+            # the status is added to the outbox and published in the next batch
+            self.add_batch_statuses(batch_ids)
+            relayed += len(events)
+        else:
+            # the outbox has not been emptied before the deadline
+            cache.set(
+                self.scheduled_key, True, timeout=app_settings.EVENT_RELAY_TIMEOUT
+            )
+        return relayed
+
+    def add_batch_counts(self, event_messages):
+        """
+        Adds the numbers of upgrade operations, read from the counters
+        of the batches, to the batch statuses added to the outbox
+        without them, see ``handle_batch_upgrade_operation_saved``
+        """
+        pending = [
+            (event, message)
+            for event, message in event_messages
+            if message.get("type") == "batch_status" and "total" not in message
+        ]
+        if not pending:
+            return
+        BatchUpgradeOperation = load_model("firmware_upgrader", "BatchUpgradeOperation")
+        counters = {
+            batch["id"]: batch
+            for batch in BatchUpgradeOperation.objects.filter(
+                pk__in={event.batch_id for event, _message in pending}
+            ).values("id", *BatchUpgradeOperation.COUNTER_FIELDS)
+        }
+        for event, message in pending:
+            # the batch may have been deleted meanwhile
+            if event.batch_id in counters:
+                message.update(
+                    BatchUpgradeProgressPublisher.get_batch_counts(
+                        counters[event.batch_id]
+                    )
+                )
+                event.payload = dumps_json(message).decode()
+        load_model("firmware_upgrader", "UpgradeEvent").objects.bulk_update(
+            [event for event, _message in pending], ["payload"]
+        )
+
+    def add_batch_statuses(self, batch_ids):
+        BatchUpgradeOperation = load_model("firmware_upgrader", "BatchUpgradeOperation")
+        batches = BatchUpgradeOperation.objects.filter(pk__in=batch_ids).values(
+            "id", "status", *BatchUpgradeOperation.COUNTER_FIELDS
+        )
+        for batch in batches:
+            publisher = BatchUpgradeProgressPublisher(batch["id"])
+            counts = publisher.get_batch_counts(batch)
+            publisher.create_event(
+                publisher.get_batch_status(
+                    batch["status"], counts["completed"], counts["total"]
+                ),
+                published=False,
+                schedule=False,
+            )
+
+
+class OrganizationDashboardPublisher:
+    """
+    Aggregates the state of the running mass upgrade operations of each
+    organization and publishes it to the ``dashboard`` topic.
+
+    Meant to be run at a fixed tick by a single process (see the
+    ``publish_upgrade_dashboards`` celery task), the cost of each run
+    depends on the number of running mass upgrade operations and not
+    on the number of upgrade operations which are changing.
+    """
+
+    group_name_format = "firmware_upgrader.dashboard-{}"
+    cache_key = "firmware_upgrader.dashboard_state"
+    # number of the most recent failures examined
+    # to compute the top failure reasons
+    failure_sample_size = 100
+    top_failure_reasons = 5
+
+    def __init__(self):
+        self.channel_layer = get_channel_layer()
+
+    def get_running_batches(self):
+        BatchUpgradeOperation = load_model("firmware_upgrader", "BatchUpgradeOperation")
+        return list(
+            BatchUpgradeOperation.objects.filter(status="in-progress").values(
+                "id",
+                "build__category__organization_id",
+                "build__category__name",
+                "build__version",
+                *BatchUpgradeOperation.COUNTER_FIELDS,
+            )
+        )
+
+    def get_operation_counters(self, batch):
+        """
+        Returns the number of running, completed, failed and
+        queued upgrade operations and the number of target devices
+        of the batch, read from the counters of the batch
+        """
+        launched = batch["launched_operations"]
+        completed = batch["completed_operations"]
+        total = batch["total_targets"]
+        if not completed <= launched <= total:
+            logger.warning(
+                f"The counters of mass upgrade operation {batch['id']} "
+                f"disagree: {total} targets, {launched} launched "
+                f"and {completed} completed upgrade operations"
+            )
+        return {
+            "running": launched - completed,
+            "completed": completed,
+            "failed": batch["failed_operations"],
+            "queued": total - launched,
+            "total": total,
+        }
+
+    def get_failure_reasons(self, batch_ids):
+        """
+        Returns the most frequent failure reasons of
+        the most recent failed upgrade operations
+        """
+        UpgradeOperation = load_model("firmware_upgrader", "UpgradeOperation")
+        reasons = Counter(
+            UpgradeOperation.objects.filter(
+                batch_id__in=batch_ids, status__in=UpgradeOperation.FAILURE_STATUSES
+            )
+            .order_by("-modified")
+            .values_list("failure_reason", flat=True)[: self.failure_sample_size]
+        )
+        return [
+            {"reason": reason, "count": count}
+            for reason, count in reasons.most_common(self.top_failure_reasons)
+        ]
+
+    def aggregate(self):
+        """
+        Returns the state of the dashboard of each organization
+        which has running mass upgrade operations
+        """
+        now = timezone.now()
+        previous = cache.get(self.cache_key) or {}
+        previous_completed = previous.get("completed", {})
+        elapsed = (now - previous["time"]).total_seconds() if previous else 0
+        batches = self.get_running_batches()
+        counters = {
+            batch["id"]: self.get_operation_counters(batch) for batch in batches
+        }
+        dashboards = {}
+        for batch in batches:
+            organization_id = str(batch["build__category__organization_id"])
+            dashboard = dashboards.setdefault(
+                organization_id,
+                {"batches": [], "completed_delta": 0, "batch_ids": []},
+            )
+            batch_counters = counters[batch["id"]]
+            dashboard["batch_ids"].append(batch["id"])
+            dashboard["batches"].append(
+                {
+                    "id": str(batch["id"]),
+                    "build": (
+                        f"{batch['build__category__name']} "
+                        f"v{batch['build__version']}"
+                    ),
+                    **batch_counters,
+                }
+            )
+            # batches seen for the first time do
+            # not contribute to the throughput
+            dashboard["completed_delta"] += batch_counters[
+                "completed"
+            ] - previous_completed.get(batch["id"], batch_counters["completed"])
+        for dashboard in dashboards.values():
+            completed_delta = dashboard.pop("completed_delta")
+            dashboard["throughput"] = (
+                round(completed_delta * 60 / elapsed, 2) if elapsed else 0
+            )
+            dashboard["failure_reasons"] = self.get_failure_reasons(
+                dashboard.pop("batch_ids")
+            )
+        cache.set(
+            self.cache_key,
+            {
+                "time": now,
+                "completed": {
+                    batch["id"]: counters[batch["id"]]["completed"] for batch in batches
+                },
+                "organizations": list(dashboards),
+            },
+            timeout=None,
+        )
+        # organizations whose mass upgrade operations have just
+        # completed receive an empty state to clear the dashboards
+        for organization_id in previous.get("organizations", []):
+            dashboards.setdefault(
+                organization_id,
+                {"batches": [], "throughput": 0, "failure_reasons": []},
+            )
+        return dashboards
+
+    def publish(self):
+        """
+        Publishes the aggregated state to the dashboard of
+        each organization, returns the number of messages sent
+        """
+        dashboards = self.aggregate()
+        timestamp = timezone.now().isoformat()
+
+        messages = [
+            (
+                self.group_name_format.format(organization_id),
+                {
+                    "type": "upgrade_dashboard",
+                    "data": {
+                        "type": "dashboard",
+                        "organization": organization_id,
+                        **dashboard,
+                        "timestamp": timestamp,
+                    },
+                    "topic": f"dashboard:{organization_id}",
+                },
             )
+            for organization_id, dashboard in dashboards.items()
+        ]
+        if messages:
+            _group_send(self.channel_layer, messages)
+        return len(messages)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Compares the size and the encoding time of the payloads of the
+REST API and of the WebSocket API with the supported encoders.
+
+Usage: ./benchmark_encoding.py [number of upgrade operations]
+"""
+import os
+import sys
+from datetime import timedelta
+from decimal import Decimal
+from timeit import timeit
+from uuid import uuid4
+
+if __name__ == "__main__":
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "openwisp2.settings")
+
+    import django
+
+    django.setup()
+
+    from unittest.mock import patch
+
+    from django.utils import timezone
+
+    from openwisp_firmware_upgrader import settings as app_settings
+    from openwisp_firmware_upgrader.utils import (
+        dumps_json,
+        dumps_msgpack,
+        msgpack,
+        orjson,
+    )
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    now = timezone.now()
+    batch_id = uuid4()
+    operations = [
+        {
+            "id": uuid4(),
+            "device": uuid4(),
+            "device_name": f"device-{i}",
+            "image": uuid4(),
+            "status": "in-progress",
+            "log": "Connection successful, starting upgrade...",
+            "progress": Decimal(i % 100),
+            "batch": batch_id,
+            "created": now - timedelta(seconds=i),
+            "modified": now - timedelta(microseconds=i),
+        }
+        for i in range(size)
+    ]
+    snapshot = {
+        "type": "batch_state",
+        "chunk": 0,
+        "last": True,
+        "statuses": ["idle", "in-progress", "success", "failed", "aborted"],
+        "operations": {
+            "id": [op["id"] for op in operations],
+            "device_id": [op["device"] for op in operations],
+            "device_name": [op["device_name"] for op in operations],
+            "status": [1] * size,
+            "progress": [int(op["progress"]) for op in operations],
+            "seq": list(range(size)),
+        },
+    }
+    encoders = [("json", lambda content: dumps_json(content))]
+    if orjson:
+
+        def dumps_orjson(content):
+            with patch.object(app_settings, "JSON_BACKEND", "orjson"):
+                return dumps_json(content)
+
+        encoders.append(("orjson", dumps_orjson))
+    else:
+        print("orjson is not installed, skipping")
+    if msgpack:
+        encoders.append(("msgpack", dumps_msgpack))
+    else:
+        print("msgpack is not installed, skipping")
+
+    for label, payload in [("operations", operations), ("snapshot", snapshot)]:
+        print(f"\n{label} ({size} upgrade operations)")
+        for name, encode in encoders:
+            payload_size = len(encode(payload))
+            elapsed = timeit(lambda: encode(payload), number=5) / 5
+            print(
+                f"  {name:<8} {payload_size / 1024:>10.1f} KiB"
+                f" {elapsed * 1000:>10.2f} ms"
+            )
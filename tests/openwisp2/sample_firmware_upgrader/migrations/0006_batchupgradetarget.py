@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from openwisp_firmware_upgrader.migrations import create_batch_upgrade_targets
+
+
+def create_batch_upgrade_targets_helper(apps, schema_editor):
+    create_batch_upgrade_targets(apps, schema_editor, "sample_firmware_upgrader")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sample_firmware_upgrader", "0005_batchupgradeoperation_launch_checkpoint"),
+        migrations.swappable_dependency(settings.CONFIG_DEVICE_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BatchUpgradeTarget",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("details", models.CharField(blank=True, max_length=64, null=True)),
+                (
+                    "batch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="sample_firmware_upgrader.batchupgradeoperation",
+                    ),
+                ),
+                (
+                    "device",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.CONFIG_DEVICE_MODEL,
+                    ),
+                ),
+                (
+                    "image",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="sample_firmware_upgrader.firmwareimage",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Mass upgrade target",
+                "verbose_name_plural": "Mass upgrade targets",
+                "abstract": False,
+                "unique_together": {("batch", "device")},
+            },
+        ),
+        migrations.RunPython(
+            create_batch_upgrade_targets_helper,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sample_firmware_upgrader", "0006_batchupgradetarget"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="resumed",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name="batchupgradeoperation",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("idle", "idle"),
+                    ("in-progress", "in progress"),
+                    ("success", "completed successfully"),
+                    ("failed", "completed with some failures"),
+                    ("cancelled", "completed with some cancellations"),
+                    ("paused", "paused because of too many failures"),
+                ],
+                default="idle",
+                max_length=12,
+            ),
+        ),
+    ]
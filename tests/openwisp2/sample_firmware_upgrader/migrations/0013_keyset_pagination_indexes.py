@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sample_firmware_upgrader", "0012_upgradeoperation_batch_created_index"),
+        migrations.swappable_dependency(settings.CONFIG_DEVICEGROUP_MODEL),
+        migrations.swappable_dependency(settings.CONFIG_DEVICE_MODEL),
+        migrations.swappable_dependency(settings.GEO_LOCATION_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="batchupgradeoperation",
+            index=models.Index(
+                fields=["-created", "-id"], name="batchupgrade_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="upgradeoperation",
+            index=models.Index(
+                fields=["-created", "-id"], name="upgradeop_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sample_firmware_upgrader", "0013_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="retries",
+                to="sample_firmware_upgrader.batchupgradeoperation",
+                verbose_name="retry of",
+            ),
+        ),
+    ]
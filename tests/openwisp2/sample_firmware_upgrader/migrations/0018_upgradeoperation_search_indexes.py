@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+from openwisp_firmware_upgrader.migrations import (
+    create_device_name_trigram_index,
+    drop_device_name_trigram_index,
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sample_firmware_upgrader", "0017_upgradeevent_outbox"),
+        migrations.swappable_dependency(settings.CONFIG_DEVICE_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="upgradeoperation",
+            index=models.Index(fields=["batch", "id"], name="upgradeop_batch_id_idx"),
+        ),
+        migrations.RemoveIndex(
+            model_name="upgradeoperation",
+            name="upgradeop_batch_status_idx",
+        ),
+        migrations.AddIndex(
+            model_name="upgradeoperation",
+            index=models.Index(
+                fields=["batch", "status", "id"], name="upgradeop_batch_status_id_idx"
+            ),
+        ),
+        migrations.RunPython(
+            create_device_name_trigram_index,
+            reverse_code=drop_device_name_trigram_index,
+        ),
+    ]
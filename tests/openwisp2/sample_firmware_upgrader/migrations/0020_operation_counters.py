@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:09
+
+from django.db import migrations, models
+
+from openwisp_firmware_upgrader.migrations import populate_operation_counters
+
+
+def populate_operation_counters_helper(apps, schema_editor):
+    populate_operation_counters(apps, schema_editor, "sample_firmware_upgrader")
+
+
+class Migration(migrations.Migration):
+    # the failure reasons are stored in chunks,
+    # each one in its own transaction
+    atomic = False
+
+    dependencies = [
+        ("sample_firmware_upgrader", "0019_alter_batchupgradeoperation_launch_phase"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="completed_operations",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="failed_operations",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="launched_operations",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="batchupgradeoperation",
+            name="total_targets",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="upgradeoperation",
+            name="failure_reason",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=200,
+                verbose_name="failure reason",
+            ),
+        ),
+        migrations.RunPython(
+            populate_operation_counters_helper,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sample_firmware_upgrader", "0020_operation_counters"),
+        migrations.swappable_dependency(settings.CONFIG_DEVICE_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="upgradeoperation",
+            name="batch",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="sample_firmware_upgrader.batchupgradeoperation",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="upgradeoperation",
+            name="device",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.CONFIG_DEVICE_MODEL,
+            ),
+        ),
+    ]
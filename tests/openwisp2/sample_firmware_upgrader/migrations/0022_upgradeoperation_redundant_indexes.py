@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sample_firmware_upgrader", "0021_upgradeoperation_foreign_key_indexes"),
+        migrations.swappable_dependency(settings.CONFIG_DEVICE_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="upgradeoperation",
+            name="upgradeop_device_modified_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="upgradeoperation",
+            name="upgradeop_batch_modified_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="upgradeoperation",
+            name="upgradeop_batch_id_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="upgradeoperation",
+            name="upgradeop_batch_status_id_idx",
+        ),
+        migrations.AddIndex(
+            model_name="upgradeoperation",
+            index=models.Index(
+                fields=["batch", "status", "-created", "-id"],
+                name="upgradeop_batch_status_idx",
+            ),
+        ),
+    ]
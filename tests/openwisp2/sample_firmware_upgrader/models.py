@@ -1,11 +1,15 @@
 from django.db import models
 
 from openwisp_firmware_upgrader.base.models import (
+    AbstractArchivedUpgradeOperation,
     AbstractBatchUpgradeOperation,
+    AbstractBatchUpgradeTarget,
+    AbstractBatchUpgradeWave,
     AbstractBuild,
     AbstractCategory,
     AbstractDeviceFirmware,
     AbstractFirmwareImage,
+    AbstractUpgradeEvent,
     AbstractUpgradeOperation,
 )
 
@@ -42,6 +46,26 @@ class BatchUpgradeOperation(DetailsModel, AbstractBatchUpgradeOperation):
         abstract = False
 
 
+class BatchUpgradeTarget(DetailsModel, AbstractBatchUpgradeTarget):
+    class Meta(AbstractBatchUpgradeTarget.Meta):
+        abstract = False
+
+
+class BatchUpgradeWave(DetailsModel, AbstractBatchUpgradeWave):
+    class Meta(AbstractBatchUpgradeWave.Meta):
+        abstract = False
+
+
 class UpgradeOperation(DetailsModel, AbstractUpgradeOperation):
     class Meta(AbstractUpgradeOperation.Meta):
         abstract = False
+
+
+class ArchivedUpgradeOperation(DetailsModel, AbstractArchivedUpgradeOperation):
+    class Meta(AbstractArchivedUpgradeOperation.Meta):
+        abstract = False
+
+
+class UpgradeEvent(DetailsModel, AbstractUpgradeEvent):
+    class Meta(AbstractUpgradeEvent.Meta):
+        abstract = False
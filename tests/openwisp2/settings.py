@@ -1,5 +1,8 @@
 import os
 import sys
+from datetime import timedelta
+
+from celery.schedules import crontab
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TESTING = os.environ.get("TESTING", False) or sys.argv[1:2] == ["test"]
@@ -196,6 +199,25 @@ else:
     CELERY_BROKER_URL = "memory://"
     CELERY_RESULT_BACKEND = "cache+memory://"
 
+CELERY_BEAT_SCHEDULE = {
+    "archive_upgrade_operations": {
+        "task": "openwisp_firmware_upgrader.tasks.archive_upgrade_operations",
+        "schedule": crontab(minute=30, hour=3),
+    },
+    "publish_upgrade_dashboards": {
+        "task": "openwisp_firmware_upgrader.tasks.publish_upgrade_dashboards",
+        "schedule": timedelta(seconds=5),
+    },
+    "relay_upgrade_events": {
+        "task": "openwisp_firmware_upgrader.tasks.relay_upgrade_events",
+        "schedule": timedelta(seconds=10),
+    },
+    "delete_old_upgrade_events": {
+        "task": "openwisp_firmware_upgrader.tasks.delete_old_upgrade_events",
+        "schedule": crontab(minute="*/10"),
+    },
+}
+
 LOGGING = {
     "version": 1,
     "filters": {"require_debug_true": {"()": "django.utils.log.RequireDebugTrue"}},
@@ -245,9 +267,19 @@ if os.environ.get("SAMPLE_APP", False):
     FIRMWARE_UPGRADER_BATCHUPGRADEOPERATION_MODEL = (
         "sample_firmware_upgrader.BatchUpgradeOperation"
     )
+    FIRMWARE_UPGRADER_BATCHUPGRADETARGET_MODEL = (
+        "sample_firmware_upgrader.BatchUpgradeTarget"
+    )
+    FIRMWARE_UPGRADER_BATCHUPGRADEWAVE_MODEL = (
+        "sample_firmware_upgrader.BatchUpgradeWave"
+    )
     FIRMWARE_UPGRADER_UPGRADEOPERATION_MODEL = (
         "sample_firmware_upgrader.UpgradeOperation"
     )
+    FIRMWARE_UPGRADER_ARCHIVEDUPGRADEOPERATION_MODEL = (
+        "sample_firmware_upgrader.ArchivedUpgradeOperation"
+    )
+    FIRMWARE_UPGRADER_UPGRADEEVENT_MODEL = "sample_firmware_upgrader.UpgradeEvent"
 
     # For controller extended apps:
     # Replace Connection